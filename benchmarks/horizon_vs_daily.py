@@ -0,0 +1,58 @@
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+from battery_trading_model.main import ENGINES, run_backtest, run_horizon_backtest
+from battery_trading_model.price_data import load_price_cube
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+# Compares one problem over the whole date range against the day-by-day loop:
+#   python benchmarks/horizon_vs_daily.py --num-days 30 --engine relaxed
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the horizon mode against the daily loop")
+    parser.add_argument("--num-days", type=int, default=30)
+    parser.add_argument("--engine", choices=ENGINES, default="relaxed")
+    args = parser.parse_args()
+
+    price_cube = load_price_cube()
+    start_day = price_cube.days[0]
+
+    # keep the per-day progress logging out of the way of the comparison
+    logging.getLogger("battery_trading_model").setLevel(logging.WARNING)
+
+    rows = []
+    for mode in ["daily", "horizon"]:
+        start = time.perf_counter()
+        if mode == "horizon":
+            _, daily_summary = run_horizon_backtest(
+                price_cube, start_day=start_day, num_days=args.num_days
+            )
+        else:
+            _, daily_summary = run_backtest(
+                price_cube,
+                start_day=start_day,
+                num_days=args.num_days,
+                engine=args.engine,
+            )
+        wall_time = time.perf_counter() - start
+        summary = pd.concat(daily_summary, ignore_index=True)
+        rows.append(
+            {
+                "mode": mode,
+                "wall_time_s": wall_time,
+                "total_profit": summary["profit"].sum(),
+                "end_soc": summary["end_soc"].iloc[-1],
+            }
+        )
+
+    logger.info(f"Comparison over {args.num_days} days:\n{pd.DataFrame(rows).to_string(index=False)}")
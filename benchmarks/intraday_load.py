@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.instrumentation import LatencyHistogram
+from battery_trading_model.intraday_service import (
+    INTRADAY_SOLVER_CONFIG,
+    TIME_LIMIT,
+    IntradayService,
+    send_request,
+)
+from battery_trading_model.solver import SolverConfig
+from battery_trading_model.synthetic import random_day
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+async def trade_day(
+    host: str,
+    port: int,
+    battery: str,
+    seed: int,
+    latency: LatencyHistogram,
+    revision_scale: float = 5.0,
+) -> float:
+    # One battery's day as a trader would drive it: at every period the remaining
+    # prices are revised by some noise, the SOC is where the last schedule said it
+    # would be, and the ONS volumes are committed after the first solve. Returns
+    # the value of the last solve.
+    rng = np.random.default_rng(seed)
+    day = random_day(seed)
+    apx_prices, ssp_prices = np.asarray(day["apx_prices"]), np.asarray(day["ssp_prices"])
+    soc, daily_volumes, objective_value = day["initial_soc"], None, None
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for period in range(len(apx_prices)):
+            apx_prices[period:] += rng.normal(0, revision_scale, len(apx_prices) - period)
+            ssp_prices[period:] += rng.normal(0, revision_scale, len(ssp_prices) - period)
+            request = {
+                "period": period,
+                "apx_prices": apx_prices[period:].tolist(),
+                "ssp_prices": ssp_prices[period:].tolist(),
+                "soc": soc,
+                "daily_price": day["daily_price"],
+                "final_soc_price": day["final_soc_price"],
+                "daily_volumes": daily_volumes,
+            }
+            start = time.perf_counter()
+            status, response = await send_request(reader, writer, "POST", f"/batteries/{battery}/reoptimise", request)
+            latency.record(time.perf_counter() - start)
+            # a solve that ran out of time still returns its best schedule
+            if status != 200 or response["status"] not in ["Optimal", TIME_LIMIT]:
+                raise Exception(f"{battery} period {period} failed: {response}")
+            soc = response["SOC"][1] if period < len(apx_prices) - 1 else soc
+            daily_volumes = [response["y"], response["w"]]
+            objective_value = response["objective"]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return objective_value
+
+
+async def run_load(host: str, port: int, batteries: list[str], days: int) -> tuple[LatencyHistogram, dict]:
+    # every battery trades its days one after another, all batteries at once
+    latency = LatencyHistogram()
+
+    async def trade_days(b: int, battery: str) -> None:
+        for d in range(days):
+            await trade_day(host, port, battery, seed=b * days + d, latency=latency)
+
+    await asyncio.gather(*(trade_days(b, battery) for b, battery in enumerate(batteries)))
+    reader, writer = await asyncio.open_connection(host, port)
+    _, server_metrics = await send_request(reader, writer, "GET", "/metrics")
+    writer.close()
+    await writer.wait_closed()
+    return latency, server_metrics
+
+
+async def run_local(
+    n_batteries: int,
+    days: int,
+    relaxed: bool,
+    solver_config: SolverConfig = INTRADAY_SOLVER_CONFIG,
+) -> tuple[LatencyHistogram, dict]:
+    # against a service started in this process on a free port
+    batteries = [f"battery-{b}" for b in range(n_batteries)]
+    service = IntradayService(
+        {battery: DEFAULT_BATTERY_PARAMETERS for battery in batteries}, solver_config, relaxed=relaxed
+    )
+    server = await service.start(port=0)
+    host, port = server.sockets[0].getsockname()[:2]
+    async with server:
+        return await run_load(host, port, batteries, days)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Load test the intraday re-optimisation service")
+    parser.add_argument("--host", help="a running service; one is started in-process if not given")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batteries", type=int, default=4, help="concurrent batteries, one connection each")
+    parser.add_argument("--days", type=int, default=2, help="days of 48 re-solves per battery")
+    parser.add_argument("--relaxed", action="store_true", help="for the in-process service")
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=INTRADAY_SOLVER_CONFIG.time_limit,
+        help="seconds per solve, for the in-process service",
+    )
+    parser.add_argument("--output", help="save the client and server latencies as json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.host:
+        batteries = [f"battery-{b}" for b in range(args.batteries)]
+        latency, server_metrics = asyncio.run(run_load(args.host, args.port, batteries, args.days))
+    else:
+        solver_config = SolverConfig(threads=1, time_limit=args.time_limit)
+        latency, server_metrics = asyncio.run(run_local(args.batteries, args.days, args.relaxed, solver_config))
+    elapsed = time.perf_counter() - start
+
+    logger.info(f"{latency.n} requests in {elapsed:.1f}s ({latency.n / elapsed:.0f}/s)")
+    logger.info(f"Client latency: {latency.summary()}")
+    logger.info(f"Client latency histogram (ms):\n{latency.to_frame().to_string(index=False)}")
+    for name in ["request", "solve"]:
+        summary = {key: value for key, value in server_metrics[name].items() if key != "histogram"}
+        logger.info(f"Server {name} latency: {summary}")
+    if args.output:
+        with open(args.output, "w") as f:
+            client = {**latency.summary(), "histogram": latency.to_frame().values.tolist()}
+            json.dump({"client": client, "server": server_metrics}, f, indent=2)
+        logger.info(f"Latencies saved to {args.output}")
@@ -0,0 +1,252 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from battery_trading_model.day_model import DayModel
+from battery_trading_model.dp_solver import solve_dp_problem
+from battery_trading_model.instrumentation import Metrics
+from battery_trading_model.main import ENGINES, run_backtest, run_horizon_backtest
+from battery_trading_model.matrix_model import build_matrix_problem
+from battery_trading_model.model import build_problem
+from battery_trading_model.price_data import PriceCube, load_price_cube
+from battery_trading_model.solution import extract_day_solution
+from battery_trading_model.solver import (
+    DEFAULT_SOLVER_CONFIG,
+    SOLVERS,
+    SolverConfig,
+    available_solver,
+    evaluate_profit,
+    solve_matrix_problem,
+    solve_matrix_problem_relaxed,
+    solve_problem,
+)
+from battery_trading_model.synthetic import random_price_cube
+from battery_trading_model.utils import build_horizon_results, build_model_results_dataframe
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+# Times each stage of a backtest separately (build, solve, profit, results frame,
+# array extraction) and then the whole main.py loop, for every engine and number of
+# days asked for, and the pulp engine with every PuLP backend asked for. Each case
+# runs in a fresh process so its peak RSS is its own.
+#   python -m benchmarks.suite --sizes 1 30 365 --engines pulp relaxed dp --solvers cbc highs
+#   python -m benchmarks.suite --diff benchmarks/results/<older commit>.json
+SIZES = [1, 30, 365]
+MODES = [*ENGINES, "horizon"]
+STAGES = ["build", "solve", "evaluate_profit", "results_dataframe", "extract"]
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def benchmark_case(price_cube: PriceCube, num_days: int, mode: str, solver: str | None = None) -> dict:
+    # solver is the PuLP backend, which only the pulp engine uses
+    solver_config = DEFAULT_SOLVER_CONFIG if solver is None else SolverConfig(solver=solver)
+    start_day = price_cube.days[0]
+    case = {"mode": mode, "solver": solver, "num_days": num_days}
+    if mode != "horizon":
+        days = time_stages(price_cube, num_days, mode, solver_config)
+        case["stages"] = {}
+        for stage in STAGES:
+            times = days[f"{stage}_time"]
+            case["stages"][stage] = {
+                "total_s": float(times.sum()),
+                "mean_s": float(times.mean()),
+                "max_s": float(times.max()),
+            }
+        # the time the solver reports, without e.g. PuLP writing and reading its files
+        if "solver_time" in days:
+            case["solver_time_s"] = float(days["solver_time"].sum())
+
+    start = time.perf_counter()
+    if mode == "horizon":
+        _, daily_summary = run_horizon_backtest(price_cube, start_day=start_day, num_days=num_days)
+    else:
+        _, daily_summary = run_backtest(
+            price_cube, start_day=start_day, num_days=num_days, engine=mode, solver_config=solver_config
+        )
+    case["wall_time_s"] = time.perf_counter() - start
+
+    summary = pd.concat(daily_summary, ignore_index=True)
+    case["total_profit"] = float(summary["profit"].sum())
+    case["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return case
+
+
+def time_stages(
+    price_cube: PriceCube,
+    num_days: int,
+    engine: str,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> pd.DataFrame:
+    # the same chained day loop as run_backtest, with every stage timed on its own
+    # and the solvers' statistics, as Metrics collects them: one row per day
+    metrics = Metrics()
+    day_model = None
+    start_of_day_soc = 0.0
+    for i in range(num_days):
+        metrics.start_day(price_cube.days[i])
+        apx_prices, ssp_prices = price_cube.day_prices(i)
+        day_inputs = dict(
+            apx_prices=apx_prices.tolist(),
+            ssp_prices=ssp_prices.tolist(),
+            daily_price=float(price_cube.daily_prices[i]),
+            final_soc_price=float(price_cube.avg_prices[i]),
+            initial_soc=start_of_day_soc,
+        )
+
+        with metrics.timer("build"):
+            if engine == "pulp":
+                problem, model = build_problem(**day_inputs)
+            elif engine in ["matrix", "relaxed"]:
+                problem, model = build_matrix_problem(**day_inputs)
+            elif engine == "day-model" and day_model is None:
+                day_model = DayModel(solver_config=solver_config)
+
+        stats = metrics.solver_stats()
+        with metrics.timer("solve"):
+            if engine == "pulp":
+                solve_problem(problem, stats=stats, solver_config=solver_config)
+            elif engine == "matrix":
+                solve_matrix_problem(problem, stats=stats, solver_config=solver_config)
+            elif engine == "relaxed":
+                solve_matrix_problem_relaxed(problem, stats=stats, solver_config=solver_config)
+            elif engine == "dp":
+                _, _, model = solve_dp_problem(**day_inputs)
+            else:
+                day_model.update(
+                    prices=[day_inputs["apx_prices"], day_inputs["ssp_prices"]],
+                    q=day_inputs["daily_price"],
+                    v=day_inputs["final_soc_price"],
+                    initial_soc=start_of_day_soc,
+                    stats=stats,
+                )
+                model = day_model.model
+
+        with metrics.timer("evaluate_profit"):
+            evaluate_profit(**{key: model[key] for key in ["P", "q", "X", "Z", "y", "w"]})
+
+        timepoints = price_cube.timepoints(slice(i, i + 1))
+        with metrics.timer("results_dataframe"):
+            build_model_results_dataframe(
+                X=model["X"], Z=model["Z"], y=model["y"], w=model["w"], SOC=model["SOC"], timepoints=timepoints
+            )
+
+        with metrics.timer("extract"):
+            solution = extract_day_solution(model)
+            build_horizon_results(
+                solution,
+                apx_prices=apx_prices[None],
+                ssp_prices=ssp_prices[None],
+                daily_prices=price_cube.daily_prices[i : i + 1],
+                timepoints=timepoints,
+            )
+
+        start_of_day_soc = float(solution["end_soc"][0])
+    return metrics.to_frame()
+
+
+def load_prices(data: str, num_days: int) -> PriceCube:
+    if data == "recorded":
+        return load_price_cube()
+    return random_price_cube(num_days=num_days)
+
+
+def run_suite(
+    sizes: list[int],
+    modes: list[str],
+    data: str = "synthetic",
+    solvers: list[str] | None = None,
+) -> dict:
+    # solvers are the PuLP backends for the pulp engine, cbc by default; those not
+    # installed are left out rather than run as the fallback
+    solvers = [solver for solver in solvers or ["cbc"] if available_solver(solver) == solver]
+    cases = []
+    for num_days, mode in itertools.product(sizes, modes):
+        for solver in solvers if mode == "pulp" else [None]:
+            logger.info(f"Benchmarking {mode}{'' if solver is None else f' ({solver})'} over {num_days} days...")
+            # a fresh process per case, so peak RSS and import state are not shared
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                cases.append(executor.submit(_run_case, data, num_days, mode, solver).result())
+    return {
+        "commit": _git_commit(),
+        "created": pd.Timestamp.now(tz="UTC").isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "data": data,
+        "cases": cases,
+    }
+
+
+def cases_table(report: dict) -> pd.DataFrame:
+    rows = []
+    for case in report["cases"]:
+        row = {"mode": case["mode"], "solver": case.get("solver")}
+        row.update({key: case[key] for key in ["num_days", "wall_time_s", "peak_rss_mb", "total_profit"]})
+        row["solver_time_s"] = case.get("solver_time_s")
+        for stage, stats in case.get("stages", {}).items():
+            row[f"{stage}_mean_ms"] = stats["mean_s"] * 1000
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def compare_reports(base: dict, report: dict) -> pd.DataFrame:
+    # wall time and peak RSS of each case relative to an earlier run
+    keys = ["mode", "solver", "num_days"]
+    merged = cases_table(base).merge(cases_table(report), on=keys, suffixes=("_base", ""))
+    for column in ["wall_time_s", "peak_rss_mb"]:
+        merged[f"{column}_ratio"] = merged[column] / merged[f"{column}_base"]
+    columns = [*keys, "wall_time_s_base", "wall_time_s", "wall_time_s_ratio", "peak_rss_mb_ratio"]
+    return merged[columns]
+
+
+def _run_case(data: str, num_days: int, mode: str, solver: str | None) -> dict:
+    logging.getLogger("battery_trading_model").setLevel(logging.WARNING)
+    return benchmark_case(load_prices(data, num_days), num_days, mode, solver)
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark each backtest stage across engines and horizon sizes")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES, help="numbers of days to run")
+    parser.add_argument("--engines", nargs="*", choices=MODES, default=["pulp", "relaxed"])
+    parser.add_argument("--solvers", nargs="*", choices=SOLVERS, default=["cbc"], help="PuLP backends for pulp")
+    parser.add_argument("--data", choices=["synthetic", "recorded"], default="synthetic")
+    parser.add_argument("--output", type=Path, help="json file, by default benchmarks/results/<commit>.json")
+    parser.add_argument("--diff", type=Path, help="an earlier json report to compare against")
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.engines, args.data, args.solvers)
+    output = args.output or RESULTS_DIR / f"{report['commit'] or 'latest'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    logger.info(f"Benchmark results saved to {output}")
+    logger.info(f"Results:\n{cases_table(report).to_string(index=False)}")
+
+    if args.diff:
+        with open(args.diff) as file:
+            base = json.load(file)
+        logger.info(f"Compared with {args.diff}:\n{compare_reports(base, report).to_string(index=False)}")
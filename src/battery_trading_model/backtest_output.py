@@ -0,0 +1,168 @@
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from battery_trading_model.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+# the day_inputs that come from the price data, as opposed to the carried-over SOC
+PRICE_INPUTS = ["apx_prices", "ssp_prices", "daily_price", "final_soc_price"]
+
+
+class BacktestWriter:
+    # Streams each completed day of a backtest to disk instead of keeping it in
+    # memory: the day's result rows and summary row are written as parquet parts
+    # (results/<date>.parquet, summary/<date>.parquet), then checkpoint.json records
+    # how many days are complete and the end SOC to carry on from. Parts are
+    # renamed into place, so a crash leaves at most one extra part, which resuming
+    # discards. run describes the backtest, and resuming with a different one fails.
+    # The prices and initial SOC each day was solved with are kept as
+    # inputs/<date>.parquet, so a later run can tell which days were revised.
+
+    def __init__(self, output_dir: Path, run: dict, resume: bool = False):
+        self.output_dir = Path(output_dir)
+        self.results_dir = self.output_dir / "results"
+        self.summary_dir = self.output_dir / "summary"
+        self.inputs_dir = self.output_dir / "inputs"
+        self.checkpoint_path = self.output_dir / "checkpoint.json"
+        self.run = json.loads(json.dumps(run, default=str))
+        self.completed_days = 0
+        self.end_soc = None
+        self.last_day = None
+        self.patched_days: list[pd.Timestamp] = []
+
+        if resume and self.checkpoint_path.exists():
+            with open(self.checkpoint_path) as file:
+                checkpoint = json.load(file)
+            if checkpoint["run"] != self.run:
+                raise ValueError(
+                    f"Checkpoint in {self.output_dir} is for a different run: {checkpoint['run']}"
+                )
+            self.completed_days = checkpoint["completed_days"]
+            self.end_soc = checkpoint["end_soc"]
+            self.last_day = checkpoint["last_day"]
+            self._discard_parts_after(self.last_day)
+        else:
+            for directory in [self.results_dir, self.summary_dir, self.inputs_dir]:
+                shutil.rmtree(directory, ignore_errors=True)
+            self.checkpoint_path.unlink(missing_ok=True)
+
+        for directory in [self.results_dir, self.summary_dir, self.inputs_dir]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def append_day(
+        self,
+        day: pd.Timestamp,
+        results_df: pd.DataFrame,
+        summary_df: pd.DataFrame,
+        day_inputs: dict | None = None,
+    ) -> None:
+        self._write_parts(day, results_df, summary_df, day_inputs)
+        self.completed_days += 1
+        self.end_soc = float(summary_df["end_soc"].iloc[-1])
+        self.last_day = day.date().isoformat()
+        self._write_checkpoint()
+
+    def patch_day(
+        self,
+        day: pd.Timestamp,
+        results_df: pd.DataFrame,
+        summary_df: pd.DataFrame,
+        day_inputs: dict | None = None,
+    ) -> None:
+        # replaces the parts of a day that was already completed
+        self._write_parts(day, results_df, summary_df, day_inputs)
+        self.patched_days.append(day)
+        if day.date().isoformat() == self.last_day:
+            self.end_soc = float(summary_df["end_soc"].iloc[-1])
+            self._write_checkpoint()
+
+    def insert_day(
+        self,
+        day: pd.Timestamp,
+        results_df: pd.DataFrame,
+        summary_df: pd.DataFrame,
+        day_inputs: dict | None = None,
+    ) -> None:
+        # adds a day up to the last completed day that was skipped, and now is not
+        self._write_parts(day, results_df, summary_df, day_inputs)
+        self.completed_days += 1
+        self.patched_days.append(day)
+        if day.date().isoformat() == self.last_day:
+            self.end_soc = float(summary_df["end_soc"].iloc[-1])
+        self._write_checkpoint()
+
+    def remove_day(self, day: pd.Timestamp, end_soc: float) -> None:
+        # drops the parts of a completed day that is now skipped; end_soc is the SOC
+        # carried past it, which the next day starts from
+        name = f"{day.date().isoformat()}.parquet"
+        for directory in [self.results_dir, self.summary_dir, self.inputs_dir]:
+            (directory / name).unlink(missing_ok=True)
+        self.completed_days -= 1
+        self.patched_days.append(day)
+        if day.date().isoformat() == self.last_day:
+            self.end_soc = end_soc
+        self._write_checkpoint()
+
+    def read_inputs(self, day: pd.Timestamp) -> dict | None:
+        # the day_inputs a completed day was solved with, or None if they were not kept
+        path = self.inputs_dir / f"{day.date().isoformat()}.parquet"
+        if not path.exists():
+            return None
+        return pd.read_parquet(path).iloc[0].to_dict()
+
+    def read_summary(self) -> pd.DataFrame:
+        paths = sorted(self.summary_dir.glob("*.parquet"))
+        return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+    def finalise(self, results_path: Path, summary_path: Path) -> pd.DataFrame:
+        # writes the same csvs as an in-memory run, one day at a time so the full
+        # results never need to be in memory, and returns the summary
+        paths = sorted(self.results_dir.glob("*.parquet"))
+        for i, path in enumerate(paths):
+            pd.read_parquet(path).to_csv(results_path, index=False, header=i == 0, mode="w" if i == 0 else "a")
+        logger.info(f"Model results saved to {results_path}")
+
+        summary_df = self.read_summary()
+        summary_df.to_csv(summary_path, index=False)
+        logger.info(f"Daily summary saved to {summary_path}")
+        return summary_df
+
+    def _discard_parts_after(self, last_day: str) -> None:
+        for directory in [self.results_dir, self.summary_dir, self.inputs_dir]:
+            for path in directory.glob("*.parquet*"):
+                if path.name.split(".")[0] > last_day or path.suffix == ".tmp":
+                    path.unlink()
+
+    def _write_parts(
+        self,
+        day: pd.Timestamp,
+        results_df: pd.DataFrame,
+        summary_df: pd.DataFrame,
+        day_inputs: dict | None,
+    ) -> None:
+        name = f"{day.date().isoformat()}.parquet"
+        atomic_write(self.results_dir / name, lambda tmp: results_df.to_parquet(tmp, index=False))
+        atomic_write(self.summary_dir / name, lambda tmp: summary_df.to_parquet(tmp, index=False))
+        if day_inputs is not None:
+            inputs_df = pd.DataFrame([day_inputs])
+            atomic_write(self.inputs_dir / name, lambda tmp: inputs_df.to_parquet(tmp, index=False))
+
+    def _write_checkpoint(self) -> None:
+        checkpoint = {
+            "run": self.run,
+            "completed_days": self.completed_days,
+            "last_day": self.last_day,
+            "end_soc": self.end_soc,
+        }
+
+        def write(tmp: Path) -> None:
+            with open(tmp, "w") as file:
+                json.dump(checkpoint, file, indent=2)
+
+        atomic_write(self.checkpoint_path, write)
@@ -0,0 +1,142 @@
+import json
+import logging
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from battery_trading_model.constants import DATA_DIR
+from battery_trading_model.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+STORE_DIR = DATA_DIR / "store"
+COLUMNS = ["datetime", "price"]
+
+# fetch(start, end) returns a datetime/price frame for [start, end)
+Fetcher = Callable[[pd.Timestamp, pd.Timestamp], pd.DataFrame]
+
+
+class DataStore:
+    # Price data kept as one parquet file per source and month, e.g.
+    # store/apx/2023-01.parquet, with a manifest of the days each source holds.
+    # update() only fetches the days that are missing, and writes every month as
+    # soon as it is fetched so an interrupted download picks up where it stopped.
+    # All ranges are [start, end) in UTC days.
+
+    def __init__(self, root: Path = STORE_DIR):
+        self.root = Path(root)
+        self.manifest_path = self.root / "manifest.json"
+        self.manifest: dict[str, list[list[str]]] = {}
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as file:
+                self.manifest = json.load(file)
+
+    def held_days(self, source: str) -> pd.DatetimeIndex:
+        ranges = [
+            pd.date_range(start, end, freq="D", inclusive="left", tz="UTC")
+            for start, end in self.manifest.get(source, [])
+        ]
+        return ranges[0].append(ranges[1:]) if ranges else pd.DatetimeIndex([], tz="UTC")
+
+    def missing_ranges(
+        self, source: str, start: pd.Timestamp, end: pd.Timestamp
+    ) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+        # contiguous runs of missing days, split at month boundaries
+        days = pd.date_range(_utc_day(start), _utc_day(end), freq="D", inclusive="left")
+        missing = days[~days.isin(self.held_days(source))]
+        if len(missing) == 0:
+            return []
+
+        ordinal = np.asarray((missing - missing[0]).days)
+        month = np.asarray(missing.year * 12 + missing.month)
+        breaks = np.flatnonzero((np.diff(ordinal) != 1) | (np.diff(month) != 0)) + 1
+        starts = np.concatenate([[0], breaks])
+        stops = np.concatenate([breaks, [len(missing)]])
+        return [(missing[i], missing[j - 1] + pd.Timedelta(days=1)) for i, j in zip(starts, stops)]
+
+    def update(self, source: str, start: pd.Timestamp, end: pd.Timestamp, fetch: Fetcher) -> int:
+        # fetches and writes every missing range, returning how many were fetched
+        ranges = self.missing_ranges(source, start, end)
+        for i, (range_start, range_end) in enumerate(ranges):
+            logger.info(f"Fetching {source} data for {range_start.date()} to {range_end.date()} ({i + 1}/{len(ranges)})")
+            df = _typed(fetch(range_start, range_end))
+            df = df[(df["datetime"] >= range_start) & (df["datetime"] < range_end)]
+            self._write_month(source, range_start, df)
+
+            # only days that came back with data count as held, so days the source
+            # has not published yet are fetched again next time
+            fetched_days = df["datetime"].dt.floor("D").unique()
+            self._record_days(source, pd.DatetimeIndex(fetched_days))
+        return len(ranges)
+
+    def load(
+        self,
+        source: str,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        columns: list[str] = COLUMNS,
+    ) -> pd.DataFrame:
+        start, end = _utc_day(start), _utc_day(end)
+        months = pd.period_range(start.tz_localize(None), (end - pd.Timedelta(days=1)).tz_localize(None), freq="M")
+        paths = [self._month_path(source, month) for month in months]
+        columns = list(dict.fromkeys(["datetime", *columns]))
+        dfs = [pd.read_parquet(path, columns=columns) for path in paths if path.exists()]
+        if not dfs:
+            return _typed(pd.DataFrame(columns=columns))
+
+        df = pd.concat(dfs, ignore_index=True)
+        df = df[(df["datetime"] >= start) & (df["datetime"] < end)]
+        return df.reset_index(drop=True)
+
+    def _month_path(self, source: str, month: pd.Period) -> Path:
+        return self.root / source / f"{month.strftime('%Y-%m')}.parquet"
+
+    def _write_month(self, source: str, day: pd.Timestamp, df: pd.DataFrame) -> None:
+        path = self._month_path(source, day.tz_localize(None).to_period("M"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+        df = df.drop_duplicates("datetime", keep="last").sort_values("datetime").reset_index(drop=True)
+        atomic_write(path, lambda tmp: df.to_parquet(tmp, index=False))
+
+    def _record_days(self, source: str, days: pd.DatetimeIndex) -> None:
+        held = self.held_days(source).union(days)
+        self.manifest[source] = _day_ranges(held)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        def write(tmp: Path) -> None:
+            with open(tmp, "w") as file:
+                json.dump(self.manifest, file, indent=2)
+
+        atomic_write(self.manifest_path, write)
+
+
+def _utc_day(timestamp: pd.Timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    timestamp = timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+    return timestamp.normalize()
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["datetime"] = pd.to_datetime(df["datetime"], utc=True).astype("datetime64[us, UTC]")
+    if "price" in df:
+        df["price"] = df["price"].astype("float64")
+    return df
+
+
+def _day_ranges(days: pd.DatetimeIndex) -> list[list[str]]:
+    # sorted days -> [[start, end), ...] as iso dates
+    if len(days) == 0:
+        return []
+    ordinal = np.asarray((days - days[0]).days)
+    breaks = np.flatnonzero(np.diff(ordinal) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(days)]])
+    return [
+        [days[i].date().isoformat(), (days[j - 1] + pd.Timedelta(days=1)).date().isoformat()]
+        for i, j in zip(starts, stops)
+    ]
@@ -0,0 +1,99 @@
+import time
+
+import highspy
+import numpy as np
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.matrix_model import MARKETS, build_matrix_problem, build_objective
+from battery_trading_model.solver import (
+    DEFAULT_SOLVER_CONFIG,
+    HIGHS_STATUS,
+    SolverConfig,
+    build_highs_lp,
+    configure_highs,
+    record_highs_stats,
+)
+
+
+class DayModel:
+    # The day's problem is built once and kept in a persistent HiGHS instance. Each
+    # update only swaps the objective coefficients and the SOC_initial right-hand
+    # side, then re-solves warm-started from the previous day's solve.
+
+    def __init__(
+        self,
+        n_timepoints: int = 48,
+        battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+        solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    ):
+        self.n_timepoints = n_timepoints
+        self.solver_config = solver_config
+        self.battery_params = battery_params
+
+        zeros = [0.0] * n_timepoints
+        self.problem, self.model = build_matrix_problem(
+            apx_prices=zeros,
+            ssp_prices=zeros,
+            daily_price=0.0,
+            final_soc_price=0.0,
+            initial_soc=0.0,
+            battery_params=battery_params,
+        )
+        self.layout = self.problem.layout
+        self.columns = np.arange(self.layout.n_variables, dtype=np.int32)
+        self.charge_mode_columns = self.columns[self.layout.charge_mode]
+
+        self.highs = highspy.Highs()
+        self.highs.silent()
+        configure_highs(self.highs, solver_config)
+        self.highs.passModel(build_highs_lp(self.problem))
+        self.previous_charge_mode = None
+
+    def update(
+        self,
+        prices: list[list[float]],
+        q: float,
+        v: float,
+        initial_soc: float,
+        stats: dict | None = None,
+    ) -> tuple[str, float]:
+        # prices is the 2xT matrix P, one row per market in MARKETS order
+        apx_prices, ssp_prices = prices
+        if len(apx_prices) != self.n_timepoints or len(ssp_prices) != self.n_timepoints:
+            raise ValueError(
+                f"DayModel was built for {self.n_timepoints} timepoints, "
+                f"but got {len(apx_prices)} and {len(ssp_prices)} prices"
+            )
+
+        self.problem.c = build_objective(self.layout, apx_prices, ssp_prices, q, v)
+        self.problem.b_eq[0] = initial_soc
+        self.highs.changeColsCost(len(self.columns), self.columns, self.problem.c)
+        self.highs.changeRowBounds(0, initial_soc, initial_soc)
+
+        # any charge_mode assignment is feasible (trade nothing and hold SOC), so the
+        # previous day's binaries always make a valid partial MIP start; HiGHS also
+        # keeps its simplex basis between runs since only costs and one bound changed
+        if self.solver_config.warm_start and self.previous_charge_mode is not None:
+            self.highs.setSolution(
+                len(self.charge_mode_columns), self.charge_mode_columns, self.previous_charge_mode
+            )
+
+        start = time.perf_counter()
+        self.highs.run()
+        record_highs_stats(stats, self.highs, time.perf_counter() - start)
+        status = HIGHS_STATUS.get(self.highs.getModelStatus(), "Undefined")
+        self._update_model(apx_prices, ssp_prices, q)
+        if status != "Optimal":
+            self.previous_charge_mode = None
+            self.problem.set_solution(None)
+            return status, None
+
+        col_value = np.asarray(self.highs.getSolution().col_value)
+        self.previous_charge_mode = col_value[self.layout.charge_mode].round()
+        self.problem.set_solution(col_value)
+        return status, self.highs.getInfo().objective_function_value
+
+    def _update_model(self, apx_prices: list[float], ssp_prices: list[float], q: float) -> None:
+        for market, market_prices in zip(MARKETS, [apx_prices, ssp_prices]):
+            self.model["P"][market] = dict(zip(self.model["timepoints"], market_prices))
+        self.model["q"] = q
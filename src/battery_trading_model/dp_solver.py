@@ -0,0 +1,213 @@
+import time
+
+import numpy as np
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.matrix_model import MARKETS, MatrixLayout, build_model_dict, build_variables
+from battery_trading_model.model import build_problem
+from battery_trading_model.solver import evaluate_profit, solve_problem
+
+
+# Backward dynamic programming over a discretised SOC grid. In any period it is
+# never worth buying from both half-hourly markets or buying and selling at once
+# (charge_mode forbids the latter), so each transition between two SOC grid points
+# buys from the cheaper market or sells to the dearer one.
+#
+# The daily market adds y/48 to every period's charging (or w/48 to discharging),
+# so y > 0 forces charge_mode = 1 all day and w > 0 forces it to 0 all day. Each
+# day is therefore solved for a small set of candidate daily volumes (including
+# none), all at once as an extra leading array axis, and the best one kept. Energy
+# bought on a charge-only day can only end up valued at final_soc_price, so daily
+# purchases are only tried when q < v * frac_charged (and daily sales only when
+# q > v * frac_discharged), which on most days leaves just the no-trade candidate.
+#
+# Every transition is exact, so the result is always feasible for the MIP and its
+# objective a lower bound on the MIP optimum; the gap shrinks as soc_points grows.
+
+
+def solve_dp_problem(
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+    final_soc_price: float,
+    initial_soc: float,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    soc_points: int = 101,
+    daily_points: int = 8,
+) -> tuple[str, float, dict]:
+    n_timepoints = len(apx_prices)
+    prices = np.array([apx_prices, ssp_prices], dtype=float)
+    soc_grid = _soc_grid(battery_params, soc_points)
+    daily_charge, daily_discharge = _daily_candidates(
+        daily_price, final_soc_price, initial_soc, n_timepoints, battery_params, daily_points
+    )
+
+    # energy bought/sold in a period to move between SOC levels, per daily candidate:
+    # shape (candidates, from, to), and the same from initial_soc for the first period
+    bought, sold, infeasible = _transition_energy(
+        soc_grid[None, :, None], soc_grid, daily_charge, daily_discharge, battery_params
+    )
+    first_bought, first_sold, first_infeasible = _transition_energy(
+        np.full((1, 1, 1), float(initial_soc)), soc_grid, daily_charge, daily_discharge, battery_params
+    )
+
+    buy_price = prices.min(axis=0)
+    sell_price = prices.max(axis=0)
+
+    # backward pass
+    value = np.broadcast_to(final_soc_price * soc_grid, (len(daily_charge), len(soc_grid)))
+    policy = np.empty((n_timepoints, len(daily_charge), len(soc_grid)), dtype=np.intp)
+    for t in range(n_timepoints - 1, 0, -1):
+        total = sell_price[t] * sold - buy_price[t] * bought + infeasible + value[:, None, :]
+        policy[t] = total.argmax(axis=2)
+        value = np.take_along_axis(total, policy[t][:, :, None], axis=2)[:, :, 0]
+    total = (
+        sell_price[0] * first_sold - buy_price[0] * first_bought + first_infeasible + value[:, None, :]
+    )
+    first_choice = total.argmax(axis=2)[:, 0]
+    candidate_values = total[np.arange(len(daily_charge)), 0, first_choice]
+    candidate_values += daily_price * n_timepoints * (daily_discharge - daily_charge)
+
+    if not np.isfinite(candidate_values).any():
+        return "Infeasible", None, {}
+
+    # forward pass along the best candidate's policy
+    k = int(candidate_values.argmax())
+    soc_index = np.empty(n_timepoints, dtype=np.intp)
+    soc_index[0] = first_choice[k]
+    for t in range(1, n_timepoints):
+        soc_index[t] = policy[t, k, soc_index[t - 1]]
+    soc_path = np.concatenate([[initial_soc], soc_grid[soc_index]])
+    period_bought = np.concatenate(
+        [[first_bought[k, 0, soc_index[0]]], bought[k, soc_index[:-1], soc_index[1:]]]
+    )
+    period_sold = np.concatenate(
+        [[first_sold[k, 0, soc_index[0]]], sold[k, soc_index[:-1], soc_index[1:]]]
+    )
+
+    layout = MatrixLayout(n_timepoints=n_timepoints)
+    x = np.zeros(layout.n_variables)
+    cheapest = prices.argmin(axis=0)
+    dearest = prices.argmax(axis=0)
+    for m, market in enumerate(MARKETS):
+        x[layout.X(market)] = np.where(cheapest == m, period_bought, 0.0)
+        x[layout.Z(market)] = np.where(dearest == m, period_sold, 0.0)
+    x[layout.y] = daily_charge[k] * n_timepoints
+    x[layout.w] = daily_discharge[k] * n_timepoints
+    x[layout.SOC] = soc_path
+    x[layout.charge_mode] = period_bought + daily_charge[k] > 0
+
+    variables = build_variables(layout)
+    variables[0].solution.x = x
+    model = build_model_dict(layout, variables, apx_prices, ssp_prices, daily_price)
+    return "Optimal", float(candidate_values[k]), model
+
+
+def _soc_grid(battery_params: BatteryParameters, soc_points: int) -> np.ndarray:
+    # about soc_points levels, spaced so a full-rate charge moves a whole number of
+    # steps; without that the grid can never charge at full rate
+    full_charge = battery_params.frac_charged * battery_params.X_max
+    step = battery_params.C_max / (soc_points - 1)
+    step = full_charge / max(1, round(full_charge / step))
+    grid = np.arange(0, battery_params.C_max, step)
+    return np.append(grid[grid < battery_params.C_max - 1e-9], battery_params.C_max)
+
+
+def _daily_candidates(
+    daily_price: float,
+    final_soc_price: float,
+    initial_soc: float,
+    n_timepoints: int,
+    battery_params: BatteryParameters,
+    daily_points: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    # per-period daily market volumes (y/48, w/48); the first candidate trades nothing
+    daily_charge = [0.0]
+    daily_discharge = [0.0]
+    if daily_price < final_soc_price * battery_params.frac_charged:
+        max_charge = min(
+            battery_params.X_max,
+            (battery_params.C_max - initial_soc) / battery_params.frac_charged / n_timepoints,
+        )
+        charge = np.linspace(0, max(max_charge, 0), daily_points + 1)[1:]
+        daily_charge += charge.tolist()
+        daily_discharge += [0.0] * daily_points
+    if daily_price > final_soc_price * battery_params.frac_discharged:
+        max_discharge = min(
+            battery_params.Z_max,
+            initial_soc / battery_params.frac_discharged / n_timepoints,
+        )
+        discharge = np.linspace(0, max(max_discharge, 0), daily_points + 1)[1:]
+        daily_charge += [0.0] * daily_points
+        daily_discharge += discharge.tolist()
+    return np.array(daily_charge), np.array(daily_discharge)
+
+
+def _transition_energy(
+    from_soc: np.ndarray,
+    to_soc: np.ndarray,
+    daily_charge: np.ndarray,
+    daily_discharge: np.ndarray,
+    battery_params: BatteryParameters,
+    tolerance: float = 1e-9,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # half-hourly energy bought/sold to move from_soc -> to_soc on top of the
+    # candidate's daily volume, and a -inf penalty on moves that are infeasible
+    change = to_soc[None, None, :] - from_soc
+    daily_charge = daily_charge[:, None, None]
+    daily_discharge = daily_discharge[:, None, None]
+
+    bought = np.maximum(change, 0) / battery_params.frac_charged - daily_charge
+    sold = np.maximum(-change, 0) / battery_params.frac_discharged - daily_discharge
+    feasible = (
+        (bought >= -tolerance)
+        & (sold >= -tolerance)
+        & (bought + daily_charge <= battery_params.X_max + tolerance)
+        & (sold + daily_discharge <= battery_params.Z_max + tolerance)
+    )
+    bought = np.where(feasible, np.maximum(bought, 0), 0.0)
+    sold = np.where(feasible, np.maximum(sold, 0), 0.0)
+    infeasible = np.where(feasible, 0.0, -np.inf)
+    return bought, sold, infeasible
+
+
+def optimality_gap(objective: float, reference_objective: float) -> float:
+    return (reference_objective - objective) / max(abs(reference_objective), 1e-9)
+
+
+def compare_dp_with_mip(
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+    final_soc_price: float,
+    initial_soc: float,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    soc_points: int = 101,
+) -> dict:
+    day_inputs = dict(
+        apx_prices=apx_prices,
+        ssp_prices=ssp_prices,
+        daily_price=daily_price,
+        final_soc_price=final_soc_price,
+        initial_soc=initial_soc,
+        battery_params=battery_params,
+    )
+    start = time.perf_counter()
+    _, dp_objective, dp_model = solve_dp_problem(**day_inputs, soc_points=soc_points)
+    dp_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    problem, mip_model = build_problem(**day_inputs)
+    _, mip_objective = solve_problem(problem)
+    mip_time = time.perf_counter() - start
+
+    profit_keys = ["P", "q", "X", "Z", "y", "w"]
+    return {
+        "dp_objective": dp_objective,
+        "mip_objective": mip_objective,
+        "gap": optimality_gap(dp_objective, mip_objective),
+        "dp_profit": evaluate_profit(**{key: dp_model[key] for key in profit_keys}),
+        "mip_profit": evaluate_profit(**{key: mip_model[key] for key in profit_keys}),
+        "dp_time": dp_time,
+        "mip_time": mip_time,
+    }
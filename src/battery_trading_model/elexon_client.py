@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class FetchConfig:
+    max_workers: int = 8
+    requests_per_second: float = 10.0
+    burst: int = 10
+    max_retries: int = 5
+    backoff: float = 0.5  # seconds, doubled after every failed attempt
+    timeout: float = 30.0
+
+
+class TokenBucket:
+    # thread-safe token bucket: refills at rate tokens per second up to capacity,
+    # and acquire blocks until a token is available
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ElexonClient:
+    # Fetches many Elexon endpoints concurrently over one pooled session, rate
+    # limited across all threads and retried with exponential backoff on 429/5xx.
+    # Use it as a context manager, or close() it, to release the session's connections.
+
+    def __init__(self, base_url: str, config: FetchConfig = FetchConfig()):
+        self.base_url = base_url
+        self.config = config
+        self.rate_limiter = TokenBucket(config.requests_per_second, config.burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_json(self, path: str, params: dict | None = None) -> dict:
+        url = self.base_url + path
+        for attempt in range(self.config.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.config.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt == self.config.max_retries:
+                    raise
+                logger.warning(f"Request to {url} failed ({error}), retrying")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.config.max_retries:
+                raise Exception(
+                    f"Failed to fetch {url}: {response.status_code} - {response.text}"
+                )
+            logger.warning(f"Request to {url} returned {response.status_code}, retrying")
+            time.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+
+    def get_many(self, requests_to_make: list[tuple[str, dict | None]]) -> list[dict]:
+        # results come back in the same order as requests_to_make
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            return list(executor.map(lambda request: self.get_json(*request), requests_to_make))
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "ElexonClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.config.backoff * 2**attempt
@@ -1,11 +1,15 @@
-from datetime import datetime, date, timedelta, timezone
+import argparse
+from datetime import datetime, date, timedelta
 from enum import Enum
+from pathlib import Path
 
 import pandas as pd
 import plotly.express as px
 import requests
 
 from battery_trading_model.constants import DATA_DIR
+from battery_trading_model.data_store import DataStore, Fetcher
+from battery_trading_model.elexon_client import ElexonClient
 
 import logging
 
@@ -21,10 +25,16 @@ class DataProvider(Enum):
 
 
 def get_market_index_data(
-    start_date: datetime, end_date: datetime, data_provider: DataProvider
+    start_date: datetime,
+    end_date: datetime,
+    data_provider: DataProvider,
+    client: ElexonClient | None = None,
 ) -> pd.DataFrame:
-    # can only fetch 7 days of data at a time, so fetch in a loop and concatenate the results
-    dfs = []
+    # can only fetch 7 days of data at a time, so fetch the chunks concurrently and concatenate the results
+    if client is None:
+        with ElexonClient(ELEXON_API_URL) as client:
+            return get_market_index_data(start_date, end_date, data_provider, client)
+    chunks = []
     n_days = (end_date - start_date).days
     for i in range(0, n_days, 7):
         current_start_date = start_date + timedelta(days=i)
@@ -32,30 +42,35 @@ def get_market_index_data(
             current_start_date + timedelta(days=7) - timedelta(minutes=30),
             end_date,
         )
-        data = fetch_market_index_data(current_start_date, current_end_date, data_provider)
-        df = format_market_index_response(data)
-        dfs.append(df)
+        chunks.append(market_index_request(current_start_date, current_end_date, data_provider))
+    dfs = [format_market_index_response(data) for data in client.get_many(chunks)]
     all_data_df = pd.concat(dfs, ignore_index=True)
     all_data_df = order_df_by_datetime(all_data_df)
     return all_data_df
 
 
-def fetch_market_index_data(
+def market_index_request(
     start_date: datetime, end_date: datetime, data_provider: DataProvider
-) -> dict:
-    url = ELEXON_API_URL + "/balancing/pricing/market-index"
+) -> tuple[str, dict]:
+    path = "/balancing/pricing/market-index"
     payload = {
         "from": start_date.isoformat(),
         "to": end_date.isoformat(),
         "dataProviders": data_provider.value,
     }
-    response = requests.get(url, params=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(
-            f"Failed to fetch Elexon market index data: {response.status_code} - {response.text}"
-        )
+    return path, payload
+
+
+def fetch_market_index_data(
+    start_date: datetime,
+    end_date: datetime,
+    data_provider: DataProvider,
+    client: ElexonClient | None = None,
+) -> dict:
+    if client is None:
+        with ElexonClient(ELEXON_API_URL) as client:
+            return fetch_market_index_data(start_date, end_date, data_provider, client)
+    return client.get_json(*market_index_request(start_date, end_date, data_provider))
 
 def format_market_index_response(data: dict) -> pd.DataFrame:
     data = data.get("data")
@@ -64,31 +79,36 @@ def format_market_index_response(data: dict) -> pd.DataFrame:
     return df
 
 
-def get_settlement_system_data(start_date: datetime, end_date: datetime) -> pd.DataFrame:
-    dfs = []
+def get_settlement_system_data(
+    start_date: datetime,
+    end_date: datetime,
+    client: ElexonClient | None = None,
+) -> pd.DataFrame:
+    # one request per day, fetched concurrently
+    if client is None:
+        with ElexonClient(ELEXON_API_URL) as client:
+            return get_settlement_system_data(start_date, end_date, client)
     n_days = (end_date - start_date).days
-    single_date = start_date.date()
-    for i in range(n_days):
-        data = fetch_settlement_system_data(single_date)
-        data = format_settlement_system_response(data)
-        dfs.append(data)
-        single_date += timedelta(days=1)
+    days = [start_date.date() + timedelta(days=i) for i in range(n_days)]
+    responses = client.get_many([settlement_system_request(single_date) for single_date in days])
+    dfs = [format_settlement_system_response(data) for data in responses]
     all_data_df = pd.concat(dfs, ignore_index=True)
     all_data_df = order_df_by_datetime(all_data_df)
     return all_data_df
 
 
+def settlement_system_request(date: date) -> tuple[str, None]:
+    return f"/balancing/settlement/system-prices/{date}", None
+
+
 def fetch_settlement_system_data(
-    date: date
+    date: date,
+    client: ElexonClient | None = None,
 ) -> dict:
-    url = ELEXON_API_URL + f"/balancing/settlement/system-prices/{date}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(
-            f"Failed to fetch Elexon settlement system data: {response.status_code} - {response.text}"
-        )
+    if client is None:
+        with ElexonClient(ELEXON_API_URL) as client:
+            return fetch_settlement_system_data(date, client)
+    return client.get_json(*settlement_system_request(date))
 
 def format_settlement_system_response(data: dict) -> pd.DataFrame:
     data = data.get("data")
@@ -133,7 +153,19 @@ def fetch_ons_data() -> dict:
                 f"Failed to fetch ONS data: {response.status_code} - {response.text}"
             )
     
-    data = pd.read_excel(DATA_DIR / excel_file_name, sheet_name="1.Daily SP Electricity", skiprows=4)
+    return read_ons_sheet(DATA_DIR / excel_file_name)
+
+
+def read_ons_sheet(excel_path: Path) -> pd.DataFrame:
+    # parsing the workbook is slow, so the parsed sheet is cached next to it and
+    # reused until the workbook changes
+    cache_path = excel_path.with_suffix(".parquet")
+    if cache_path.exists() and cache_path.stat().st_mtime >= excel_path.stat().st_mtime:
+        return pd.read_parquet(cache_path)
+
+    data = pd.read_excel(excel_path, sheet_name="1.Daily SP Electricity", skiprows=4)
+    data.columns = data.columns.astype(str)
+    data.to_parquet(cache_path, index=False)
     return data
 
 
@@ -145,59 +177,55 @@ def format_ons_data(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-if __name__ == "__main__":
+def store_fetchers(client: ElexonClient) -> dict[str, Fetcher]:
+    # how the DataStore fetches [start, end) of each source
+    return {
+        "n2ex": lambda start, end: get_market_index_data(start, end, DataProvider.N2EX, client=client),
+        "apx": lambda start, end: get_market_index_data(start, end, DataProvider.APX, client=client),
+        "ssp": lambda start, end: get_settlement_system_data(start, end, client=client),
+        "ons": get_ons_data,
+    }
 
-    start_date = datetime(2023, 1, 1, tzinfo=timezone.utc)
-    end_date = datetime(2023, 12, 31, tzinfo=timezone.utc)
 
-    ### Get Market Index Data
-    n2ex_file_name = DATA_DIR / "n2ex_data_2023.csv"
-    apx_file_name = DATA_DIR / "apx_data_2023.csv"
+if __name__ == "__main__":
 
-    if n2ex_file_name.exists() and apx_file_name.exists():
-        logger.info("Data files already exist, skipping fetch and loading from csv")
-        n2ex_df = pd.read_csv(n2ex_file_name)
-        apx_df = pd.read_csv(apx_file_name)
+    parser = argparse.ArgumentParser(description="Fetch price data into the local data store")
+    parser.add_argument("--start", default="2023-01-01", help="first day to fetch")
+    parser.add_argument("--end", default="2024-01-01", help="day after the last day to fetch")
+    parser.add_argument("--show", action="store_true", help="plot the first few weeks of each source")
+    args = parser.parse_args()
 
-    else:
-        logger.info("Fetching market index data...")
-        n2ex_df = get_market_index_data(start_date, end_date, data_provider=DataProvider.N2EX)
-        apx_df = get_market_index_data(start_date, end_date, data_provider=DataProvider.APX)
+    start_date = pd.Timestamp(args.start, tz="UTC")
+    end_date = pd.Timestamp(args.end, tz="UTC")
 
-        n2ex_df.to_csv(n2ex_file_name, index=False)
-        apx_df.to_csv(apx_file_name, index=False)
+    # only the days the store does not already hold are fetched, one month at a time,
+    # so re-running after an interruption carries on from the last completed month
+    store = DataStore()
+    with ElexonClient(ELEXON_API_URL) as client:
+        for source, fetch in store_fetchers(client).items():
+            n_fetched = store.update(source, start_date, end_date, fetch)
+            logger.info(f"{source}: fetched {n_fetched} missing ranges")
 
     # Looks like N2EX data is zero most of the time (not sure why?), lets use APX
 
-    ### Get Settlement System Data
-    ssp_file_name = DATA_DIR / "ssp_data_2023.csv"
-
-    if ssp_file_name.exists():
-        logger.info("Settlement system data file already exists, skipping fetch and loading from csv")
-        ssp_df = pd.read_csv(ssp_file_name)
-    else:
-        logger.info("Fetching settlement system data...")
-        ssp_df = get_settlement_system_data(start_date, end_date)
-        ssp_df.to_csv(ssp_file_name, index=False)
-
-    
-    ### Get ONS Data
-    ons_file_name = DATA_DIR / "ons_data_2023.csv"
-    if ons_file_name.exists():
-        logger.info("ONS data file already exists, skipping fetch and loading from csv")
-        ons_df = pd.read_csv(ons_file_name)
-    else:
-        logger.info("Fetching ONS data...")
-        ons_df = get_ons_data(start_date, end_date)
-        ons_df.to_csv(ons_file_name, index=False)
-
-
-    # quick look at some of the data
-    fig = px.line(n2ex_df[0:1000], x="datetime", y="price", title="N2EX MID Price")
-    fig.show()
-    fig = px.line(apx_df[0:1000], x="datetime", y="price", title="APX MID Price")
-    fig.show()
-    fig = px.line(ssp_df[0:1000], x="datetime", y="price", title="Settlement System Price")
-    fig.show()
-    fig = px.line(ons_df, x="datetime", y="price", title="ONS Daily Average Price")
-    fig.show()
\ No newline at end of file
+    # csvs for each year in the range, as read by price_data.load_price_cube
+    for year in range(start_date.year, (end_date - timedelta(days=1)).year + 1):
+        year_start = max(start_date, pd.Timestamp(year=year, month=1, day=1, tz="UTC"))
+        year_end = min(end_date, pd.Timestamp(year=year + 1, month=1, day=1, tz="UTC"))
+        for source in ["n2ex", "apx", "ssp", "ons"]:
+            df = store.load(source, year_start, year_end)
+            df.to_csv(DATA_DIR / f"{source}_data_{year}.csv", index=False)
+
+    if args.show:
+        # quick look at some of the data
+        titles = {
+            "n2ex": "N2EX MID Price",
+            "apx": "APX MID Price",
+            "ssp": "Settlement System Price",
+            "ons": "ONS Daily Average Price",
+        }
+        for source, title in titles.items():
+            df = store.load(source, start_date, end_date)
+            df = df if source == "ons" else df[0:1000]
+            fig = px.line(df, x="datetime", y="price", title=title)
+            fig.show()
@@ -0,0 +1,265 @@
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+from scipy import sparse
+
+from battery_trading_model.constants import BatteryParameters
+from battery_trading_model.matrix_model import (
+    MARKETS,
+    MatrixLayout,
+    build_constraint_matrices,
+    build_matrix_problem,
+    build_objective,
+    build_variable_bounds,
+)
+from battery_trading_model.solution import split_day_solution
+from battery_trading_model.solver import DEFAULT_SOLVER_CONFIG, SolverConfig, solve_horizon_problem
+
+
+@dataclass(frozen=True)
+class SharedConstraints:
+    # limits on the fleet as a whole; a limit left as None is not applied.
+    # export_limit and import_limit are MW through a shared grid connection, and
+    # ons_volume caps the MWh of ONS purchases and sales across all assets per day
+    export_limit: float | None = None
+    import_limit: float | None = None
+    ons_volume: float | None = None
+
+    @property
+    def active(self) -> bool:
+        return any(limit is not None for limit in [self.export_limit, self.import_limit, self.ons_volume])
+
+
+@dataclass(frozen=True)
+class FleetLayout:
+    # One MatrixLayout block per asset. The continuous columns of every asset come
+    # first, asset by asset, then every asset's charge_mode columns, so charge_mode
+    # is still a single slice for solver.solve_relaxed.
+    # column order: [X, Z, y, w, SOC] of each asset, then charge_mode of each asset
+    n_assets: int
+    n_timepoints: int = 48
+
+    @property
+    def block(self) -> MatrixLayout:
+        return MatrixLayout(n_timepoints=self.n_timepoints)
+
+    @property
+    def n_continuous(self) -> int:
+        return self.block.charge_mode.start
+
+    @property
+    def charge_mode(self) -> slice:
+        return slice(self.n_assets * self.n_continuous, self.n_variables)
+
+    @property
+    def n_variables(self) -> int:
+        return self.n_assets * self.block.n_variables
+
+    def column_map(self) -> np.ndarray:
+        # (assets x block columns): the fleet column of each asset's MatrixLayout column
+        asset = np.arange(self.n_assets)[:, None]
+        continuous = asset * self.n_continuous + np.arange(self.n_continuous)
+        charge_mode = self.charge_mode.start + asset * self.n_timepoints + np.arange(self.n_timepoints)
+        return np.hstack([continuous, charge_mode])
+
+    def charge_flows(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # every asset's block read at once, as columns of a (block columns x assets) array,
+        # returned in charge_mode order
+        blocks = x[: self.charge_mode.start].reshape(self.n_assets, self.n_continuous).T
+        charge_flow, discharge_flow = self.block.charge_flows(blocks)
+        return charge_flow.T.ravel(), discharge_flow.T.ravel()
+
+
+@dataclass
+class FleetProblem:
+    # c is the objective to maximise; the same fields as HorizonProblem, so the
+    # horizon solvers take it as it is
+    c: np.ndarray
+    A_ub: sparse.csr_array
+    b_ub: np.ndarray
+    A_eq: sparse.csr_array
+    b_eq: np.ndarray
+    lower_bounds: np.ndarray
+    upper_bounds: np.ndarray
+    integrality: np.ndarray
+    layout: FleetLayout
+
+
+def build_shared_constraints(
+    layout: FleetLayout,
+    shared: SharedConstraints,
+) -> tuple[sparse.csr_array, np.ndarray]:
+    # inequality rows: Export_limit_t for each t, Import_limit_t for each t, ONS_volume
+    block = layout.block
+    columns = layout.column_map()
+    t = np.arange(layout.n_timepoints)
+    rows, cols, vals, b_ub = [], [], [], []
+
+    def add_period_limit(limit: float, market_slices: list[slice], daily: int) -> None:
+        row = len(b_ub) + t
+        for market_slice in market_slices:
+            rows.append(np.repeat(row[None, :], layout.n_assets, axis=0).ravel())
+            cols.append(columns[:, market_slice].ravel())
+            vals.append(np.ones(layout.n_assets * layout.n_timepoints))
+        rows.append(np.repeat(row, layout.n_assets))
+        cols.append(np.tile(columns[:, daily], layout.n_timepoints))
+        vals.append(np.full(layout.n_assets * layout.n_timepoints, 1 / layout.n_timepoints))
+        # MW over a half-hour, as BatteryParameters.X_max
+        b_ub.extend(np.full(layout.n_timepoints, limit * 0.5))
+
+    if shared.export_limit is not None:
+        add_period_limit(shared.export_limit, [block.Z(market) for market in MARKETS], block.w)
+    if shared.import_limit is not None:
+        add_period_limit(shared.import_limit, [block.X(market) for market in MARKETS], block.y)
+    if shared.ons_volume is not None:
+        rows.append(np.full(2 * layout.n_assets, len(b_ub)))
+        cols.append(columns[:, [block.y, block.w]].ravel())
+        vals.append(np.ones(2 * layout.n_assets))
+        b_ub.append(shared.ons_volume)
+
+    A_ub = sparse.csr_array(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(b_ub), layout.n_variables),
+    )
+    return A_ub, np.asarray(b_ub, dtype=float)
+
+
+def build_fleet_problem(
+    batteries: list[BatteryParameters],
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+    final_soc_price: float,
+    initial_socs: list[float],
+    shared: SharedConstraints = SharedConstraints(),
+) -> FleetProblem:
+    # one day for every battery as a single block-diagonal problem, plus the shared
+    # rows coupling the blocks. Each block is model.build_problem's formulation
+    # for that battery, built by the matrix_model functions and moved into place
+    layout = FleetLayout(n_assets=len(batteries), n_timepoints=len(apx_prices))
+    block = layout.block
+    columns = layout.column_map()
+
+    c = np.zeros(layout.n_variables)
+    c[columns] = build_objective(block, apx_prices, ssp_prices, daily_price, final_soc_price)
+
+    lower_bounds = np.empty(layout.n_variables)
+    upper_bounds = np.empty(layout.n_variables)
+    integrality = np.empty(layout.n_variables, dtype=np.uint8)
+    ub_blocks, b_ub_blocks, eq_blocks = [], [], []
+    for asset, battery_params in enumerate(batteries):
+        A_ub, b_ub, A_eq = build_constraint_matrices(block, battery_params)
+        ub_blocks.append(A_ub)
+        b_ub_blocks.append(b_ub)
+        eq_blocks.append(A_eq)
+        (
+            lower_bounds[columns[asset]],
+            upper_bounds[columns[asset]],
+            integrality[columns[asset]],
+        ) = build_variable_bounds(block, battery_params)
+
+    A_ub = _place_blocks(ub_blocks, columns, layout.n_variables)
+    b_ub = np.concatenate(b_ub_blocks)
+    A_eq = _place_blocks(eq_blocks, columns, layout.n_variables)
+    b_eq = np.zeros(A_eq.shape[0])
+    # SOC_initial is the first equality row of each block
+    b_eq[:: block.n_timepoints + 1] = initial_socs
+
+    if shared.active:
+        A_shared, b_shared = build_shared_constraints(layout, shared)
+        A_ub = sparse.vstack([A_ub, A_shared], format="csr")
+        b_ub = np.concatenate([b_ub, b_shared])
+
+    return FleetProblem(
+        c=c,
+        A_ub=A_ub,
+        b_ub=b_ub,
+        A_eq=A_eq,
+        b_eq=b_eq,
+        lower_bounds=lower_bounds,
+        upper_bounds=upper_bounds,
+        integrality=integrality,
+        layout=layout,
+    )
+
+
+def split_fleet_solution(layout: FleetLayout, x: np.ndarray) -> list[dict[str, np.ndarray]]:
+    # the split_day_solution arrays of each asset
+    return [split_day_solution(layout.block, x[columns]) for columns in layout.column_map()]
+
+
+def solve_fleet(
+    batteries: list[BatteryParameters],
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+    final_soc_price: float,
+    initial_socs: list[float],
+    shared: SharedConstraints = SharedConstraints(),
+    relaxed: bool = True,
+    executor: Executor | None = None,
+    stats: dict | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[str, float, list[dict[str, np.ndarray]] | None]:
+    # With shared constraints the assets are coupled and solved as one problem.
+    # Without, they are independent, so each is solved on its own, which gives the
+    # same optimum from much smaller solves, spread across executor if given.
+    # Returns the status, the fleet objective and each asset's solution arrays
+    day_inputs = dict(
+        apx_prices=apx_prices,
+        ssp_prices=ssp_prices,
+        daily_price=daily_price,
+        final_soc_price=final_soc_price,
+    )
+    if shared.active:
+        problem = build_fleet_problem(batteries, **day_inputs, initial_socs=initial_socs, shared=shared)
+        status, objective_value, x, _ = solve_horizon_problem(
+            problem, relaxed=relaxed, stats=stats, solver_config=solver_config
+        )
+        if x is None:
+            return status, None, None
+        return status, objective_value, split_fleet_solution(problem.layout, x)
+
+    solve = partial(_solve_asset, day_inputs=day_inputs, relaxed=relaxed, solver_config=solver_config)
+    if executor is None:
+        results = [
+            solve(battery_params, initial_soc, stats=stats)
+            for battery_params, initial_soc in zip(batteries, initial_socs)
+        ]
+    else:
+        results = list(executor.map(solve, batteries, initial_socs))
+
+    statuses = [status for status, _, _ in results]
+    failed = [status for status in statuses if status != "Optimal"]
+    if failed:
+        return failed[0], None, None
+    block = MatrixLayout(n_timepoints=len(apx_prices))
+    objective_value = sum(objective_value for _, objective_value, _ in results)
+    return "Optimal", objective_value, [split_day_solution(block, x) for _, _, x in results]
+
+
+def _solve_asset(
+    battery_params: BatteryParameters,
+    initial_soc: float,
+    day_inputs: dict,
+    relaxed: bool,
+    solver_config: SolverConfig,
+    stats: dict | None = None,
+) -> tuple[str, float, np.ndarray | None]:
+    problem, _ = build_matrix_problem(**day_inputs, initial_soc=initial_soc, battery_params=battery_params)
+    status, objective_value, x, _ = solve_horizon_problem(
+        problem, relaxed=relaxed, stats=stats, solver_config=solver_config
+    )
+    return status, objective_value, x
+
+
+def _place_blocks(blocks: list[sparse.csr_array], columns: np.ndarray, n_variables: int) -> sparse.csr_array:
+    # stacks the asset blocks' rows and moves each block's columns to columns[asset]
+    coo = [block.tocoo() for block in blocks]
+    row_offsets = np.cumsum([0] + [block.shape[0] for block in blocks])
+    rows = np.concatenate([block.row + offset for block, offset in zip(coo, row_offsets)])
+    cols = np.concatenate([columns[asset][block.col] for asset, block in enumerate(coo)])
+    vals = np.concatenate([block.data for block in coo])
+    return sparse.csr_array((vals, (rows, cols)), shape=(row_offsets[-1], n_variables))
@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.matrix_model import MARKETS
+
+
+@dataclass(frozen=True)
+class HorizonLayout:
+    # Same formulation as MatrixLayout, over n_days consecutive days with SOC chained
+    # across midnight and one y/w pair per day. Periods are numbered day-major, so
+    # period p is timepoint p % n_timepoints of day p // n_timepoints.
+    # column order: X[APX], X[SSP], Z[APX], Z[SSP], y[days], w[days], SOC[0..P], charge_mode
+    n_days: int
+    n_timepoints: int = 48
+
+    @property
+    def n_periods(self) -> int:
+        return self.n_days * self.n_timepoints
+
+    def X(self, market: str) -> slice:
+        start = MARKETS.index(market) * self.n_periods
+        return slice(start, start + self.n_periods)
+
+    def Z(self, market: str) -> slice:
+        start = (len(MARKETS) + MARKETS.index(market)) * self.n_periods
+        return slice(start, start + self.n_periods)
+
+    @property
+    def y(self) -> slice:
+        start = 2 * len(MARKETS) * self.n_periods
+        return slice(start, start + self.n_days)
+
+    @property
+    def w(self) -> slice:
+        return slice(self.y.stop, self.y.stop + self.n_days)
+
+    @property
+    def SOC(self) -> slice:
+        return slice(self.w.stop, self.w.stop + self.n_periods + 1)
+
+    @property
+    def charge_mode(self) -> slice:
+        return slice(self.SOC.stop, self.SOC.stop + self.n_periods)
+
+    @property
+    def n_variables(self) -> int:
+        return self.charge_mode.stop
+
+    @property
+    def day_of_period(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_days), self.n_timepoints)
+
+    def charge_flows(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        day = self.day_of_period
+        charge_flow = x[self.y][day] / self.n_timepoints + sum(x[self.X(m)] for m in MARKETS)
+        discharge_flow = x[self.w][day] / self.n_timepoints + sum(x[self.Z(m)] for m in MARKETS)
+        return charge_flow, discharge_flow
+
+
+@dataclass
+class HorizonProblem:
+    # c is the objective to maximise; solvers that minimise must negate it
+    c: np.ndarray
+    A_ub: sparse.csr_array
+    b_ub: np.ndarray
+    A_eq: sparse.csr_array
+    b_eq: np.ndarray
+    lower_bounds: np.ndarray
+    upper_bounds: np.ndarray
+    integrality: np.ndarray
+    layout: HorizonLayout
+
+
+def build_horizon_objective(
+    layout: HorizonLayout,
+    apx_prices: np.ndarray,
+    ssp_prices: np.ndarray,
+    daily_prices: np.ndarray,
+    final_soc_price: float,
+) -> np.ndarray:
+    c = np.zeros(layout.n_variables)
+    for market, market_prices in zip(MARKETS, [apx_prices, ssp_prices]):
+        market_prices = np.asarray(market_prices, dtype=float).ravel()
+        c[layout.X(market)] = -market_prices
+        c[layout.Z(market)] = market_prices
+    c[layout.y] = -np.asarray(daily_prices, dtype=float)
+    c[layout.w] = daily_prices
+    c[layout.SOC.stop - 1] = final_soc_price
+    return c
+
+
+def build_horizon_constraint_matrices(
+    layout: HorizonLayout,
+    battery_params: BatteryParameters,
+) -> tuple[sparse.csr_array, np.ndarray, sparse.csr_array]:
+    n_periods = layout.n_periods
+    p = np.arange(n_periods)
+    day = layout.day_of_period
+    soc = layout.SOC.start
+    charge_mode = layout.charge_mode.start
+    daily_share = np.full(n_periods, 1 / layout.n_timepoints)
+
+    # equality rows: SOC_initial, then SOC_update_p for each period
+    eq_rows = [np.array([0]), 1 + p, 1 + p, 1 + p, 1 + p]
+    eq_cols = [np.array([soc]), soc + 1 + p, soc + p, layout.y.start + day, layout.w.start + day]
+    eq_vals = [
+        np.ones(1),
+        np.ones(n_periods),
+        -np.ones(n_periods),
+        -battery_params.frac_charged * daily_share,
+        battery_params.frac_discharged * daily_share,
+    ]
+    for market in MARKETS:
+        eq_rows += [1 + p, 1 + p]
+        eq_cols += [layout.X(market).start + p, layout.Z(market).start + p]
+        eq_vals += [
+            np.full(n_periods, -battery_params.frac_charged),
+            np.full(n_periods, battery_params.frac_discharged),
+        ]
+    A_eq = sparse.csr_array(
+        (np.concatenate(eq_vals), (np.concatenate(eq_rows), np.concatenate(eq_cols))),
+        shape=(n_periods + 1, layout.n_variables),
+    )
+
+    # inequality rows: Charge_limit_p for each period, then Discharge_limit_p
+    discharge = n_periods + p
+    ub_rows = [p, p, discharge, discharge]
+    ub_cols = [layout.y.start + day, charge_mode + p, layout.w.start + day, charge_mode + p]
+    ub_vals = [
+        daily_share,
+        np.full(n_periods, -battery_params.X_max),
+        daily_share,
+        np.full(n_periods, battery_params.Z_max),
+    ]
+    for market in MARKETS:
+        ub_rows += [p, discharge]
+        ub_cols += [layout.X(market).start + p, layout.Z(market).start + p]
+        ub_vals += [np.ones(n_periods), np.ones(n_periods)]
+    A_ub = sparse.csr_array(
+        (np.concatenate(ub_vals), (np.concatenate(ub_rows), np.concatenate(ub_cols))),
+        shape=(2 * n_periods, layout.n_variables),
+    )
+    b_ub = np.concatenate([np.zeros(n_periods), np.full(n_periods, battery_params.Z_max)])
+    return A_ub, b_ub, A_eq
+
+
+def build_horizon_variable_bounds(
+    layout: HorizonLayout,
+    battery_params: BatteryParameters,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    lower_bounds = np.zeros(layout.n_variables)
+    upper_bounds = np.empty(layout.n_variables)
+    for market in MARKETS:
+        upper_bounds[layout.X(market)] = battery_params.X_max
+        upper_bounds[layout.Z(market)] = battery_params.Z_max
+    upper_bounds[layout.y] = battery_params.y_max
+    upper_bounds[layout.w] = battery_params.w_max
+    upper_bounds[layout.SOC] = battery_params.C_max
+    upper_bounds[layout.charge_mode] = 1
+
+    integrality = np.zeros(layout.n_variables, dtype=np.uint8)
+    integrality[layout.charge_mode] = 1
+    return lower_bounds, upper_bounds, integrality
+
+
+def build_horizon_problem(
+    apx_prices: np.ndarray,
+    ssp_prices: np.ndarray,
+    daily_prices: np.ndarray,
+    final_soc_price: float,
+    initial_soc: float,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+) -> HorizonProblem:
+    # apx_prices and ssp_prices are (days x timepoints), daily_prices has one price per day
+    apx_prices = np.asarray(apx_prices, dtype=float)
+    layout = HorizonLayout(n_days=apx_prices.shape[0], n_timepoints=apx_prices.shape[1])
+
+    c = build_horizon_objective(layout, apx_prices, ssp_prices, daily_prices, final_soc_price)
+    A_ub, b_ub, A_eq = build_horizon_constraint_matrices(layout, battery_params)
+    b_eq = np.zeros(A_eq.shape[0])
+    b_eq[0] = initial_soc
+    lower_bounds, upper_bounds, integrality = build_horizon_variable_bounds(layout, battery_params)
+
+    return HorizonProblem(
+        c=c,
+        A_ub=A_ub,
+        b_ub=b_ub,
+        A_eq=A_eq,
+        b_eq=b_eq,
+        lower_bounds=lower_bounds,
+        upper_bounds=upper_bounds,
+        integrality=integrality,
+        layout=layout,
+    )
+
+
+def split_horizon_solution(layout: HorizonLayout, x: np.ndarray) -> dict[str, np.ndarray]:
+    # reshape the solution vector into per-day arrays: (days x timepoints) for the
+    # half-hourly variables, SOC at the start of each period, and y/w per day
+    shape = (layout.n_days, layout.n_timepoints)
+    soc = x[layout.SOC]
+    return {
+        "X": np.stack([x[layout.X(m)].reshape(shape) for m in MARKETS]),
+        "Z": np.stack([x[layout.Z(m)].reshape(shape) for m in MARKETS]),
+        "y": x[layout.y],
+        "w": x[layout.w],
+        "SOC": soc[:-1].reshape(shape),
+        "end_soc": soc[layout.n_timepoints :: layout.n_timepoints],
+    }
+
+
+def first_days_of_solution(solution: dict[str, np.ndarray], n_days: int) -> dict[str, np.ndarray]:
+    # the split_horizon_solution arrays for only the first n_days
+    return {
+        key: values[:, :n_days] if key in ["X", "Z"] else values[:n_days]
+        for key, values in solution.items()
+    }
@@ -0,0 +1,138 @@
+import cProfile
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+
+# one shared no-op context manager, so a disabled timer allocates nothing
+_NO_OP = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("times", "key", "start")
+
+    def __init__(self, times: dict, key: str):
+        self.times = times
+        self.key = key
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.times[self.key] = self.times.get(self.key, 0.0) + time.perf_counter() - self.start
+
+
+class Metrics:
+    # Per-day stage timings, counters and solver statistics for the backtest loop:
+    #   metrics.start_day(day)
+    #   with metrics.timer("build"): ...
+    #   solve_problem(problem, stats=metrics.solver_stats())
+    # Timers used before the first start_day (e.g. checking the whole range) are
+    # kept in run_times. A disabled Metrics hands out a shared no-op timer and no
+    # stats dict, so the calls can stay in the loop at negligible cost.
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.rows: list[dict] = []
+        self.run_times: dict[str, float] = {}
+        self.current: dict | None = None
+        # the timer columns, told apart from solver statistics such as solver_time
+        self.stages: dict[str, None] = {}
+
+    def start_day(self, day: pd.Timestamp) -> None:
+        if self.enabled:
+            self.current = {"date": day}
+            self.rows.append(self.current)
+
+    def timer(self, stage: str):
+        if not self.enabled:
+            return _NO_OP
+        self.stages[f"{stage}_time"] = None
+        if self.current is None:
+            return _Timer(self.run_times, f"{stage}_time")
+        return _Timer(self.current, f"{stage}_time")
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled and self.current is not None:
+            self.current[name] = self.current.get(name, 0) + n
+
+    def record(self, **values) -> None:
+        if self.enabled and self.current is not None:
+            self.current.update(values)
+
+    def solver_stats(self) -> dict | None:
+        # the current day's row, for a solver to add its statistics to
+        return self.current if self.enabled else None
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.rows)
+
+    def stage_totals(self) -> pd.Series:
+        # total seconds per stage over the whole run
+        df = self.to_frame()
+        stages = [stage for stage in self.stages if stage in df]
+        totals = df[stages].sum() if not df.empty else pd.Series(dtype=float)
+        return pd.concat([pd.Series(self.run_times, dtype=float), totals])
+
+
+DISABLED = Metrics(enabled=False)
+
+
+class LatencyHistogram:
+    # Latencies counted into fixed log-spaced buckets from 10us to 100s, so recording
+    # is O(1) memory however long a service runs. Percentiles are read off the
+    # bucket counts, as the upper edge of the bucket they fall in.
+
+    def __init__(self, buckets_per_decade: int = 10):
+        self.edges = np.logspace(-5, 2, 7 * buckets_per_decade + 1)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.total = 0.0
+
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
+
+    def record(self, seconds: float) -> None:
+        self.counts[np.searchsorted(self.edges, seconds)] += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        # seconds, or nan before anything is recorded
+        if not self.n:
+            return float("nan")
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.n))
+        return float(self.edges[min(bucket, len(self.edges) - 1)])
+
+    def summary(self) -> dict[str, float]:
+        # milliseconds
+        return {
+            "count": self.n,
+            "mean_ms": 1000 * self.total / self.n if self.n else float("nan"),
+            **{f"p{q}_ms": 1000 * self.percentile(q) for q in [50, 90, 99]},
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        # the non-empty buckets, by upper edge in milliseconds
+        upper = np.append(self.edges, np.inf)
+        nonzero = self.counts > 0
+        return pd.DataFrame({"upper_ms": 1000 * upper[nonzero], "count": self.counts[nonzero]})
+
+
+@contextmanager
+def profile(path: Path | None) -> Iterator[None]:
+    # cProfile everything inside the block and dump the stats to path, for
+    # python -m pstats or snakeviz; does nothing when path is None
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
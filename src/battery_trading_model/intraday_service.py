@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from http import HTTPStatus
+from pathlib import Path
+
+import highspy
+import numpy as np
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.day_model import DayModel
+from battery_trading_model.instrumentation import LatencyHistogram
+from battery_trading_model.matrix_model import MARKETS, build_objective
+from battery_trading_model.solver import (
+    DEFAULT_SOLVER_CONFIG,
+    HIGHS_STATUS,
+    SolverConfig,
+    configure_highs,
+    record_highs_stats,
+    solve_highs_relaxed,
+)
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+# one thread per solve, since the batteries are solved side by side, and solves
+# stopped after 50ms with their best schedule so far
+INTRADAY_SOLVER_CONFIG = SolverConfig(threads=1, time_limit=0.05)
+# the status of a schedule cut short by the time limit, as opposed to Not Solved
+# when there is no schedule at all
+TIME_LIMIT = "Time Limit"
+
+
+class IntradayModel(DayModel):
+    # A DayModel re-solved during its day. The periods before `period` have already
+    # been traded, so their half-hourly trades are fixed at zero and the SOC measured
+    # at the start of `period` is pinned in place of the SOC at midnight. The daily
+    # ONS volumes are fixed once committed. Only costs and bounds change between
+    # calls, so each re-solve starts from the previous one's basis and charge modes.
+
+    def __init__(
+        self,
+        n_timepoints: int = 48,
+        battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+        solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    ):
+        super().__init__(n_timepoints, battery_params=battery_params, solver_config=solver_config)
+        # SOC_initial stays free; the pinned SOC column takes its place
+        self.highs.changeRowBounds(0, -highspy.kHighsInf, highspy.kHighsInf)
+        # presolve and the search heuristics cost more than they save on one small
+        # day re-solved many times, where the previous charge modes are a good start
+        for option in ["mip_heuristic_run_feasibility_jump", "mip_heuristic_run_rins", "mip_heuristic_run_rens"]:
+            self.highs.setOptionValue(option, False)
+        self.highs.setOptionValue("presolve", "off")
+
+    def reoptimise(
+        self,
+        period: int,
+        apx_prices: list[float],
+        ssp_prices: list[float],
+        soc: float,
+        daily_price: float,
+        final_soc_price: float,
+        daily_volumes: tuple[float, float] | None = None,
+        relaxed: bool = False,
+        stats: dict | None = None,
+    ) -> tuple[str, float | None, np.ndarray | None]:
+        # prices are for the remaining periods, period to the end of the day.
+        # daily_volumes are the committed ONS (purchase, sale), or None to choose them.
+        # relaxed solves as the relaxed engine does, which is exact and only an LP
+        # when no period wants to charge and discharge at once. Returns the status, the value of the rest of the day and
+        # the solution in MatrixLayout order
+        layout = self.layout
+        n_remaining = self.n_timepoints - period
+        if not 0 <= period < self.n_timepoints:
+            raise ValueError(f"period must be between 0 and {self.n_timepoints - 1}, got {period}")
+        if len(apx_prices) != n_remaining or len(ssp_prices) != n_remaining:
+            raise ValueError(
+                f"Expected {n_remaining} prices for periods {period} to {self.n_timepoints - 1}, "
+                f"but got {len(apx_prices)} and {len(ssp_prices)}"
+            )
+
+        elapsed = [0.0] * period
+        self.problem.c = build_objective(
+            layout, elapsed + list(apx_prices), elapsed + list(ssp_prices), daily_price, final_soc_price
+        )
+        lower_bounds = self.problem.lower_bounds.copy()
+        upper_bounds = self.problem.upper_bounds.copy()
+        for market in MARKETS:
+            upper_bounds[layout.X(market).start : layout.X(market).start + period] = 0
+            upper_bounds[layout.Z(market).start : layout.Z(market).start + period] = 0
+        soc_column = layout.SOC.start + period
+        lower_bounds[layout.SOC.start : soc_column] = -highspy.kHighsInf
+        upper_bounds[layout.SOC.start : soc_column] = highspy.kHighsInf
+        lower_bounds[soc_column] = upper_bounds[soc_column] = soc
+        if daily_volumes is not None:
+            lower_bounds[layout.y] = upper_bounds[layout.y] = daily_volumes[0]
+            lower_bounds[layout.w] = upper_bounds[layout.w] = daily_volumes[1]
+
+        self.highs.changeColsCost(len(self.columns), self.columns, self.problem.c)
+        self.highs.changeColsBounds(len(self.columns), self.columns, lower_bounds, upper_bounds)
+        if relaxed:
+            status, objective_value, x, _ = solve_highs_relaxed(self.highs, layout, stats=stats)
+            return status, objective_value, x
+
+        if self.solver_config.warm_start and self.previous_charge_mode is not None:
+            self.highs.setSolution(len(self.charge_mode_columns), self.charge_mode_columns, self.previous_charge_mode)
+
+        start = time.perf_counter()
+        self.highs.run()
+        status = HIGHS_STATUS.get(self.highs.getModelStatus(), "Undefined")
+        if status == "Not Solved" and not self._has_solution() and self.previous_charge_mode is not None:
+            # out of time before finding any schedule: keep the previous charge modes
+            # and re-solve only the trades, an LP
+            self._solve_with_charge_mode(self.previous_charge_mode)
+        record_highs_stats(stats, self.highs, time.perf_counter() - start)
+        if status != "Optimal":
+            if not self._has_solution():
+                self.previous_charge_mode = None
+                return status, None, None
+            # stopped by solver_config.time_limit, with the best schedule so far,
+            # which may be worth less than the optimal one
+            status = TIME_LIMIT
+
+        x = np.asarray(self.highs.getSolution().col_value)
+        self.previous_charge_mode = x[layout.charge_mode].round()
+        return status, self.highs.getInfo().objective_function_value, x
+
+    def _has_solution(self) -> bool:
+        return self.highs.getInfo().primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible
+
+    def _solve_with_charge_mode(self, charge_mode: np.ndarray) -> None:
+        # the charge modes stay fixed until the next reoptimise resets every bound
+        columns = self.charge_mode_columns
+        self.highs.changeColsBounds(len(columns), columns, charge_mode, charge_mode)
+        self.highs.setOptionValue("time_limit", highspy.kHighsInf)
+        self.highs.run()
+        configure_highs(self.highs, self.solver_config)
+
+
+class IntradayService:
+    # One warm IntradayModel per battery behind a small asyncio HTTP/1.1 server:
+    #   POST /batteries/<battery>/reoptimise  {"period", "apx_prices", "ssp_prices",
+    #       "soc", "daily_price", "final_soc_price", optional "daily_volumes": [y, w]}
+    #   GET /metrics  request and solve latency percentiles and histograms
+    #   GET /health
+    # Solves run on worker threads so the event loop keeps accepting requests; a
+    # lock per battery keeps each model to one solve at a time.
+
+    def __init__(
+        self,
+        batteries: dict[str, BatteryParameters],
+        solver_config: SolverConfig = INTRADAY_SOLVER_CONFIG,
+        relaxed: bool = False,
+    ):
+        self.models = {
+            battery: IntradayModel(battery_params=battery_params, solver_config=solver_config)
+            for battery, battery_params in batteries.items()
+        }
+        self.relaxed = relaxed
+        self.locks = {battery: asyncio.Lock() for battery in batteries}
+        self.request_latency = LatencyHistogram()
+        self.solve_latency = LatencyHistogram()
+
+    async def reoptimise(self, battery: str, request: dict) -> dict:
+        model = self.models[battery]
+        period = int(request["period"])
+        daily_volumes = request.get("daily_volumes")
+        async with self.locks[battery]:
+            start = time.perf_counter()
+            status, objective_value, x = await asyncio.to_thread(
+                model.reoptimise,
+                period,
+                request["apx_prices"],
+                request["ssp_prices"],
+                float(request["soc"]),
+                float(request["daily_price"]),
+                float(request["final_soc_price"]),
+                None if daily_volumes is None else tuple(daily_volumes),
+                self.relaxed,
+            )
+            self.solve_latency.record(time.perf_counter() - start)
+        if x is None:
+            return {"battery": battery, "period": period, "status": status}
+        return {
+            "battery": battery,
+            "period": period,
+            "status": status,
+            "objective": objective_value,
+            **_schedule(model, period, x),
+        }
+
+    def metrics(self) -> dict:
+        return {
+            name: {**histogram.summary(), "histogram": histogram.to_frame().values.tolist()}
+            for name, histogram in [("request", self.request_latency), ("solve", self.solve_latency)]
+        }
+
+    async def route(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        parts = path.strip("/").split("/")
+        if method == "GET" and parts == ["health"]:
+            return HTTPStatus.OK, {"batteries": list(self.models)}
+        if method == "GET" and parts == ["metrics"]:
+            return HTTPStatus.OK, self.metrics()
+        if method == "POST" and len(parts) == 3 and parts[0] == "batteries" and parts[2] == "reoptimise":
+            if parts[1] not in self.models:
+                return HTTPStatus.NOT_FOUND, {"error": f"Unknown battery {parts[1]}"}
+            start = time.perf_counter()
+            try:
+                response = await self.reoptimise(parts[1], json.loads(body))
+            except (KeyError, TypeError, ValueError) as e:
+                return HTTPStatus.BAD_REQUEST, {"error": f"{type(e).__name__}: {e}"}
+            self.request_latency.record(time.perf_counter() - start)
+            return HTTPStatus.OK, response
+        return HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # keep-alive: serves requests on the connection until the client closes it
+        try:
+            while request_line := await reader.readline():
+                method, path, _ = request_line.decode().split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self.route(method, path, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.Server:
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def send_request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    method: str,
+    path: str,
+    payload: dict | None = None,
+) -> tuple[int, dict]:
+    # one request on an open keep-alive connection to the service
+    data = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, value = line.decode().split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+
+
+def load_batteries(path: Path | None) -> dict[str, BatteryParameters]:
+    # a json object of battery name to BatteryParameters fields; one default battery without
+    if path is None:
+        return {"battery": DEFAULT_BATTERY_PARAMETERS}
+    return {battery: BatteryParameters(**fields) for battery, fields in json.loads(path.read_text()).items()}
+
+
+async def serve(service: IntradayService, host: str, port: int) -> None:
+    server = await service.start(host, port)
+    logger.info(f"Serving {len(service.models)} batteries on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def _schedule(model: IntradayModel, period: int, x: np.ndarray) -> dict:
+    # the remaining periods' trades, the SOC from period to the end of the day, and the daily volumes
+    layout = model.layout
+    remaining = slice(period, layout.n_timepoints)
+    return {
+        "X": {market: x[layout.X(market)][remaining].tolist() for market in MARKETS},
+        "Z": {market: x[layout.Z(market)][remaining].tolist() for market in MARKETS},
+        "SOC": x[layout.SOC][period:].tolist(),
+        "y": float(x[layout.y]),
+        "w": float(x[layout.w]),
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve intraday re-optimisation of warm battery models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batteries", type=Path, help="json of battery name to BatteryParameters fields")
+    parser.add_argument("--mip-rel-gap", type=float, default=None)
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=INTRADAY_SOLVER_CONFIG.time_limit,
+        help=f"seconds per solve, after which the best schedule so far is returned with status {TIME_LIMIT}",
+    )
+    parser.add_argument(
+        "--relaxed",
+        action="store_true",
+        help="solve the LP relaxation first, as the relaxed engine, which is faster when prices rarely "
+        "make charging and discharging in the same period pay",
+    )
+    args = parser.parse_args()
+
+    batteries = load_batteries(args.batteries)
+    solver_config = SolverConfig(threads=1, mip_rel_gap=args.mip_rel_gap, time_limit=args.time_limit)
+    service = IntradayService(batteries, solver_config, relaxed=args.relaxed)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info(f"Request latency: {service.request_latency.summary()}")
@@ -1,11 +1,40 @@
+import argparse
 import logging
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import asdict
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-from battery_trading_model.constants import DATA_DIR
+from battery_trading_model.backtest_output import PRICE_INPUTS, BacktestWriter
+from battery_trading_model.constants import DATA_DIR, DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.day_model import DayModel
+from battery_trading_model.dp_solver import solve_dp_problem
+from battery_trading_model.fleet_model import SharedConstraints, solve_fleet
+from battery_trading_model.instrumentation import DISABLED, Metrics, profile
+from battery_trading_model.horizon_model import build_horizon_problem, first_days_of_solution, split_horizon_solution
+from battery_trading_model.matrix_model import MatrixLayout, build_matrix_problem
 from battery_trading_model.model import build_problem
-from battery_trading_model.solver import evaluate_profit, solve_problem, get_final_soc
-from battery_trading_model.utils import build_model_results_dataframe, filter_data_by_day, get_avg_daily_price, check_data, save_model_results
+from battery_trading_model.rolling_horizon import WindowModel
+from battery_trading_model.solver import (
+    DEFAULT_SOLVER_CONFIG,
+    SOLVERS,
+    SolverConfig,
+    charge_mode_values,
+    solve_horizon_problem,
+    solve_matrix_problem,
+    solve_matrix_problem_relaxed,
+    solve_problem,
+)
+from battery_trading_model.price_data import NOMINAL_PERIODS, PRICE_POLICIES, PriceCube, load_price_cube
+from battery_trading_model.solution import solution_vector, split_day_solution
+from battery_trading_model.sensitivity import SENSITIVITY_MODES, annual_marginal_values, day_sensitivity
+from battery_trading_model.solve_cache import SolveCache
+from battery_trading_model.utils import build_horizon_results, save_model_results
 
 logger = logging.getLogger(__name__)
 if not logging.getLogger().handlers:
@@ -15,91 +44,737 @@ if not logging.getLogger().handlers:
     )
 
 
-if __name__ == "__main__":
+# pulp: build_problem + CBC, matrix: build_matrix_problem + HiGHS,
+# day-model: one DayModel reused across days with prices swapped in place,
+# relaxed: matrix problem solved as an LP, adding charge_mode binaries only where needed,
+# dp: dynamic programming over a discretised SOC grid, for fast approximate screening
+ENGINES = ["pulp", "matrix", "day-model", "relaxed", "dp"]
 
-    # load the price data
-    apx_data = pd.read_csv(DATA_DIR / "apx_data_2023.csv") # half hourly
-    ssp_data = pd.read_csv(DATA_DIR / "ssp_data_2023.csv") # half hourly
-    ons_data = pd.read_csv(DATA_DIR / "ons_data_2023.csv") # daily
 
-    start_day = pd.to_datetime(apx_data["datetime"]).min().normalize()
-    num_days = 5
-    start_of_day_soc = 0  # first day will start at 0, but will be updated each day
+def run_backtest(
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    start_of_day_soc: float = 0,
+    engine: str = "pulp",
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    writer: BacktestWriter | None = None,
+    metrics: Metrics = DISABLED,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    solve_cache: SolveCache | None = None,
+    sensitivity: list[dict] | None = None,
+    sensitivity_mode: str = "fixed",
+    data_policy: str = "fail",
+) -> tuple[list[pd.DataFrame], list[pd.DataFrame]]:
+    # with a writer, each day is streamed to disk as it completes and the returned
+    # lists stay empty. metrics collects per-day stage timings and solver statistics,
+    # and solve_cache skips days solved before with the same inputs. Given a
+    # sensitivity list, each day's marginal parameter values are appended to it.
+    # data_policy decides what happens to days with gaps or duplicates: "fail" raises
+    # before solving anything, "fill" fills them (PriceCube.filled) and "skip" leaves
+    # them out, carrying the SOC over to the next day
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}, expected one of {ENGINES}")
+    if data_policy not in PRICE_POLICIES:
+        raise ValueError(f"Unknown data policy {data_policy}, expected one of {PRICE_POLICIES}")
+
+    # one DayModel per day length, as clock-change days have 46 or 50 periods
+    day_models: dict[int, DayModel] = {}
+    initial_values = None
+
+    first_day = price_cube.day_index(start_day)
+    days = slice(first_day, first_day + num_days)
+    with metrics.timer("check"):
+        skipped = np.zeros(num_days, dtype=bool)
+        if data_policy == "fail":
+            price_cube.check_days(days)
+        elif data_policy == "skip":
+            skipped = price_cube.bad_days(days)
+        elif price_cube.bad_days(days).any():
+            price_cube = price_cube.filled()
+        avg_prices = price_cube.avg_prices
 
-    daily_profits: list[float] = []
-    daily_objectives: list[float] = []
     daily_results: list[pd.DataFrame] = []
     daily_summary: list[pd.DataFrame] = []
+    solve_paths = Counter()
 
-    for day_offset in range(num_days):
+    for i in range(first_day, first_day + num_days):
 
-        day = start_day + pd.Timedelta(days=day_offset)
+        day = price_cube.days[i]
+        if skipped[i - first_day]:
+            logger.warning(f"Skipping {day.date().isoformat()}, which has gaps or duplicates in its price data")
+            continue
+        metrics.start_day(day)
 
         logger.info(f"Processing data for {day.date().isoformat()}...")
 
-        apx_day = filter_data_by_day(apx_data, day)
-        ssp_day = filter_data_by_day(ssp_data, day)
-        ons_day = filter_data_by_day(ons_data, day)
+        with metrics.timer("data"):
+            timepoints = price_cube.timepoints(slice(i, i + 1))
+            day_inputs = _day_inputs(price_cube, i, avg_prices, start_of_day_soc)
+
+        # a day with the same inputs and settings as one solved before is read back
+        # from the cache instead of being built and solved again
+        cache_key = solve_cache.key(engine, day_inputs, battery_params, solver_config) if solve_cache else None
+        cached = solve_cache.get(cache_key) if solve_cache else None
+        if cached is not None:
+            status, objective_value, x = cached
+            initial_values = None
+            logger.info(f"Status: {status} (cached)")
+            metrics.record(status=status, cached=True)
+        else:
+            n_timepoints = len(day_inputs["apx_prices"])
+            if initial_values is not None and len(initial_values) != n_timepoints:
+                # a clock-change day has other periods than the day before, so its
+                # charge modes are no start for this one
+                initial_values = None
+            with metrics.timer("build"):
+                if engine in ["matrix", "relaxed"]:
+                    problem, model = build_matrix_problem(**day_inputs, battery_params=battery_params)
+                elif engine == "pulp":
+                    problem, model = build_problem(**day_inputs, battery_params=battery_params)
+                elif engine == "day-model" and n_timepoints not in day_models:
+                    day_models[n_timepoints] = DayModel(
+                        n_timepoints, battery_params=battery_params, solver_config=solver_config
+                    )
+
+            logger.info("Solving the optimization problem...")
+            # solver statistics go into the metrics row when metrics are enabled
+            stats = metrics.solver_stats()
+            stats = {} if stats is None else stats
+            with metrics.timer("solve"):
+                if engine == "day-model":
+                    day_model = day_models[n_timepoints]
+                    status, objective_value = day_model.update(
+                        prices=[day_inputs["apx_prices"], day_inputs["ssp_prices"]],
+                        q=day_inputs["daily_price"],
+                        v=day_inputs["final_soc_price"],
+                        initial_soc=start_of_day_soc,
+                        stats=stats,
+                    )
+                    model = day_model.model
+                elif engine == "dp":
+                    status, objective_value, model = solve_dp_problem(**day_inputs, battery_params=battery_params)
+                elif engine == "relaxed":
+                    status, objective_value, path = solve_matrix_problem_relaxed(
+                        problem, stats=stats, solver_config=solver_config
+                    )
+                    solve_paths[path] += 1
+                    metrics.record(path=path)
+                elif engine == "matrix":
+                    status, objective_value = solve_matrix_problem(problem, stats=stats, solver_config=solver_config)
+                else:
+                    status, objective_value = solve_problem(
+                        problem, stats=stats, solver_config=solver_config, initial_values=initial_values
+                    )
+                    initial_values = charge_mode_values(problem)
+            with metrics.timer("extract"):
+                x = solution_vector(model)
+            logger.info(
+                f"Status: {status}, MIP gap: {stats.get('mip_gap')}, solver time: {stats.get('solver_time')}"
+            )
+            metrics.record(status=status)
+            if solve_cache is not None and status == "Optimal":
+                solve_cache.put(cache_key, status, objective_value, x)
+
+        if sensitivity is not None:
+            with metrics.timer("sensitivity"):
+                values = day_sensitivity(day_inputs, x, battery_params=battery_params, mode=sensitivity_mode)
+            sensitivity.append({"date": day, **values})
+
+        with metrics.timer("extract"):
+            apx_prices, ssp_prices = price_cube.day_prices(i)
+            solution = split_day_solution(MatrixLayout(n_timepoints=len(apx_prices)), x)
+            results_df, daily_profits = build_horizon_results(
+                solution,
+                apx_prices=apx_prices[None],
+                ssp_prices=ssp_prices[None],
+                daily_prices=price_cube.daily_prices[i : i + 1],
+                timepoints=timepoints,
+            )
+        daily_profit = float(daily_profits[0])
+        logger.info(f"Estimated profit: {daily_profit}")
+        logger.info(f"Objective value: {objective_value}") # includes theoretical price of remaining SOC
+
+        final_soc = float(solution["end_soc"][0])
+        start_of_day_soc = final_soc
+
+        summary_df = pd.DataFrame(
+            [
+                {
+                    "date": day,
+                    "profit": daily_profit,
+                    "objective": objective_value,
+                    "end_soc": final_soc,
+                }
+            ]
+        )
+        if writer is not None:
+            with metrics.timer("write"):
+                writer.append_day(day, results_df, summary_df, day_inputs)
+        else:
+            daily_results.append(results_df)
+            daily_summary.append(summary_df)
+
+    if solve_paths:
+        logger.info(f"Relaxed solve paths over {num_days} days: {dict(solve_paths)}")
+    if solve_cache is not None:
+        logger.info(f"Solve cache: {solve_cache.hits} hits, {solve_cache.misses} misses")
+
+    return daily_results, daily_summary
+
 
-        check_data(apx_day, ssp_day, ons_day)
-        final_soc_price = get_avg_daily_price(apx_day, ssp_day, ons_day)
-        timepoints = apx_day["datetime"].to_list()
+def _day_inputs(price_cube: PriceCube, i: int, avg_prices: np.ndarray, initial_soc: float) -> dict:
+    apx_prices, ssp_prices = price_cube.day_prices(i)
+    return dict(
+        apx_prices=apx_prices.tolist(),
+        ssp_prices=ssp_prices.tolist(),
+        daily_price=float(price_cube.daily_prices[i]),
+        final_soc_price=float(avg_prices[i]),
+        initial_soc=initial_soc,
+    )
+
+
+def run_streaming_backtest(
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    output_dir: Path,
+    resume: bool = False,
+    start_of_day_soc: float = 0,
+    engine: str = "pulp",
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    metrics: Metrics = DISABLED,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    solve_cache: SolveCache | None = None,
+    sensitivity: list[dict] | None = None,
+    sensitivity_mode: str = "fixed",
+    incremental: bool = False,
+    soc_tolerance: float = 1e-6,
+    data_policy: str = "fail",
+) -> BacktestWriter:
+    # run_backtest writing each day to output_dir as it goes. With resume, carries on
+    # after the last checkpointed day with its end SOC. incremental resumes too, but
+    # first re-solves the completed days whose prices have been revised since
+    run = {
+        "start_day": price_cube.days[price_cube.day_index(start_day)],
+        "num_days": num_days,
+        "start_of_day_soc": start_of_day_soc,
+        "engine": engine,
+        "battery_params": asdict(battery_params),
+        "solver_config": asdict(solver_config),
+        "data_policy": data_policy,
+    }
+    writer = BacktestWriter(output_dir, run, resume=resume or incremental)
+    if incremental and writer.completed_days:
+        update_revised_days(
+            price_cube,
+            writer,
+            start_day,
+            start_of_day_soc=start_of_day_soc,
+            engine=engine,
+            battery_params=battery_params,
+            solver_config=solver_config,
+            solve_cache=solve_cache,
+            soc_tolerance=soc_tolerance,
+            data_policy=data_policy,
+        )
+    # skipped days are never written, so resume after the last day written rather
+    # than after completed_days days
+    first_day = price_cube.day_index(start_day)
+    next_day = first_day
+    if writer.completed_days:
+        logger.info(f"Resuming after {writer.completed_days} completed days")
+        start_of_day_soc = writer.end_soc
+        next_day = price_cube.day_index(pd.Timestamp(writer.last_day, tz=price_cube.days.tz)) + 1
+
+    if next_day == first_day + num_days:
+        return writer
 
-        problem, model = build_problem(
-            apx_prices=apx_day["price"].to_list(),
-            ssp_prices=ssp_day["price"].to_list(),
-            daily_price=ons_day["price"].item(),
+    run_backtest(
+        price_cube,
+        start_day=price_cube.days[next_day],
+        num_days=first_day + num_days - next_day,
+        start_of_day_soc=start_of_day_soc,
+        engine=engine,
+        battery_params=battery_params,
+        writer=writer,
+        metrics=metrics,
+        solver_config=solver_config,
+        solve_cache=solve_cache,
+        sensitivity=sensitivity,
+        sensitivity_mode=sensitivity_mode,
+        data_policy=data_policy,
+    )
+    return writer
+
+
+def update_revised_days(
+    price_cube: PriceCube,
+    writer: BacktestWriter,
+    start_day: pd.Timestamp,
+    start_of_day_soc: float = 0,
+    engine: str = "pulp",
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    solve_cache: SolveCache | None = None,
+    soc_tolerance: float = 1e-6,
+    data_policy: str = "fail",
+) -> list[pd.Timestamp]:
+    # Each day only depends on its own prices and the SOC it starts with, so after
+    # a price revision only the revised days, and the days after them whose start
+    # SOC moves, need solving again. Walks the days from start_day to the writer's
+    # last day comparing the current inputs with the stored ones, re-solves and
+    # patches the days that differ, and goes back to keeping stored days once a
+    # re-solved day ends at its stored SOC again. Days stored without inputs are
+    # treated as revised. With the skip policy, stored days whose revised prices
+    # are now bad are removed, and skipped days whose revised prices are now good
+    # are solved and added.
+    if data_policy == "fill":
+        price_cube = price_cube.filled()
+    avg_prices = price_cube.avg_prices
+    stored_summary = writer.read_summary()
+    stored_end_socs = dict(zip(stored_summary["date"], stored_summary["end_soc"]))
+    last_day = price_cube.day_index(pd.Timestamp(writer.last_day, tz=price_cube.days.tz))
+
+    patched_days = []
+    soc = start_of_day_soc
+    for i in range(price_cube.day_index(start_day), last_day + 1):
+        day = price_cube.days[i]
+        skipped = data_policy == "skip" and price_cube.bad_days(slice(i, i + 1))[0]
+        stored = day in stored_end_socs
+        if skipped:
+            # as in a fresh run, the day is left out and its start SOC carried on
+            if stored:
+                logger.warning(f"Removing {day.date().isoformat()}, whose revised price data has gaps or duplicates")
+                writer.remove_day(day, soc)
+                patched_days.append(day)
+            continue
+
+        day_inputs = _day_inputs(price_cube, i, avg_prices, soc)
+        if stored:
+            stored_inputs = writer.read_inputs(day)
+            unchanged = stored_inputs is not None and all(
+                np.array_equal(stored_inputs[name], day_inputs[name]) for name in PRICE_INPUTS
+            )
+            if unchanged and abs(stored_inputs["initial_soc"] - soc) <= soc_tolerance:
+                soc = float(stored_end_socs[day])
+                continue
+            reason = (
+                "revised prices" if not unchanged else f"start SOC {soc} instead of {stored_inputs['initial_soc']}"
+            )
+            logger.info(f"Re-solving {day.date().isoformat()} for {reason}")
+        else:
+            logger.info(f"Solving {day.date().isoformat()}, skipped before its prices were revised")
+
+        daily_results, daily_summary = run_backtest(
+            price_cube,
+            start_day=day,
+            num_days=1,
+            start_of_day_soc=soc,
+            engine=engine,
+            battery_params=battery_params,
+            solver_config=solver_config,
+            solve_cache=solve_cache,
+            data_policy=data_policy,
+        )
+        if stored:
+            writer.patch_day(day, daily_results[0], daily_summary[0], day_inputs)
+        else:
+            writer.insert_day(day, daily_results[0], daily_summary[0], day_inputs)
+        patched_days.append(day)
+        soc = float(daily_summary[0]["end_soc"].iloc[0])
+
+    logger.info(f"Re-solved {len(patched_days)} of {writer.completed_days} stored days")
+    return patched_days
+
+
+def run_horizon_backtest(
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    start_of_day_soc: float = 0,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    relaxed: bool = True,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[list[pd.DataFrame], list[pd.DataFrame]]:
+    # solves all num_days as one problem, with SOC chained across midnight, and only
+    # the SOC left at the end of the horizon valued at the last day's average price
+    first_day = price_cube.day_index(start_day)
+    days = slice(first_day, first_day + num_days)
+    price_cube.check_days(days)
+    price_cube.check_uniform(days)
+    final_soc_price = float(price_cube.avg_prices[days.stop - 1])
+
+    logger.info(f"Building one problem over {num_days} days...")
+    problem = build_horizon_problem(
+        apx_prices=price_cube.apx_prices[days, :NOMINAL_PERIODS],
+        ssp_prices=price_cube.ssp_prices[days, :NOMINAL_PERIODS],
+        daily_prices=price_cube.daily_prices[days],
+        final_soc_price=final_soc_price,
+        initial_soc=start_of_day_soc,
+        battery_params=battery_params,
+    )
+    logger.info("Solving the optimization problem...")
+    status, objective_value, x, path = solve_horizon_problem(problem, relaxed=relaxed, solver_config=solver_config)
+    logger.info(f"Status: {status} (path: {path})")
+    if x is None:
+        raise ValueError(f"Horizon problem could not be solved, status: {status}")
+
+    solution = split_horizon_solution(problem.layout, x)
+    results_df, daily_profits = build_horizon_results(
+        solution,
+        apx_prices=price_cube.apx_prices[days, :NOMINAL_PERIODS],
+        ssp_prices=price_cube.ssp_prices[days, :NOMINAL_PERIODS],
+        daily_prices=price_cube.daily_prices[days],
+        timepoints=price_cube.timepoints(days),
+    )
+    daily_objectives = daily_profits.copy()
+    daily_objectives[-1] += final_soc_price * solution["end_soc"][-1]
+
+    n_timepoints = problem.layout.n_timepoints
+    daily_results = [
+        results_df.iloc[d * n_timepoints : (d + 1) * n_timepoints] for d in range(num_days)
+    ]
+    daily_summary = [
+        pd.DataFrame(
+            [
+                {
+                    "date": price_cube.days[first_day + d],
+                    "profit": daily_profits[d],
+                    "objective": daily_objectives[d],
+                    "end_soc": solution["end_soc"][d],
+                }
+            ]
+        )
+        for d in range(num_days)
+    ]
+    logger.info(f"Objective value: {objective_value}")
+    return daily_results, daily_summary
+
+
+def run_rolling_backtest(
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    window_days: int = 3,
+    commit_days: int = 1,
+    terminal_soc_price: float | None = None,
+    start_of_day_soc: float = 0,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[list[pd.DataFrame], list[pd.DataFrame], pd.DataFrame]:
+    # Solves a window_days look-ahead, commits the first commit_days of it and rolls
+    # forward. The SOC left at the end of each window is valued at terminal_soc_price,
+    # or the average price of the window's last day if not given. The window never
+    # looks past the end of the backtest, so the last steps use shorter windows.
+    if not 1 <= commit_days <= window_days:
+        raise ValueError("commit_days must be between 1 and window_days")
+
+    first_day = price_cube.day_index(start_day)
+    last_day = first_day + num_days
+    price_cube.check_days(slice(first_day, last_day))
+    price_cube.check_uniform(slice(first_day, last_day))
+    avg_prices = price_cube.avg_prices
+    window_models: dict[int, WindowModel] = {}
+
+    daily_results: list[pd.DataFrame] = []
+    daily_summary: list[pd.DataFrame] = []
+    step_metrics: list[dict] = []
+
+    i = first_day
+    while i < last_day:
+        n_days = min(window_days, last_day - i)
+        window = slice(i, i + n_days)
+
+        start = time.perf_counter()
+        if n_days not in window_models:
+            window_models[n_days] = WindowModel(n_days, battery_params=battery_params, solver_config=solver_config)
+        window_model = window_models[n_days]
+        final_soc_price = (
+            float(avg_prices[window.stop - 1]) if terminal_soc_price is None else terminal_soc_price
+        )
+        window_model.set_prices(
+            apx_prices=price_cube.apx_prices[window, :NOMINAL_PERIODS],
+            ssp_prices=price_cube.ssp_prices[window, :NOMINAL_PERIODS],
+            daily_prices=price_cube.daily_prices[window],
             final_soc_price=final_soc_price,
             initial_soc=start_of_day_soc,
         )
+        build_time = time.perf_counter() - start
 
-        logger.info("Solving the optimization problem...")
-        status, objective_value = solve_problem(problem)
-        logger.info(f"Status: {status}")
-
-        daily_profit = evaluate_profit(
-            P=model["P"],
-            q=model["q"],
-            X=model["X"],
-            Z=model["Z"],
-            y=model["y"],
-            w=model["w"],
-        )
-        daily_profits.append(daily_profit)
-        logger.info(f"Estimated profit: {daily_profit}")
-        logger.info(f"Objective value: {objective_value}") # includes theoretical price of remaining SOC
+        start = time.perf_counter()
+        stats = {}
+        status, objective_value, x, path = window_model.solve(stats=stats)
+        solve_time = time.perf_counter() - start
+        if x is None:
+            raise ValueError(
+                f"Window from {price_cube.days[i].date().isoformat()} could not be solved, status: {status}"
+            )
 
-        results_df = build_model_results_dataframe(
-            X=model["X"],
-            Z=model["Z"],
-            y=model["y"],
-            w=model["w"],
-            SOC=model["SOC"],
-            timepoints=timepoints,
+        solution = split_horizon_solution(window_model.layout, x)
+        n_commit = min(commit_days, n_days)
+        committed = first_days_of_solution(solution, n_commit)
+        committed_days = slice(i, i + n_commit)
+        results_df, daily_profits = build_horizon_results(
+            committed,
+            apx_prices=price_cube.apx_prices[committed_days, :NOMINAL_PERIODS],
+            ssp_prices=price_cube.ssp_prices[committed_days, :NOMINAL_PERIODS],
+            daily_prices=price_cube.daily_prices[committed_days],
+            timepoints=price_cube.timepoints(committed_days),
         )
-        daily_results.append(results_df)
-
-        final_soc = get_final_soc(model["SOC"])
-        initial_soc = final_soc
-
-        daily_summary.append(
-            pd.DataFrame(
-                [
-                    {
-                        "date": day,
-                        "profit": daily_profit,
-                        "objective": objective_value,
-                        "end_soc": final_soc,
-                    }
-                ]
+
+        n_timepoints = window_model.layout.n_timepoints
+        for d in range(n_commit):
+            daily_results.append(results_df.iloc[d * n_timepoints : (d + 1) * n_timepoints])
+            daily_summary.append(
+                pd.DataFrame(
+                    [
+                        {
+                            "date": price_cube.days[i + d],
+                            "profit": daily_profits[d],
+                            "objective": daily_profits[d],
+                            "end_soc": committed["end_soc"][d],
+                        }
+                    ]
+                )
             )
+
+        step_metrics.append(
+            {
+                "date": price_cube.days[i],
+                "window_days": n_days,
+                "status": status,
+                "path": path,
+                "build_time": build_time,
+                "solve_time": solve_time,
+                "mip_gap": stats.get("mip_gap"),
+            }
+        )
+        logger.info(
+            f"Window from {price_cube.days[i].date().isoformat()}: "
+            f"{status} ({path}), build {build_time:.3f}s, solve {solve_time:.3f}s, MIP gap {stats.get('mip_gap')}"
         )
 
-    output_path = DATA_DIR / "result.csv"
-    save_model_results(daily_results=daily_results, path=output_path)
+        start_of_day_soc = committed["end_soc"][-1]
+        i += n_commit
+
+    # like the horizon mode, only the SOC left at the very end is valued
+    last_summary = daily_summary[-1]
+    last_summary["objective"] += final_soc_price * last_summary["end_soc"]
+
+    return daily_results, daily_summary, pd.DataFrame(step_metrics)
+
+
+def run_fleet_backtest(
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    batteries: list[BatteryParameters],
+    shared: SharedConstraints = SharedConstraints(),
+    start_of_day_socs: list[float] | None = None,
+    relaxed: bool = True,
+    max_workers: int | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[list[list[pd.DataFrame]], list[pd.DataFrame]]:
+    # The daily backtest for a fleet of batteries trading the same prices, each
+    # carrying its own SOC from day to day. Returns each asset's daily results frames
+    # (daily_results[asset], as run_backtest returns for one battery) and a summary
+    # row per asset and day. Without shared constraints, the assets are solved
+    # separately across max_workers processes (in this process if 1).
+    first_day = price_cube.day_index(start_day)
+    price_cube.check_days(slice(first_day, first_day + num_days))
+    avg_prices = price_cube.avg_prices
+    socs = [0.0] * len(batteries) if start_of_day_socs is None else list(start_of_day_socs)
+
+    daily_results: list[list[pd.DataFrame]] = [[] for _ in batteries]
+    daily_summary: list[pd.DataFrame] = []
+    parallel = not shared.active and max_workers != 1
+    with ProcessPoolExecutor(max_workers=max_workers) if parallel else nullcontext() as executor:
+        for i in range(first_day, first_day + num_days):
+            day = price_cube.days[i]
+            day_inputs = _day_inputs(price_cube, i, avg_prices, initial_soc=0.0)
+            day_inputs = {name: day_inputs[name] for name in PRICE_INPUTS}
+            logger.info(f"Solving {len(batteries)} batteries for {day.date().isoformat()}...")
+            status, objective_value, solutions = solve_fleet(
+                batteries,
+                **day_inputs,
+                initial_socs=socs,
+                shared=shared,
+                relaxed=relaxed,
+                executor=executor,
+                solver_config=solver_config,
+            )
+            if solutions is None:
+                raise Exception(f"Fleet solve for {day.date().isoformat()} failed with status {status}")
+            logger.info(f"Status: {status}, objective value: {objective_value}")
+
+            rows = []
+            for asset, solution in enumerate(solutions):
+                results_df, daily_profits = build_horizon_results(
+                    solution,
+                    apx_prices=np.asarray([day_inputs["apx_prices"]]),
+                    ssp_prices=np.asarray([day_inputs["ssp_prices"]]),
+                    daily_prices=price_cube.daily_prices[i : i + 1],
+                    timepoints=price_cube.timepoints(slice(i, i + 1)),
+                )
+                daily_results[asset].append(results_df)
+                socs[asset] = float(solution["end_soc"][0])
+                rows.append({"date": day, "asset": asset, "profit": float(daily_profits[0]), "end_soc": socs[asset]})
+            daily_summary.append(pd.DataFrame(rows))
+
+    return daily_results, daily_summary
+
+
+if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Run the battery trading backtest")
+    parser.add_argument("--num-days", type=int, default=5)
+    parser.add_argument("--engine", choices=ENGINES, default="pulp")
+    parser.add_argument(
+        "--horizon",
+        action="store_true",
+        help="solve all days as one problem instead of one problem per day",
+    )
+    parser.add_argument(
+        "--rolling",
+        action="store_true",
+        help="solve a look-ahead window of --window-days, committing --commit-days at a time",
+    )
+    parser.add_argument("--window-days", type=int, default=3)
+    parser.add_argument("--commit-days", type=int, default=1)
+    parser.add_argument("--terminal-soc-price", type=float, default=None)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="carry on a daily backtest from its last checkpointed day in --output-dir",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="re-solve only the days in --output-dir whose prices were revised, and the days they affect",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=DATA_DIR / "backtest",
+        help="where a daily backtest streams each completed day and its checkpoint",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="time every stage of the daily backtest and save them with solver statistics to metrics.csv",
+    )
+    parser.add_argument("--profile", type=Path, help="dump cProfile stats of the whole run to this file")
+    parser.add_argument(
+        "--solver",
+        choices=SOLVERS,
+        default="cbc",
+        help="backend for the pulp engine, falling back to another if not installed",
+    )
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per solve")
+    parser.add_argument("--mip-rel-gap", type=float, default=None, help="e.g. 0.001 to stop within 0.1%%")
+    parser.add_argument("--mip-abs-gap", type=float, default=None)
+    parser.add_argument("--no-warm-start", action="store_true", help="do not start from the previous day's solution")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="reuse day solutions from earlier runs with the same inputs and settings",
+    )
+    parser.add_argument("--cache-size-mb", type=float, default=256)
+    parser.add_argument(
+        "--sensitivity",
+        choices=SENSITIVITY_MODES,
+        help="save each day's marginal value of C_max, c_rate, d_rate and initial SOC to sensitivity.csv, "
+        "from the duals of the LP with the solved charge modes fixed, or of the LP relaxation",
+    )
+    parser.add_argument(
+        "--data-policy",
+        choices=PRICE_POLICIES,
+        default="fail",
+        help="for days with gaps or duplicates in the price data: stop, fill them in, or skip them",
+    )
+    parser.add_argument(
+        "--timezone",
+        default="UTC",
+        help="timezone days run midnight to midnight in, e.g. Europe/London for 46 and 50 period clock-change days",
+    )
+    args = parser.parse_args()
+    metrics = Metrics(enabled=args.metrics)
+    sensitivity = [] if args.sensitivity else None
+    solver_config = SolverConfig(
+        solver=args.solver,
+        threads=args.threads,
+        time_limit=args.time_limit,
+        mip_rel_gap=args.mip_rel_gap,
+        mip_abs_gap=args.mip_abs_gap,
+        warm_start=not args.no_warm_start,
+    )
+
+    # load the price data
+    price_cube = load_price_cube(timezone=args.timezone)
+
+    start_day = price_cube.days[0]
+    num_days = args.num_days
+
+    with profile(args.profile):
+        if args.rolling:
+            daily_results, daily_summary, _ = run_rolling_backtest(
+                price_cube,
+                start_day=start_day,
+                num_days=num_days,
+                window_days=args.window_days,
+                commit_days=args.commit_days,
+                terminal_soc_price=args.terminal_soc_price,
+                solver_config=solver_config,
+            )
+        elif args.horizon:
+            daily_results, daily_summary = run_horizon_backtest(
+                price_cube,
+                start_day=start_day,
+                num_days=num_days,
+                solver_config=solver_config,
+            )
+        else:
+            writer = run_streaming_backtest(
+                price_cube,
+                start_day=start_day,
+                num_days=num_days,
+                output_dir=args.output_dir,
+                resume=args.resume,
+                incremental=args.incremental,
+                engine=args.engine,
+                metrics=metrics,
+                solver_config=solver_config,
+                solve_cache=SolveCache(max_bytes=int(args.cache_size_mb * 1024**2)) if args.cache else None,
+                sensitivity=sensitivity,
+                sensitivity_mode=args.sensitivity or "fixed",
+                data_policy=args.data_policy,
+            )
+
+    output_path = DATA_DIR / "result.csv"
     summary_path = DATA_DIR / "daily_summary.csv"
-    pd.concat(daily_summary, ignore_index=True).to_csv(summary_path, index=False)
-    logger.info(f"Daily summary saved to {summary_path}")
+    if args.rolling or args.horizon:
+        save_model_results(daily_results=daily_results, path=output_path)
+        summary_df = pd.concat(daily_summary, ignore_index=True)
+        summary_df.to_csv(summary_path, index=False)
+        logger.info(f"Daily summary saved to {summary_path}")
+    else:
+        summary_df = writer.finalise(output_path, summary_path)
+
+    logger.info(f"Total profit over {num_days} days: {summary_df['profit'].sum()}")
+
+    if sensitivity:
+        sensitivity_df = pd.DataFrame(sensitivity)
+        sensitivity_path = DATA_DIR / "sensitivity.csv"
+        sensitivity_df.to_csv(sensitivity_path, index=False)
+        logger.info(f"Marginal values per day saved to {sensitivity_path}")
+        logger.info(f"Marginal values per year:\n{annual_marginal_values(sensitivity_df).to_string(index=False)}")
 
-    logger.info(f"Total profit over {num_days} days: {sum(daily_profits)}")
\ No newline at end of file
+    if metrics.rows:
+        metrics_path = DATA_DIR / "metrics.csv"
+        metrics.to_frame().to_csv(metrics_path, index=False)
+        logger.info(f"Per-day metrics saved to {metrics_path}")
+        logger.info(f"Seconds per stage:\n{metrics.stage_totals().to_string()}")
+    if args.profile:
+        logger.info(f"Profile saved to {args.profile}, view with python -m pstats {args.profile}")
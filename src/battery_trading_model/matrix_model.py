@@ -0,0 +1,271 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+
+
+MARKETS = ["APX", "SSP"]
+
+
+class MatrixSolution:
+    # the solver's solution vector, shared by every variable of a problem, so a
+    # solve stores it once rather than writing each variable's value
+    __slots__ = ("x",)
+
+    def __init__(self):
+        self.x: np.ndarray | None = None
+
+
+class MatrixVariable:
+    # stand-in for a pulp LpVariable, so evaluate_profit and
+    # build_model_results_dataframe can read .varValue after a solve
+    __slots__ = ("name", "index", "solution")
+
+    def __init__(self, name: str, index: int, solution: MatrixSolution):
+        self.name = name
+        self.index = index
+        self.solution = solution
+
+    @property
+    def varValue(self) -> float | None:
+        x = self.solution.x
+        return None if x is None else float(x[self.index])
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+@dataclass(frozen=True)
+class MatrixLayout:
+    # column order: X[APX], X[SSP], Z[APX], Z[SSP], y, w, SOC[0..T], charge_mode
+    n_timepoints: int
+
+    def X(self, market: str) -> slice:
+        start = MARKETS.index(market) * self.n_timepoints
+        return slice(start, start + self.n_timepoints)
+
+    def Z(self, market: str) -> slice:
+        start = (len(MARKETS) + MARKETS.index(market)) * self.n_timepoints
+        return slice(start, start + self.n_timepoints)
+
+    @property
+    def y(self) -> int:
+        return 2 * len(MARKETS) * self.n_timepoints
+
+    @property
+    def w(self) -> int:
+        return self.y + 1
+
+    @property
+    def SOC(self) -> slice:
+        return slice(self.w + 1, self.w + 2 + self.n_timepoints)
+
+    @property
+    def charge_mode(self) -> slice:
+        return slice(self.SOC.stop, self.SOC.stop + self.n_timepoints)
+
+    @property
+    def n_variables(self) -> int:
+        return self.charge_mode.stop
+
+    def charge_flows(self, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        charge_flow = x[self.y] / self.n_timepoints + sum(x[self.X(m)] for m in MARKETS)
+        discharge_flow = x[self.w] / self.n_timepoints + sum(x[self.Z(m)] for m in MARKETS)
+        return charge_flow, discharge_flow
+
+
+@dataclass
+class MatrixProblem:
+    # c is the objective to maximise; solvers that minimise must negate it
+    c: np.ndarray
+    A_ub: sparse.csr_array
+    b_ub: np.ndarray
+    A_eq: sparse.csr_array
+    b_eq: np.ndarray
+    lower_bounds: np.ndarray
+    upper_bounds: np.ndarray
+    integrality: np.ndarray
+    layout: MatrixLayout
+    variables: list[MatrixVariable]
+
+    @property
+    def x(self) -> np.ndarray | None:
+        # the last solution in MatrixLayout order, or None before a successful solve
+        return self.variables[0].solution.x
+
+    def set_solution(self, x: np.ndarray | None) -> None:
+        self.variables[0].solution.x = x
+
+
+def build_objective(
+    layout: MatrixLayout,
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+    final_soc_price: float,
+) -> np.ndarray:
+    c = np.zeros(layout.n_variables)
+    for market, market_prices in zip(MARKETS, [apx_prices, ssp_prices]):
+        market_prices = np.asarray(market_prices, dtype=float)
+        c[layout.X(market)] = -market_prices
+        c[layout.Z(market)] = market_prices
+    c[layout.y] = -daily_price
+    c[layout.w] = daily_price
+    c[layout.SOC.stop - 1] = final_soc_price
+    return c
+
+
+def build_constraint_matrices(
+    layout: MatrixLayout,
+    battery_params: BatteryParameters,
+) -> tuple[sparse.csr_array, np.ndarray, sparse.csr_array]:
+    n_timepoints = layout.n_timepoints
+    t = np.arange(n_timepoints)
+    soc = layout.SOC.start
+    charge_mode = layout.charge_mode.start
+
+    # equality rows: SOC_initial, then SOC_update_t for each t
+    eq_rows = [np.array([0]), 1 + t, 1 + t]
+    eq_cols = [np.array([soc]), soc + 1 + t, soc + t]
+    eq_vals = [np.ones(1), np.ones(n_timepoints), -np.ones(n_timepoints)]
+    for market in MARKETS:
+        eq_rows += [1 + t, 1 + t]
+        eq_cols += [layout.X(market).start + t, layout.Z(market).start + t]
+        eq_vals += [
+            np.full(n_timepoints, -battery_params.frac_charged),
+            np.full(n_timepoints, battery_params.frac_discharged),
+        ]
+    eq_rows += [1 + t, 1 + t]
+    eq_cols += [np.full(n_timepoints, layout.y), np.full(n_timepoints, layout.w)]
+    eq_vals += [
+        np.full(n_timepoints, -battery_params.frac_charged / n_timepoints),
+        np.full(n_timepoints, battery_params.frac_discharged / n_timepoints),
+    ]
+    A_eq = sparse.csr_array(
+        (np.concatenate(eq_vals), (np.concatenate(eq_rows), np.concatenate(eq_cols))),
+        shape=(n_timepoints + 1, layout.n_variables),
+    )
+
+    # inequality rows: Charge_limit_t for each t, then Discharge_limit_t for each t
+    discharge = n_timepoints + t
+    ub_rows = [t, t, discharge, discharge]
+    ub_cols = [
+        np.full(n_timepoints, layout.y),
+        charge_mode + t,
+        np.full(n_timepoints, layout.w),
+        charge_mode + t,
+    ]
+    ub_vals = [
+        np.full(n_timepoints, 1 / n_timepoints),
+        np.full(n_timepoints, -battery_params.X_max),
+        np.full(n_timepoints, 1 / n_timepoints),
+        np.full(n_timepoints, battery_params.Z_max),
+    ]
+    for market in MARKETS:
+        ub_rows += [t, discharge]
+        ub_cols += [layout.X(market).start + t, layout.Z(market).start + t]
+        ub_vals += [np.ones(n_timepoints), np.ones(n_timepoints)]
+    A_ub = sparse.csr_array(
+        (np.concatenate(ub_vals), (np.concatenate(ub_rows), np.concatenate(ub_cols))),
+        shape=(2 * n_timepoints, layout.n_variables),
+    )
+    b_ub = np.concatenate([np.zeros(n_timepoints), np.full(n_timepoints, battery_params.Z_max)])
+    return A_ub, b_ub, A_eq
+
+
+def build_variable_bounds(
+    layout: MatrixLayout,
+    battery_params: BatteryParameters,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    lower_bounds = np.zeros(layout.n_variables)
+    upper_bounds = np.empty(layout.n_variables)
+    for market in MARKETS:
+        upper_bounds[layout.X(market)] = battery_params.X_max
+        upper_bounds[layout.Z(market)] = battery_params.Z_max
+    upper_bounds[layout.y] = battery_params.y_max
+    upper_bounds[layout.w] = battery_params.w_max
+    upper_bounds[layout.SOC] = battery_params.C_max
+    upper_bounds[layout.charge_mode] = 1
+
+    integrality = np.zeros(layout.n_variables, dtype=np.uint8)
+    integrality[layout.charge_mode] = 1
+    return lower_bounds, upper_bounds, integrality
+
+
+def build_variables(layout: MatrixLayout) -> list[MatrixVariable]:
+    names = [""] * layout.n_variables
+    for t in range(layout.n_timepoints):
+        for market in MARKETS:
+            names[layout.X(market).start + t] = f"Half-hourly_Purchases_{market}_{t}"
+            names[layout.Z(market).start + t] = f"Half-hourly_Sales_{market}_{t}"
+        names[layout.charge_mode.start + t] = f"Charge_Mode_{t}"
+    for t in range(layout.n_timepoints + 1):
+        names[layout.SOC.start + t] = f"Battery_State_of_Charge_{t}"
+    names[layout.y] = "Daily_Purchases"
+    names[layout.w] = "Daily_Sales"
+    solution = MatrixSolution()
+    return [MatrixVariable(name, i, solution) for i, name in enumerate(names)]
+
+
+def build_model_dict(
+    layout: MatrixLayout,
+    variables: list[MatrixVariable],
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+) -> dict:
+    timepoints = list(range(layout.n_timepoints))
+    prices = {
+        market: dict(zip(timepoints, market_prices))
+        for market, market_prices in zip(MARKETS, [apx_prices, ssp_prices])
+    }
+    X = {market: dict(zip(timepoints, variables[layout.X(market)])) for market in MARKETS}
+    Z = {market: dict(zip(timepoints, variables[layout.Z(market)])) for market in MARKETS}
+    SOC = dict(enumerate(variables[layout.SOC]))
+    return {
+        "P": prices,
+        "q": daily_price,
+        "X": X,
+        "Z": Z,
+        "y": variables[layout.y],
+        "w": variables[layout.w],
+        "SOC": SOC,
+        "markets": list(MARKETS),
+        "timepoints": timepoints,
+    }
+
+
+def build_matrix_problem(
+    apx_prices: list[float],
+    ssp_prices: list[float],
+    daily_price: float,
+    final_soc_price: float,
+    initial_soc: float,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+) -> tuple[MatrixProblem, dict]:
+    # same formulation as model.build_problem, assembled directly as sparse arrays
+    layout = MatrixLayout(n_timepoints=len(apx_prices))
+
+    c = build_objective(layout, apx_prices, ssp_prices, daily_price, final_soc_price)
+    A_ub, b_ub, A_eq = build_constraint_matrices(layout, battery_params)
+    b_eq = np.zeros(A_eq.shape[0])
+    b_eq[0] = initial_soc
+    lower_bounds, upper_bounds, integrality = build_variable_bounds(layout, battery_params)
+    variables = build_variables(layout)
+
+    problem = MatrixProblem(
+        c=c,
+        A_ub=A_ub,
+        b_ub=b_ub,
+        A_eq=A_eq,
+        b_eq=b_eq,
+        lower_bounds=lower_bounds,
+        upper_bounds=upper_bounds,
+        integrality=integrality,
+        layout=layout,
+        variables=variables,
+    )
+    model = build_model_dict(layout, variables, apx_prices, ssp_prices, daily_price)
+    return problem, model
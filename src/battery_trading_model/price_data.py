@@ -0,0 +1,270 @@
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from battery_trading_model.constants import DATA_DIR
+from battery_trading_model.data_store import DataStore
+from battery_trading_model.matrix_model import MARKETS
+
+
+PERIOD = pd.Timedelta(minutes=30)
+# settlement periods in a day without a clock change
+NOMINAL_PERIODS = 48
+PRICE_POLICIES = ["fail", "fill", "skip"]
+
+
+@dataclass
+class PriceCube:
+    # All price data indexed by day, built once up front so a day is an O(1) slice.
+    # Days are midnight to midnight in the cube's timezone, so in Europe/London the
+    # clock-change days have 46 or 50 settlement periods; day i's prices are
+    # prices[i, :day_lengths[i]] and the slots after them are NaN. Half-hourly slots
+    # without data are NaN too, and the counts record how many rows each day had so
+    # duplicates and gaps can be told apart.
+    days: pd.DatetimeIndex  # (days,) midnights in the cube's timezone
+    datetimes: pd.DatetimeIndex  # (sum of day_lengths,) every half-hourly slot, in UTC
+    prices: np.ndarray  # (days, longest day, markets) in MARKETS order
+    daily_prices: np.ndarray  # (days,) ONS price
+    half_hourly_counts: np.ndarray  # (days, markets) rows per day in each csv
+    daily_counts: np.ndarray  # (days,) ONS rows per day
+    misaligned_counts: np.ndarray  # (days, markets) rows not on a half-hour boundary
+    duplicate_counts: np.ndarray  # (days, markets) slots with more than one row
+    day_lengths: np.ndarray  # (days,) settlement periods in each day
+
+    @property
+    def n_timepoints(self) -> int:
+        # periods in the longest day
+        return self.prices.shape[1]
+
+    @property
+    def apx_prices(self) -> np.ndarray:
+        return self.prices[:, :, MARKETS.index("APX")]
+
+    @property
+    def ssp_prices(self) -> np.ndarray:
+        return self.prices[:, :, MARKETS.index("SSP")]
+
+    @property
+    def period_mask(self) -> np.ndarray:
+        # (days, longest day): which slots are periods of their day
+        return np.arange(self.n_timepoints) < self.day_lengths[:, None]
+
+    @property
+    def avg_prices(self) -> np.ndarray:
+        # vectorised utils.get_avg_daily_price: the daily price counts once per timepoint
+        total = np.where(self.period_mask[:, :, None], self.prices, 0).sum(axis=(1, 2))
+        total += self.daily_prices * self.day_lengths
+        return total / (self.day_lengths * (len(MARKETS) + 1))
+
+    def day_index(self, day: pd.Timestamp) -> int:
+        day = pd.Timestamp(day)
+        day = day.tz_localize(self.days.tz) if day.tzinfo is None else day.tz_convert(self.days.tz)
+        return int(self.days.get_loc(day.normalize()))
+
+    def day_prices(self, i: int) -> tuple[np.ndarray, np.ndarray]:
+        # day i's APX and SSP prices, one per period of the day
+        n = self.day_lengths[i]
+        return self.apx_prices[i, :n], self.ssp_prices[i, :n]
+
+    def timepoints(self, days: slice) -> pd.DatetimeIndex:
+        offsets = np.concatenate([[0], np.cumsum(self.day_lengths)])
+        return self.datetimes[offsets[days.start] : offsets[days.stop]]
+
+    def validation_report(self, days: slice = slice(None)) -> pd.DataFrame:
+        # Every problem with the data in one vectorised pass, one row per day, source
+        # and issue: half-hourly slots with no price ("missing"), slots with more than
+        # one row ("duplicate"), rows off a half-hour boundary ("misaligned"), and a
+        # missing or duplicated ONS price. Clock-change days are listed as "short day"
+        # or "long day" from the "calendar" source, which are not errors.
+        start, stop, _ = days.indices(len(self.days))
+        lengths = self.day_lengths[start:stop]
+        half_hourly = {
+            "missing": (np.isnan(self.prices[start:stop]) & self.period_mask[start:stop, :, None]).sum(axis=1),
+            "duplicate": self.duplicate_counts[start:stop],
+            "misaligned": self.misaligned_counts[start:stop],
+        }
+        frames = []
+        for issue, counts in half_hourly.items():
+            day, market = np.nonzero(counts)
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "day": start + day,
+                        "source": np.asarray(MARKETS)[market],
+                        "issue": issue,
+                        "count": counts[day, market],
+                        "rows": self.half_hourly_counts[start + day, market],
+                        "expected": lengths[day],
+                    }
+                )
+            )
+
+        daily_counts = self.daily_counts[start:stop]
+        daily = {
+            "missing": (daily_counts == 0) | np.isnan(self.daily_prices[start:stop]),
+            "duplicate": daily_counts > 1,
+            "short day": lengths < NOMINAL_PERIODS,
+            "long day": lengths > NOMINAL_PERIODS,
+        }
+        for issue, flagged in daily.items():
+            day = np.flatnonzero(flagged)
+            calendar = issue.endswith(" day")
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "day": start + day,
+                        "source": "calendar" if calendar else "ONS",
+                        "issue": issue,
+                        "count": lengths[day] if calendar else np.maximum(daily_counts[day] - 1, 1),
+                        "rows": lengths[day] if calendar else daily_counts[day],
+                        "expected": NOMINAL_PERIODS if calendar else 1,
+                    }
+                )
+            )
+
+        report = pd.concat(frames, ignore_index=True).sort_values(["day", "source"], kind="stable")
+        report.insert(0, "date", self.days[report.pop("day").to_numpy()])
+        return report.reset_index(drop=True)
+
+    def bad_days(self, days: slice) -> np.ndarray:
+        # (days in the range,) True for the days validation_report has errors for
+        start, stop, _ = days.indices(len(self.days))
+        report = _errors(self.validation_report(days))
+        bad = np.zeros(stop - start, dtype=bool)
+        bad[self.days.get_indexer(report["date"]) - start] = True
+        return bad
+
+    def check_days(self, days: slice) -> None:
+        # raises with every problem with the data in the range, not just the first
+        errors = _errors(self.validation_report(days))
+        if errors.empty:
+            return
+        messages = []
+        for row in errors.itertuples():
+            day = row.date.date().isoformat()
+            kind = "daily data point" if row.source == "ONS" else "half-hourly data points"
+            messages.append(
+                f"{row.source}: expected {row.expected} {kind} on {day}, but got {row.rows} ({row.count} {row.issue})"
+            )
+        raise ValueError(f"{len(messages)} problems with the price data:\n" + "\n".join(messages))
+
+    def check_uniform(self, days: slice) -> None:
+        # whole-horizon and rolling models lay days out back to back at
+        # NOMINAL_PERIODS each, so take prices[days, :NOMINAL_PERIODS]
+        lengths = self.day_lengths[days]
+        irregular = np.flatnonzero(lengths != NOMINAL_PERIODS)
+        if len(irregular):
+            day = self.days[days][irregular[0]].date().isoformat()
+            raise ValueError(
+                f"{day} has {lengths[irregular[0]]} periods; multi-day models need every day to have "
+                f"{NOMINAL_PERIODS}, so run these days with the daily backtest"
+            )
+
+    def filled(self) -> "PriceCube":
+        # A copy with every gap filled, for the "fill" policy: missing half-hourly
+        # prices are interpolated over time (held flat at the ends), missing ONS prices
+        # take the previous day's. Duplicated slots keep their last row and
+        # misaligned rows are dropped.
+        mask = self.period_mask
+        prices = self.prices.copy()
+        prices[mask] = pd.DataFrame(self.prices[mask]).interpolate(limit_direction="both").to_numpy()
+        daily_prices = pd.Series(self.daily_prices).ffill().bfill().to_numpy()
+        return replace(
+            self,
+            prices=prices,
+            daily_prices=daily_prices,
+            half_hourly_counts=np.repeat(self.day_lengths[:, None], len(MARKETS), axis=1),
+            daily_counts=np.ones(len(self.days), dtype=np.int64),
+            misaligned_counts=np.zeros_like(self.misaligned_counts),
+            duplicate_counts=np.zeros_like(self.duplicate_counts),
+        )
+
+
+def build_price_cube(
+    apx_data: pd.DataFrame,
+    ssp_data: pd.DataFrame,
+    ons_data: pd.DataFrame,
+    timezone: str = "UTC",
+) -> PriceCube:
+    # days run midnight to midnight in timezone, e.g. "Europe/London" for settlement
+    # days, where the clock changes give days of 46 and 50 periods
+    half_hourly = {"APX": apx_data, "SSP": ssp_data}
+    datetimes = {
+        market: pd.DatetimeIndex(pd.to_datetime(df["datetime"], utc=True))
+        for market, df in half_hourly.items()
+    }
+    ons_datetimes = pd.DatetimeIndex(pd.to_datetime(ons_data["datetime"], utc=True))
+
+    first_day = min(dt.min() for dt in datetimes.values()).tz_convert(timezone).normalize()
+    last_day = max(dt.max() for dt in datetimes.values()).tz_convert(timezone).normalize()
+    days = pd.date_range(first_day, last_day, freq="D")
+    n_days = len(days)
+    # each day's start, and the start of the day after the last, in UTC
+    day_starts = days.append(pd.DatetimeIndex([days[-1] + pd.DateOffset(days=1)])).tz_convert("UTC")
+    day_lengths = np.asarray(np.diff(day_starts) // PERIOD.to_timedelta64(), dtype=np.int64)
+    width = int(day_lengths.max())
+
+    prices = np.full((n_days, width, len(MARKETS)), np.nan)
+    half_hourly_counts = np.zeros((n_days, len(MARKETS)), dtype=np.int64)
+    misaligned_counts = np.zeros((n_days, len(MARKETS)), dtype=np.int64)
+    duplicate_counts = np.zeros((n_days, len(MARKETS)), dtype=np.int64)
+    for m, market in enumerate(MARKETS):
+        day = day_starts.searchsorted(datetimes[market], side="right") - 1
+        seconds = np.asarray((datetimes[market] - day_starts[day]) // pd.Timedelta(seconds=1))
+        slot, remainder = np.divmod(seconds, PERIOD.seconds)
+        aligned = remainder == 0
+        prices[day[aligned], slot[aligned], m] = half_hourly[market]["price"].to_numpy(dtype=float)[aligned]
+        half_hourly_counts[:, m] = np.bincount(day, minlength=n_days)
+        misaligned_counts[:, m] = np.bincount(day[~aligned], minlength=n_days)
+        slot_counts = np.bincount(day[aligned] * width + slot[aligned], minlength=n_days * width)
+        duplicate_counts[:, m] = (slot_counts.reshape(n_days, width) > 1).sum(axis=1)
+
+    ons_day = days.get_indexer(ons_datetimes.tz_convert(timezone).normalize())
+    in_range = ons_day >= 0
+    daily_prices = np.full(n_days, np.nan)
+    daily_prices[ons_day[in_range]] = ons_data["price"].to_numpy(dtype=float)[in_range]
+    daily_counts = np.bincount(ons_day[in_range], minlength=n_days)
+
+    return PriceCube(
+        days=days,
+        datetimes=pd.date_range(day_starts[0], day_starts[-1], freq=PERIOD, inclusive="left"),
+        prices=prices,
+        daily_prices=daily_prices,
+        half_hourly_counts=half_hourly_counts,
+        daily_counts=daily_counts,
+        misaligned_counts=misaligned_counts,
+        duplicate_counts=duplicate_counts,
+        day_lengths=day_lengths,
+    )
+
+
+def load_price_cube(data_dir: Path = DATA_DIR, year: int = 2023, timezone: str = "UTC") -> PriceCube:
+    return build_price_cube(
+        apx_data=pd.read_csv(data_dir / f"apx_data_{year}.csv"),  # half hourly
+        ssp_data=pd.read_csv(data_dir / f"ssp_data_{year}.csv"),  # half hourly
+        ons_data=pd.read_csv(data_dir / f"ons_data_{year}.csv"),  # daily
+        timezone=timezone,
+    )
+
+
+def load_stored_price_cube(
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    store: DataStore | None = None,
+    timezone: str = "UTC",
+) -> PriceCube:
+    # [start, end) from the data store, which only reads the months in range and
+    # the datetime and price columns
+    store = store or DataStore()
+    return build_price_cube(
+        apx_data=store.load("apx", start, end),
+        ssp_data=store.load("ssp", start, end),
+        ons_data=store.load("ons", start, end),
+        timezone=timezone,
+    )
+
+
+def _errors(report: pd.DataFrame) -> pd.DataFrame:
+    return report[report["source"] != "calendar"]
@@ -0,0 +1,65 @@
+import highspy
+import numpy as np
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.horizon_model import build_horizon_objective, build_horizon_problem
+from battery_trading_model.solver import (
+    DEFAULT_SOLVER_CONFIG,
+    SolverConfig,
+    build_highs_lp,
+    configure_highs,
+    solve_highs_relaxed,
+)
+
+
+class WindowModel:
+    # An n_days look-ahead window built once and kept in a persistent HiGHS
+    # instance. Rolling forward only shifts the price coefficients and the
+    # SOC_initial right-hand side, like DayModel does for a single day.
+
+    def __init__(
+        self,
+        n_days: int,
+        n_timepoints: int = 48,
+        battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+        solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    ):
+        self.n_days = n_days
+        self.problem = build_horizon_problem(
+            apx_prices=np.zeros((n_days, n_timepoints)),
+            ssp_prices=np.zeros((n_days, n_timepoints)),
+            daily_prices=np.zeros(n_days),
+            final_soc_price=0.0,
+            initial_soc=0.0,
+            battery_params=battery_params,
+        )
+        self.layout = self.problem.layout
+        self.columns = np.arange(self.layout.n_variables, dtype=np.int32)
+
+        self.highs = highspy.Highs()
+        self.highs.silent()
+        configure_highs(self.highs, solver_config)
+        self.highs.passModel(build_highs_lp(self.problem))
+
+    def set_prices(
+        self,
+        apx_prices: np.ndarray,
+        ssp_prices: np.ndarray,
+        daily_prices: np.ndarray,
+        final_soc_price: float,
+        initial_soc: float,
+    ) -> None:
+        if np.shape(apx_prices) != (self.layout.n_days, self.layout.n_timepoints):
+            raise ValueError(
+                f"WindowModel was built for {self.layout.n_days} days of "
+                f"{self.layout.n_timepoints} timepoints, but got prices of shape {np.shape(apx_prices)}"
+            )
+        self.problem.c = build_horizon_objective(
+            self.layout, apx_prices, ssp_prices, daily_prices, final_soc_price
+        )
+        self.problem.b_eq[0] = initial_soc
+        self.highs.changeColsCost(len(self.columns), self.columns, self.problem.c)
+        self.highs.changeRowBounds(0, initial_soc, initial_soc)
+
+    def solve(self, stats: dict | None = None) -> tuple[str, float, np.ndarray | None, str]:
+        return solve_highs_relaxed(self.highs, self.layout, stats=stats)
@@ -0,0 +1,215 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from battery_trading_model.constants import DATA_DIR, DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.main import ENGINES, run_backtest
+from battery_trading_model.price_data import NOMINAL_PERIODS, PERIOD, PriceCube, load_price_cube
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+BACKTEST_LOGGER = "battery_trading_model.main"
+SCENARIO_METHODS = ["bootstrap", "noise"]
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def bootstrap_days(
+    n_history: int,
+    n_scenarios: int,
+    num_days: int,
+    block_days: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # (scenarios x days) indices into the history: each path is a run of randomly
+    # placed blocks of block_days consecutive days, so weekly and weather patterns
+    # within a block are kept
+    block_days = min(block_days, n_history)
+    n_blocks = -(-num_days // block_days)
+    starts = rng.integers(0, n_history - block_days + 1, size=(n_scenarios, n_blocks))
+    days = starts[:, :, None] + np.arange(block_days)
+    return days.reshape(n_scenarios, -1)[:, :num_days]
+
+
+def scenario_batches(
+    history: PriceCube,
+    n_scenarios: int,
+    num_days: int,
+    method: str = "bootstrap",
+    batch_size: int = 64,
+    block_days: int = 7,
+    noise_scale: float = 0.1,
+    seed: int = 0,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    # Price paths generated batch_size at a time, as (batch x days x timepoints x
+    # markets) half-hourly prices and (batch x days) ONS prices, so only one batch
+    # is ever in memory. "bootstrap" resamples blocks of historical days; "noise"
+    # adds normal noise to the first num_days of history, noise_scale standard
+    # deviations of each market and half-hour across the history. The same seed
+    # and batch_size give the same paths.
+    if method not in SCENARIO_METHODS:
+        raise ValueError(f"Unknown scenario method {method}, expected one of {SCENARIO_METHODS}")
+    history.check_days(slice(0, len(history.days)))
+    history.check_uniform(slice(0, len(history.days)))
+    if method == "noise" and num_days > len(history.days):
+        raise ValueError(f"Noise scenarios need {num_days} days of history, but only {len(history.days)} are loaded")
+
+    rng = np.random.default_rng(seed)
+    price_scale = noise_scale * history.prices[:, :NOMINAL_PERIODS].std(axis=0)
+    daily_scale = noise_scale * history.daily_prices.std()
+    for start in range(0, n_scenarios, batch_size):
+        n = min(batch_size, n_scenarios - start)
+        if method == "bootstrap":
+            days = bootstrap_days(len(history.days), n, num_days, block_days, rng)
+            yield history.prices[days, :NOMINAL_PERIODS], history.daily_prices[days]
+        else:
+            base_prices = history.prices[:num_days, :NOMINAL_PERIODS]
+            prices = base_prices + price_scale * rng.standard_normal((n, *base_prices.shape))
+            daily_prices = history.daily_prices[:num_days] + daily_scale * rng.standard_normal((n, num_days))
+            yield prices, daily_prices
+
+
+def scenario_price_cube(start_day: pd.Timestamp, prices: np.ndarray, daily_prices: np.ndarray) -> PriceCube:
+    # a complete PriceCube for one generated path, dated from start_day
+    n_days, n_timepoints, n_markets = prices.shape
+    days = pd.date_range(start_day, periods=n_days, freq="D")
+    return PriceCube(
+        days=days,
+        datetimes=pd.date_range(days[0], periods=n_days * n_timepoints, freq=PERIOD),
+        prices=prices,
+        daily_prices=daily_prices,
+        half_hourly_counts=np.full((n_days, n_markets), n_timepoints),
+        daily_counts=np.ones(n_days, dtype=np.int64),
+        misaligned_counts=np.zeros((n_days, n_markets), dtype=np.int64),
+        duplicate_counts=np.zeros((n_days, n_markets), dtype=np.int64),
+        day_lengths=np.full(n_days, n_timepoints),
+    )
+
+
+def run_stochastic_backtest(
+    history: PriceCube,
+    n_scenarios: int,
+    num_days: int,
+    method: str = "bootstrap",
+    engine: str = "relaxed",
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    batch_size: int = 64,
+    block_days: int = 7,
+    noise_scale: float = 0.1,
+    seed: int = 0,
+    max_workers: int | None = None,
+) -> np.ndarray:
+    # runs the daily backtest on every generated path across a process pool and
+    # returns the (scenarios x days) daily profits. Paths are sent to the pool one
+    # batch at a time, so memory is bounded by batch_size rather than n_scenarios
+    start_day = history.days[0]
+    daily_profits = np.empty((n_scenarios, num_days))
+    batches = scenario_batches(history, n_scenarios, num_days, method, batch_size, block_days, noise_scale, seed)
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(logging.getLogger(BACKTEST_LOGGER).level,),
+    ) as executor:
+        done = 0
+        for prices, daily_prices in batches:
+            futures = [
+                executor.submit(_run_scenario, start_day, prices[j], daily_prices[j], engine, battery_params)
+                for j in range(len(prices))
+            ]
+            for j, future in enumerate(futures):
+                daily_profits[done + j] = future.result()
+            done += len(futures)
+            logger.info(f"Finished {done}/{n_scenarios} scenarios")
+    return daily_profits
+
+
+def profit_percentiles(
+    daily_profits: np.ndarray,
+    days: pd.DatetimeIndex,
+    percentiles: list[float] = PERCENTILES,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # percentiles and mean of each day's profit across scenarios, and of the total
+    # profit over the whole path
+    columns = [f"p{percentile:g}" for percentile in percentiles]
+    daily = pd.DataFrame(np.percentile(daily_profits, percentiles, axis=0).T, columns=columns)
+    daily.insert(0, "date", days)
+    daily["mean"] = daily_profits.mean(axis=0)
+
+    totals = daily_profits.sum(axis=1)
+    total = pd.DataFrame([np.percentile(totals, percentiles)], columns=columns)
+    total["mean"] = totals.mean()
+    return daily, total
+
+
+def _init_worker(log_level: int) -> None:
+    logging.getLogger(BACKTEST_LOGGER).setLevel(log_level)
+
+
+def _run_scenario(
+    start_day: pd.Timestamp,
+    prices: np.ndarray,
+    daily_prices: np.ndarray,
+    engine: str,
+    battery_params: BatteryParameters,
+) -> np.ndarray:
+    price_cube = scenario_price_cube(start_day, prices, daily_prices)
+    _, daily_summary = run_backtest(
+        price_cube,
+        start_day=start_day,
+        num_days=len(daily_prices),
+        engine=engine,
+        battery_params=battery_params,
+    )
+    return pd.concat(daily_summary, ignore_index=True)["profit"].to_numpy()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run the backtest over generated price scenarios")
+    parser.add_argument("--scenarios", type=int, default=100)
+    parser.add_argument("--num-days", type=int, default=5)
+    parser.add_argument("--method", choices=SCENARIO_METHODS, default="bootstrap")
+    parser.add_argument("--block-days", type=int, default=7, help="length of the resampled blocks of days")
+    parser.add_argument("--noise-scale", type=float, default=0.1, help="noise in standard deviations of each half-hour")
+    parser.add_argument("--batch-size", type=int, default=64, help="scenarios generated and in memory at once")
+    parser.add_argument("--engine", choices=ENGINES, default="relaxed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    history = load_price_cube()
+
+    # per-day progress from every worker would drown out the scenario progress
+    logging.getLogger(BACKTEST_LOGGER).setLevel(logging.WARNING)
+
+    daily_profits = run_stochastic_backtest(
+        history,
+        n_scenarios=args.scenarios,
+        num_days=args.num_days,
+        method=args.method,
+        engine=args.engine,
+        batch_size=args.batch_size,
+        block_days=args.block_days,
+        noise_scale=args.noise_scale,
+        seed=args.seed,
+        max_workers=args.max_workers,
+    )
+
+    days = pd.date_range(history.days[0], periods=args.num_days, freq="D")
+    daily, total = profit_percentiles(daily_profits, days)
+    daily_path = DATA_DIR / "scenario_daily_profit.csv"
+    daily.to_csv(daily_path, index=False)
+    logger.info(f"Daily profit percentiles saved to {daily_path}")
+    logger.info(
+        f"Total profit over {args.num_days} days across {args.scenarios} scenarios:\n{total.to_string(index=False)}"
+    )
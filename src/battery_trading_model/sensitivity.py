@@ -0,0 +1,105 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.matrix_model import MARKETS, MatrixProblem, build_matrix_problem
+
+
+SENSITIVITY_MODES = ["fixed", "relaxed"]
+PARAMETERS = ["C_max", "c_rate", "d_rate"]
+
+
+def solve_dual_lp(
+    problem: MatrixProblem,
+    x: np.ndarray | None = None,
+    mode: str = "fixed",
+    tolerance: float = 1e-4,
+) -> dict[str, np.ndarray | float]:
+    # Solves an LP of the day and returns its solution and shadow prices, as the
+    # change in the (maximised) objective per unit of each row's or bound's slack.
+    # "fixed" fixes charge_mode to the side x charges or discharges on in each
+    # period, so the duals are those of the MIP solution x; "relaxed" solves the
+    # LP relaxation instead
+    if mode not in SENSITIVITY_MODES:
+        raise ValueError(f"Unknown sensitivity mode {mode}, expected one of {SENSITIVITY_MODES}")
+    layout = problem.layout
+    lower_bounds = problem.lower_bounds.copy()
+    upper_bounds = problem.upper_bounds.copy()
+    if mode == "fixed":
+        charge_flow, _ = layout.charge_flows(x)
+        charge_mode = np.where(charge_flow > tolerance, 1.0, 0.0)
+        lower_bounds[layout.charge_mode] = charge_mode
+        upper_bounds[layout.charge_mode] = charge_mode
+
+    result = linprog(
+        -problem.c,
+        A_ub=problem.A_ub,
+        b_ub=problem.b_ub,
+        A_eq=problem.A_eq,
+        b_eq=problem.b_eq,
+        bounds=np.column_stack([lower_bounds, upper_bounds]),
+        method="highs",
+    )
+    if result.status != 0:
+        raise Exception(f"Sensitivity LP failed: {result.message}")
+    # linprog minimises -c, so its marginals are the negated duals of the maximisation
+    return {
+        "x": result.x,
+        "objective": -result.fun,
+        "eq": -result.eqlin.marginals,
+        "ub": -result.ineqlin.marginals,
+        "upper": -result.upper.marginals,
+    }
+
+
+def marginal_values(
+    problem: MatrixProblem,
+    duals: dict[str, np.ndarray | float],
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+) -> dict[str, float]:
+    # The objective's derivative with respect to each parameter, from the duals of
+    # everything the parameter appears in (envelope theorem): C_max bounds every SOC;
+    # c_rate sets X_max, y_max and Charge_limit_t (y/T + sum X <= X_max * charge_mode);
+    # d_rate sets Z_max, w_max and Discharge_limit_t (w/T + sum Z <= Z_max * (1 - charge_mode));
+    # initial_soc is the right hand side of SOC_initial. Valid while the charge modes
+    # and the set of binding constraints stay the same
+    layout = problem.layout
+    n_timepoints = layout.n_timepoints
+    upper, ub = duals["upper"], duals["ub"]
+    charge_mode = duals["x"][layout.charge_mode]
+    # the rates only enter through linear properties, so the values at rate 1 are the slopes
+    per_rate = replace(battery_params, c_rate=1.0, d_rate=1.0)
+    return {
+        "C_max": float(upper[layout.SOC].sum()),
+        "c_rate": float(
+            per_rate.X_max * sum(upper[layout.X(market)].sum() for market in MARKETS)
+            + per_rate.y_max * upper[layout.y]
+            + per_rate.X_max * (ub[:n_timepoints] * charge_mode).sum()
+        ),
+        "d_rate": float(
+            per_rate.Z_max * sum(upper[layout.Z(market)].sum() for market in MARKETS)
+            + per_rate.w_max * upper[layout.w]
+            + per_rate.Z_max * (ub[n_timepoints:] * (1 - charge_mode)).sum()
+        ),
+        "initial_soc": float(duals["eq"][0]),
+    }
+
+
+def day_sensitivity(
+    day_inputs: dict,
+    x: np.ndarray,
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    mode: str = "fixed",
+) -> dict[str, float]:
+    # marginal values of a solved day, x in MatrixLayout order as any engine returns it
+    problem, _ = build_matrix_problem(**day_inputs, battery_params=battery_params)
+    return marginal_values(problem, solve_dual_lp(problem, x, mode), battery_params)
+
+
+def annual_marginal_values(sensitivity_df: pd.DataFrame) -> pd.DataFrame:
+    # summed per year: the profit one more unit of each parameter would have made
+    years = pd.DatetimeIndex(sensitivity_df["date"]).year.rename("year")
+    return sensitivity_df.groupby(years)[PARAMETERS].sum().reset_index()
@@ -0,0 +1,45 @@
+import numpy as np
+
+from battery_trading_model.matrix_model import MARKETS, MatrixLayout
+
+
+def solution_vector(model: dict) -> np.ndarray:
+    # every variable's value in MatrixLayout order. The matrix engines' variables
+    # share the solver's own vector, which is returned as it is; pulp variables are
+    # read in one pass, leaving charge_mode (not in the model dict) as zero
+    solution = getattr(model["y"], "solution", None)
+    if solution is not None and solution.x is not None:
+        return solution.x
+    layout = MatrixLayout(n_timepoints=len(model["timepoints"]))
+    variables = [
+        *(variable for market in MARKETS for variable in model["X"][market].values()),
+        *(variable for market in MARKETS for variable in model["Z"][market].values()),
+        model["y"],
+        model["w"],
+        *model["SOC"].values(),
+    ]
+    x = np.zeros(layout.n_variables)
+    x[: layout.SOC.stop] = np.fromiter(
+        (variable.varValue for variable in variables), dtype=float, count=layout.SOC.stop
+    )
+    return x
+
+
+def split_day_solution(layout: MatrixLayout, x: np.ndarray) -> dict[str, np.ndarray]:
+    # the same arrays as horizon_model.split_horizon_solution for a single day, so
+    # utils.build_horizon_results turns either into result rows and profits
+    shape = (1, layout.n_timepoints)
+    soc = x[layout.SOC]
+    return {
+        "X": np.stack([x[layout.X(m)].reshape(shape) for m in MARKETS]),
+        "Z": np.stack([x[layout.Z(m)].reshape(shape) for m in MARKETS]),
+        "y": x[layout.y : layout.y + 1],
+        "w": x[layout.w : layout.w + 1],
+        "SOC": soc[:-1].reshape(shape),
+        "end_soc": soc[-1:],
+    }
+
+
+def extract_day_solution(model: dict) -> dict[str, np.ndarray]:
+    layout = MatrixLayout(n_timepoints=len(model["timepoints"]))
+    return split_day_solution(layout, solution_vector(model))
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+
+from battery_trading_model.constants import DATA_DIR, BatteryParameters
+from battery_trading_model.solver import SolverConfig
+from battery_trading_model.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+SOLVE_CACHE_DIR = DATA_DIR / "solve_cache"
+
+# bump when the layout of a cached solution changes, so old entries are never read
+CACHE_VERSION = 1
+
+
+class SolveCache:
+    # Day solutions stored on disk under a hash of everything that determines them:
+    # the engine, the day's prices, initial SOC, battery parameters and solver
+    # settings. Each entry is a small compressed .npz (status, objective and the
+    # solution vector in MatrixLayout order), at <root>/<key[:2]>/<key>.npz. Reading
+    # an entry touches its mtime, and once the store grows past max_bytes the
+    # least recently used entries are evicted.
+
+    def __init__(self, root: Path = SOLVE_CACHE_DIR, max_bytes: int = 256 * 1024**2):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.size = sum(path.stat().st_size for path in self.root.glob("*/*.npz"))
+
+    def key(
+        self,
+        engine: str,
+        day_inputs: dict,
+        battery_params: BatteryParameters,
+        solver_config: SolverConfig,
+    ) -> str:
+        digest = hashlib.sha256()
+        settings = {
+            "version": CACHE_VERSION,
+            "engine": engine,
+            "battery_params": asdict(battery_params),
+            "solver_config": asdict(solver_config),
+        }
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        for name in ["apx_prices", "ssp_prices"]:
+            digest.update(np.asarray(day_inputs[name], dtype=np.float64).tobytes())
+        scalars = [day_inputs[name] for name in ["daily_price", "final_soc_price", "initial_soc"]]
+        digest.update(np.asarray(scalars, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> tuple[str, float, np.ndarray] | None:
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                status, objective_value, x = str(entry["status"]), float(entry["objective"]), entry["x"]
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            self.misses += 1
+            logger.debug(f"Solve cache miss {key[:12]}")
+            return None
+
+        _touch(path)
+        self.hits += 1
+        logger.debug(f"Solve cache hit {key[:12]}")
+        return status, objective_value, x
+
+    def put(self, key: str, status: str, objective_value: float, x: np.ndarray) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+
+        def write(tmp: Path) -> None:
+            with open(tmp, "wb") as file:
+                np.savez_compressed(file, status=status, objective=objective_value, x=x)
+
+        # a re-solve or another writer may be replacing an entry, whose size is
+        # already counted
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        atomic_write(path, write)
+        _touch(path)
+        self.size += path.stat().st_size - old_size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        # drops least recently used entries until the store is back under 90% of
+        # max_bytes, so eviction does not run again on every put
+        entries = []
+        for path in self.root.glob("*/*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self.size = sum(size for _, size, _ in entries)
+        target = 0.9 * self.max_bytes
+        evicted = 0
+        for _, size, path in entries:
+            if self.size <= target:
+                break
+            path.unlink(missing_ok=True)
+            self.size -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} solve cache entries, {self.size / 1024**2:.1f} MB left")
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npz"
+
+
+def _touch(path: Path) -> None:
+    # filesystem timestamps can be coarser than the gap between two reads, so the
+    # mtime is set from the nanosecond clock to keep the LRU order exact
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
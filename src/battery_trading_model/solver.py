@@ -1,13 +1,369 @@
-from pulp import LpProblem, LpStatus, LpVariable, value, PULP_CBC_CMD
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
 
+import highspy
+import numpy as np
+from pulp import GLPK_CMD, HiGHS, LpProblem, LpSolver, LpStatus, LpVariable, value, PULP_CBC_CMD
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
 
-def solve_problem(problem: LpProblem) -> tuple[str, float]:
-    problem.solve(PULP_CBC_CMD(msg=0))
+from battery_trading_model.horizon_model import HorizonLayout, HorizonProblem
+from battery_trading_model.matrix_model import MatrixLayout, MatrixProblem
+
+logger = logging.getLogger(__name__)
+
+
+# scipy.optimize.milp status codes mapped onto pulp's status names
+MILP_STATUS = {
+    0: "Optimal",
+    1: "Not Solved",
+    2: "Infeasible",
+    3: "Unbounded",
+    4: "Undefined",
+}
+
+# highspy model statuses mapped onto pulp's status names
+HIGHS_STATUS = {
+    highspy.HighsModelStatus.kOptimal: "Optimal",
+    highspy.HighsModelStatus.kInfeasible: "Infeasible",
+    highspy.HighsModelStatus.kUnbounded: "Unbounded",
+    highspy.HighsModelStatus.kUnboundedOrInfeasible: "Infeasible",
+    highspy.HighsModelStatus.kNotset: "Not Solved",
+    highspy.HighsModelStatus.kTimeLimit: "Not Solved",
+}
+
+
+# backends for PuLP problems, in the order tried when the requested one is not installed
+SOLVERS = ["cbc", "highs", "glpk"]
+
+
+@dataclass(frozen=True)
+class SolverConfig:
+    # solver picks the backend for PuLP problems; the matrix engines always use
+    # HiGHS and only take the limits. Options a backend does not support are
+    # ignored: GLPK has no threads or absolute gap, scipy's milp has no threads,
+    # absolute gap or warm start, and PuLP's HiGHS has no warm start.
+    solver: str = "cbc"
+    threads: int | None = None
+    time_limit: float | None = None  # seconds, the best solution found so far is kept
+    mip_rel_gap: float | None = None  # e.g. 0.001 stops within 0.1% of the best bound
+    mip_abs_gap: float | None = None
+    warm_start: bool = True  # start each day from the previous day's charge modes
+
+
+DEFAULT_SOLVER_CONFIG = SolverConfig()
+
+
+# every solve function takes an optional stats dict, which it fills with solver
+# statistics (solver_runs, nodes, iterations, mip_gap, solver_time) where the
+# solver reports them
+
+
+def solve_problem(
+    problem: LpProblem,
+    stats: dict | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    initial_values: dict[str, float] | None = None,
+) -> tuple[str, float]:
+    # initial_values (variable name -> value) are passed to the solver as a MIP
+    # start when solver_config.warm_start is set and the backend supports it
+    solver_name = available_solver(solver_config.solver)
+    warm_start = solver_config.warm_start and bool(initial_values) and solver_name == "cbc"
+    if warm_start:
+        variables = problem.variablesDict()
+        for name, initial_value in initial_values.items():
+            variables[name].setInitialValue(initial_value)
+
+    problem.solve(pulp_solver(solver_config, solver_name, warm_start))
     status = LpStatus[problem.status]
     objective_value = value(problem.objective)
+    if stats is not None:
+        if solver_name == "highs":
+            record_highs_stats(stats, problem.solverModel, problem.solutionTime)
+        else:
+            _record_stats(stats, solver_time=problem.solutionTime)
     return status, objective_value
 
 
+def pulp_solver(solver_config: SolverConfig, solver_name: str, warm_start: bool = False) -> LpSolver:
+    if solver_name == "highs":
+        return HiGHS(
+            msg=False,
+            timeLimit=solver_config.time_limit,
+            gapRel=solver_config.mip_rel_gap,
+            gapAbs=solver_config.mip_abs_gap,
+            threads=solver_config.threads,
+        )
+    if solver_name == "glpk":
+        options = [] if solver_config.mip_rel_gap is None else ["--mipgap", str(solver_config.mip_rel_gap)]
+        return GLPK_CMD(msg=False, timeLimit=solver_config.time_limit, options=options)
+    return PULP_CBC_CMD(
+        msg=False,
+        timeLimit=solver_config.time_limit,
+        gapRel=solver_config.mip_rel_gap,
+        gapAbs=solver_config.mip_abs_gap,
+        threads=solver_config.threads,
+        warmStart=warm_start,
+    )
+
+
+@lru_cache
+def available_solver(solver_name: str) -> str:
+    # the requested backend if it is installed, otherwise the first installed one
+    # in SOLVERS order, with a warning the first time
+    if solver_name not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver_name}, expected one of {SOLVERS}")
+    for candidate in [solver_name, *SOLVERS]:
+        if pulp_solver(DEFAULT_SOLVER_CONFIG, candidate).available():
+            if candidate != solver_name:
+                logger.warning(f"Solver {solver_name} is not available, falling back to {candidate}")
+            return candidate
+    raise Exception(f"None of the solvers {SOLVERS} are available")
+
+
+def configure_highs(highs: highspy.Highs, solver_config: SolverConfig) -> None:
+    # applies the limits of solver_config to a persistent HiGHS instance
+    options = {
+        "threads": solver_config.threads,
+        "time_limit": solver_config.time_limit,
+        "mip_rel_gap": solver_config.mip_rel_gap,
+        "mip_abs_gap": solver_config.mip_abs_gap,
+    }
+    for option, option_value in options.items():
+        if option_value is not None:
+            highs.setOptionValue(option, option_value)
+
+
+def charge_mode_values(problem: LpProblem) -> dict[str, float]:
+    # the solved charge modes of a build_problem problem, to warm start the next day
+    return {
+        variable.name: variable.varValue
+        for variable in problem.variables()
+        if variable.name.startswith("Charge_Mode") and variable.varValue is not None
+    }
+
+
+def solve_matrix_problem(
+    problem: MatrixProblem,
+    stats: dict | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[str, float]:
+    # solves in-process with HiGHS, without writing an MPS file for a CBC subprocess
+    result = _run_milp(problem, problem.integrality, solver_config, stats)
+    status = MILP_STATUS.get(result.status, "Undefined")
+    if result.x is None:
+        return status, None
+
+    problem.set_solution(result.x)
+    return status, -result.fun
+
+
+def solve_matrix_problem_relaxed(
+    problem: MatrixProblem,
+    tolerance: float = 1e-4,
+    max_partial_rounds: int = 1,
+    stats: dict | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[str, float, str]:
+    status, objective_value, x, path = solve_relaxed(problem, tolerance, max_partial_rounds, stats, solver_config)
+    problem.set_solution(x)
+    return status, objective_value, path
+
+
+def solve_horizon_problem(
+    problem: HorizonProblem,
+    relaxed: bool = True,
+    stats: dict | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[str, float, np.ndarray | None, str]:
+    if relaxed:
+        return solve_relaxed(problem, stats=stats, solver_config=solver_config)
+    result = _run_milp(problem, problem.integrality, solver_config, stats)
+    status = MILP_STATUS.get(result.status, "Undefined")
+    if result.x is None:
+        return status, None, None, "mip"
+    return status, -result.fun, result.x, "mip"
+
+
+def solve_relaxed(
+    problem: MatrixProblem | HorizonProblem,
+    tolerance: float = 1e-4,
+    max_partial_rounds: int = 1,
+    stats: dict | None = None,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+) -> tuple[str, float, np.ndarray | None, str]:
+    def run(integrality: np.ndarray) -> tuple[str, float, np.ndarray | None]:
+        result = _run_milp(problem, integrality, solver_config, stats)
+        status = MILP_STATUS.get(result.status, "Undefined")
+        if result.x is None:
+            return status, None, None
+        return status, -result.fun, result.x
+
+    return _solve_relaxed_rounds(run, problem.layout, problem.integrality, tolerance, max_partial_rounds)
+
+
+def solve_highs_relaxed(
+    highs: highspy.Highs,
+    layout: MatrixLayout | HorizonLayout,
+    tolerance: float = 1e-4,
+    max_partial_rounds: int = 1,
+    stats: dict | None = None,
+) -> tuple[str, float, np.ndarray | None, str]:
+    # same as solve_relaxed, on a model already loaded into a persistent HiGHS
+    # instance; only the integrality of the charge_mode columns is toggled
+    columns = np.arange(layout.charge_mode.start, layout.charge_mode.stop, dtype=np.int32)
+
+    def run(integrality: np.ndarray) -> tuple[str, float, np.ndarray | None]:
+        highs.changeColsIntegrality(len(columns), columns, integrality[layout.charge_mode])
+        start = time.perf_counter()
+        highs.run()
+        record_highs_stats(stats, highs, time.perf_counter() - start)
+        status = HIGHS_STATUS.get(highs.getModelStatus(), "Undefined")
+        if status != "Optimal":
+            return status, None, None
+        x = np.asarray(highs.getSolution().col_value)
+        return status, highs.getInfo().objective_function_value, x
+
+    full_integrality = np.zeros(layout.n_variables, dtype=np.uint8)
+    full_integrality[layout.charge_mode] = 1
+    return _solve_relaxed_rounds(run, layout, full_integrality, tolerance, max_partial_rounds)
+
+
+def _solve_relaxed_rounds(
+    run: Callable[[np.ndarray], tuple[str, float, np.ndarray | None]],
+    layout: MatrixLayout | HorizonLayout,
+    full_integrality: np.ndarray,
+    tolerance: float,
+    max_partial_rounds: int,
+) -> tuple[str, float, np.ndarray | None, str]:
+    # Solves the continuous relaxation first. Where a period both charges and
+    # discharges, only that period's charge_mode is made binary and the problem is
+    # re-solved. Once no period does both, the solution is feasible for the full MIP,
+    # and optimal since every solve relaxes it. After max_partial_rounds without
+    # that, falls back to the full MIP. Returns the path taken: "lp", "partial-mip"
+    # or "mip".
+    integrality = np.zeros_like(full_integrality)
+    path = "lp"
+
+    for solve_round in range(max_partial_rounds + 2):
+        status, objective_value, x = run(integrality)
+        if x is None:
+            return status, None, None, path
+
+        charge_flow, discharge_flow = layout.charge_flows(x)
+        simultaneous = (charge_flow > tolerance) & (discharge_flow > tolerance)
+        if path == "mip" or not simultaneous.any():
+            break
+
+        if solve_round < max_partial_rounds:
+            integrality = integrality.copy()
+            integrality[layout.charge_mode.start + np.flatnonzero(simultaneous)] = 1
+            path = "partial-mip"
+        else:
+            integrality = full_integrality
+            path = "mip"
+
+    logger.debug(f"Relaxed solve took path {path} with {int(integrality.sum())} binaries")
+    x = x.copy()
+    # round the charge modes the relaxation left fractional onto the side actually used
+    x[layout.charge_mode] = np.where(charge_flow > tolerance, 1.0, 0.0)
+    return status, objective_value, x, path
+
+
+def _run_milp(
+    problem: MatrixProblem | HorizonProblem,
+    integrality: np.ndarray,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    stats: dict | None = None,
+):
+    options = {}
+    if solver_config.time_limit is not None:
+        options["time_limit"] = solver_config.time_limit
+    if solver_config.mip_rel_gap is not None:
+        options["mip_rel_gap"] = solver_config.mip_rel_gap
+
+    start = time.perf_counter()
+    result = milp(
+        c=-problem.c,
+        constraints=[
+            LinearConstraint(problem.A_ub, ub=problem.b_ub),
+            LinearConstraint(problem.A_eq, lb=problem.b_eq, ub=problem.b_eq),
+        ],
+        integrality=integrality,
+        bounds=Bounds(problem.lower_bounds, problem.upper_bounds),
+        options=options,
+    )
+    if stats is not None:
+        _record_stats(
+            stats,
+            nodes=result.get("mip_node_count"),
+            mip_gap=result.get("mip_gap"),
+            solver_time=time.perf_counter() - start,
+        )
+    return result
+
+
+def _record_stats(
+    stats: dict | None,
+    nodes: int | None = None,
+    iterations: int | None = None,
+    mip_gap: float | None = None,
+    solver_time: float | None = None,
+) -> None:
+    # adds one solver run to stats; counts and times are summed over the runs of a
+    # relaxed solve and the gap is the last run's
+    if stats is None:
+        return
+    stats["solver_runs"] = stats.get("solver_runs", 0) + 1
+    for key, count in [("nodes", nodes), ("iterations", iterations)]:
+        if count is not None and count >= 0:
+            stats[key] = stats.get(key, 0) + int(count)
+    if solver_time is not None:
+        stats["solver_time"] = stats.get("solver_time", 0.0) + float(solver_time)
+    if mip_gap is not None and np.isfinite(mip_gap):
+        stats["mip_gap"] = float(mip_gap)
+
+
+def record_highs_stats(stats: dict | None, highs: highspy.Highs, solver_time: float) -> None:
+    # solver_time is measured by the caller, since a persistent Highs instance's run
+    # time keeps adding up over every run
+    if stats is not None:
+        info = highs.getInfo()
+        _record_stats(
+            stats,
+            nodes=info.mip_node_count,
+            iterations=info.simplex_iteration_count,
+            mip_gap=info.mip_gap,
+            solver_time=solver_time,
+        )
+
+
+def build_highs_lp(problem: MatrixProblem | HorizonProblem) -> highspy.HighsLp:
+    # rows are ordered A_eq then A_ub, so row 0 is SOC_initial
+    A = sparse.vstack([problem.A_eq, problem.A_ub]).tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = A.shape[1]
+    lp.num_row_ = A.shape[0]
+    lp.sense_ = highspy.ObjSense.kMaximize
+    lp.col_cost_ = problem.c
+    lp.col_lower_ = problem.lower_bounds
+    lp.col_upper_ = problem.upper_bounds
+    lp.row_lower_ = np.concatenate([problem.b_eq, np.full(len(problem.b_ub), -highspy.kHighsInf)])
+    lp.row_upper_ = np.concatenate([problem.b_eq, problem.b_ub])
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = A.indptr
+    lp.a_matrix_.index_ = A.indices
+    lp.a_matrix_.value_ = A.data
+    lp.integrality_ = [
+        highspy.HighsVarType.kInteger if is_integer else highspy.HighsVarType.kContinuous
+        for is_integer in problem.integrality
+    ]
+    return lp
+
+
 def evaluate_profit(
     P: dict,
     q: float,
@@ -16,15 +372,15 @@ def evaluate_profit(
     y: LpVariable,
     w: LpVariable,
 ) -> float:
-    half_hourly_profit = sum(
-        P[m][t] * (Z[m][t].varValue - X[m][t].varValue)
-        for m in P
-        for t in P[m]
-    )
+    keys = [(m, t) for m in P for t in P[m]]
+    prices = np.fromiter((P[m][t] for m, t in keys), dtype=float, count=len(keys))
+    sold = np.fromiter((Z[m][t].varValue for m, t in keys), dtype=float, count=len(keys))
+    bought = np.fromiter((X[m][t].varValue for m, t in keys), dtype=float, count=len(keys))
+    half_hourly_profit = float(prices @ (sold - bought))
     daily_profit = q * (w.varValue - y.varValue)
     return half_hourly_profit + daily_profit
 
 
 def get_final_soc(SOC: dict) -> float: 
     max_key = max(SOC.keys())
-    return SOC[max_key].varValue
\ No newline at end of file
+    return SOC[max_key].varValue
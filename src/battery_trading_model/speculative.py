@@ -0,0 +1,218 @@
+import argparse
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from battery_trading_model.constants import DATA_DIR, DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.main import ENGINES, run_backtest
+from battery_trading_model.price_data import PriceCube, load_price_cube
+from battery_trading_model.solver import DEFAULT_SOLVER_CONFIG, SolverConfig
+from battery_trading_model.utils import save_model_results
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+BACKTEST_LOGGER = "battery_trading_model.main"
+
+# price data for the days solved in this worker process, set once by _init_worker
+_worker_data: dict = {}
+
+
+def soc_grid(battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS, soc_points: int = 2) -> np.ndarray:
+    # evenly spaced start SOCs from empty to full; the optimal day often ends at one of the two
+    return np.linspace(0, battery_params.C_max, soc_points)
+
+
+def run_speculative_backtest(
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    start_of_day_soc: float = 0,
+    soc_points: int = 2,
+    engine: str = "relaxed",
+    battery_params: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    solver_config: SolverConfig = DEFAULT_SOLVER_CONFIG,
+    max_workers: int | None = None,
+    interpolate: bool = False,
+    tolerance: float = 1e-6,
+) -> tuple[list[pd.DataFrame], list[pd.DataFrame], pd.DataFrame]:
+    # The daily backtest without waiting on the SOC chain: every day is solved for
+    # each start SOC on soc_grid across a process pool. The end SOC of a day barely
+    # depends on where it starts, so as each day's grid comes back, the next day is
+    # also solved for the end SOCs it reached. The chain is then followed day by
+    # day: a day whose realised start SOC was solved for takes that solution, and
+    # any other is solved again in this process. With interpolate, a day between
+    # two solutions that never charge and discharge in the same period takes their
+    # linear interpolation instead, which is feasible but may fall short of the
+    # optimum. Returns the daily results and summaries, as run_backtest, and the
+    # path each day took
+    first_day = price_cube.day_index(start_day)
+    days = range(first_day, first_day + num_days)
+    price_cube.check_days(slice(first_day, first_day + num_days))
+    grid = soc_grid(battery_params, soc_points)
+
+    daily_results: list[pd.DataFrame] = []
+    daily_summary: list[pd.DataFrame] = []
+    paths = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(price_cube, logging.getLogger(BACKTEST_LOGGER).level),
+    ) as executor:
+
+        def submit(i: int, socs: np.ndarray):
+            return executor.submit(_solve_day_grid, price_cube.days[i], socs, engine, battery_params, solver_config)
+
+        # the first day's start SOC is known, so it is solved along with the grid
+        grid_futures = [submit(i, np.union1d(grid, [start_of_day_soc]) if i == first_day else grid) for i in days]
+        end_futures = [None]
+        for i, future in zip(days[1:], grid_futures):
+            _, grid_results = future.result()
+            end_socs = np.unique([summary_df["end_soc"].iloc[0] for _, summary_df in grid_results])
+            end_socs = end_socs[np.abs(end_socs[:, None] - grid).min(axis=1) > tolerance]
+            end_futures.append(submit(i, end_socs) if len(end_socs) else None)
+
+        soc = start_of_day_soc
+        for i, grid_future, end_future in zip(days, grid_futures, end_futures):
+            day = price_cube.days[i]
+            socs, grid_results = _merge([grid_future.result()] + ([end_future.result()] if end_future else []))
+            on_grid = np.flatnonzero(np.abs(socs - soc) <= tolerance)
+            interpolated = _interpolate(socs, grid_results, soc) if interpolate and not len(on_grid) else None
+            if len(on_grid):
+                path = "grid"
+                results_df, summary_df = grid_results[on_grid[0]]
+            elif interpolated is not None:
+                path = "interpolated"
+                results_df, summary_df = interpolated
+            else:
+                path = "solved"
+                solved_results, solved_summary = run_backtest(
+                    price_cube,
+                    start_day=day,
+                    num_days=1,
+                    start_of_day_soc=soc,
+                    engine=engine,
+                    battery_params=battery_params,
+                    solver_config=solver_config,
+                )
+                results_df, summary_df = solved_results[0], solved_summary[0]
+
+            daily_results.append(results_df)
+            daily_summary.append(summary_df)
+            paths.append({"date": day, "start_soc": soc, "path": path})
+            soc = float(summary_df["end_soc"].iloc[0])
+
+    stitching = pd.DataFrame(paths)
+    logger.info(f"Stitched {num_days} days: {dict(Counter(stitching['path']))}")
+    return daily_results, daily_summary, stitching
+
+
+def _init_worker(price_cube: PriceCube, log_level: int) -> None:
+    _worker_data["price_cube"] = price_cube
+    logging.getLogger(BACKTEST_LOGGER).setLevel(log_level)
+
+
+def _solve_day_grid(
+    day: pd.Timestamp,
+    socs: np.ndarray,
+    engine: str,
+    battery_params: BatteryParameters,
+    solver_config: SolverConfig,
+) -> tuple[np.ndarray, list[tuple[pd.DataFrame, pd.DataFrame]]]:
+    grid_results = []
+    for soc in socs:
+        daily_results, daily_summary = run_backtest(
+            _worker_data["price_cube"],
+            start_day=day,
+            num_days=1,
+            start_of_day_soc=float(soc),
+            engine=engine,
+            battery_params=battery_params,
+            solver_config=solver_config,
+        )
+        grid_results.append((daily_results[0], daily_summary[0]))
+    return socs, grid_results
+
+
+def _merge(
+    solved: list[tuple[np.ndarray, list[tuple[pd.DataFrame, pd.DataFrame]]]],
+) -> tuple[np.ndarray, list[tuple[pd.DataFrame, pd.DataFrame]]]:
+    # one day's solutions from several _solve_day_grid calls, in order of start SOC
+    socs = np.concatenate([socs for socs, _ in solved])
+    grid_results = [result for _, results in solved for result in results]
+    order = np.argsort(socs, kind="stable")
+    return socs[order], [grid_results[j] for j in order]
+
+
+def _interpolate(
+    socs: np.ndarray,
+    grid_results: list[tuple[pd.DataFrame, pd.DataFrame]],
+    soc: float,
+    tolerance: float = 1e-4,
+) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    # The day's problem is linear in the start SOC once the charge modes are fixed,
+    # so where the two neighbouring solutions could share charge modes, their
+    # interpolation is feasible for the start SOC in between. None if they cannot.
+    upper = int(np.searchsorted(socs, soc))
+    if upper == 0 or upper == len(socs):
+        return None
+    (lower_df, lower_summary), (upper_df, upper_summary) = grid_results[upper - 1], grid_results[upper]
+    charging = [df.filter(like="Purchase").sum(axis=1).to_numpy() > tolerance for df in [lower_df, upper_df]]
+    discharging = [df.filter(like="Sale").sum(axis=1).to_numpy() > tolerance for df in [lower_df, upper_df]]
+    if ((charging[0] & discharging[1]) | (discharging[0] & charging[1])).any():
+        return None
+
+    weight = (socs[upper] - soc) / (socs[upper] - socs[upper - 1])
+    results_df = lower_df.copy()
+    columns = lower_df.columns.drop("Datetime")
+    results_df[columns] = weight * lower_df[columns] + (1 - weight) * upper_df[columns]
+    summary_df = lower_summary.copy()
+    columns = ["profit", "objective", "end_soc"]
+    summary_df[columns] = weight * lower_summary[columns] + (1 - weight) * upper_summary[columns]
+    return results_df, summary_df
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run the daily backtest in parallel over a grid of start SOCs")
+    parser.add_argument("--num-days", type=int, default=5)
+    parser.add_argument("--engine", choices=ENGINES, default="relaxed")
+    parser.add_argument("--soc-points", type=int, default=2, help="start SOCs each day is solved for")
+    parser.add_argument(
+        "--interpolate",
+        action="store_true",
+        help="interpolate days that start between grid points where possible, instead of solving them again",
+    )
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    price_cube = load_price_cube()
+
+    # per-day progress from every worker would drown out the stitching progress
+    logging.getLogger(BACKTEST_LOGGER).setLevel(logging.WARNING)
+
+    daily_results, daily_summary, stitching = run_speculative_backtest(
+        price_cube,
+        start_day=price_cube.days[0],
+        num_days=args.num_days,
+        soc_points=args.soc_points,
+        engine=args.engine,
+        max_workers=args.max_workers,
+        interpolate=args.interpolate,
+    )
+
+    save_model_results(daily_results=daily_results, path=DATA_DIR / "result.csv")
+    summary_df = pd.concat(daily_summary, ignore_index=True).merge(stitching, on="date")
+    summary_path = DATA_DIR / "daily_summary.csv"
+    summary_df.to_csv(summary_path, index=False)
+    logger.info(f"Daily summary saved to {summary_path}")
+    logger.info(f"Total profit over {args.num_days} days: {summary_df['profit'].sum()}")
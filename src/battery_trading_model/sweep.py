@@ -0,0 +1,159 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields, replace
+from pathlib import Path
+
+import pandas as pd
+
+from battery_trading_model.constants import DATA_DIR, DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.main import ENGINES, run_backtest
+from battery_trading_model.price_data import PriceCube, load_price_cube
+from battery_trading_model.solve_cache import SOLVE_CACHE_DIR, SolveCache
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+BACKTEST_LOGGER = "battery_trading_model.main"
+
+# price data for the backtests run in this worker process, set once by _init_worker
+# so the price cube is sent to each worker once rather than with every task
+_worker_data: dict = {}
+
+
+def parameter_grid(
+    base: BatteryParameters = DEFAULT_BATTERY_PARAMETERS,
+    **values: list,
+) -> list[BatteryParameters]:
+    # every combination of the given values, e.g. parameter_grid(C_max=[50, 100], c_rate=[25, 50])
+    names = list(values)
+    return [
+        replace(base, **dict(zip(names, combination)))
+        for combination in itertools.product(*values.values())
+    ]
+
+
+def run_sweep(
+    parameter_sets: list[BatteryParameters],
+    price_cube: PriceCube,
+    start_day: pd.Timestamp,
+    num_days: int,
+    engine: str = "relaxed",
+    max_workers: int | None = None,
+    cache_dir: Path | None = None,
+) -> pd.DataFrame:
+    # runs one whole backtest per parameter set across a process pool, and returns
+    # the daily summaries as one table with a column per BatteryParameters field.
+    # With cache_dir, every worker reads and adds to the same solve cache
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(price_cube, logging.getLogger(BACKTEST_LOGGER).level, cache_dir),
+    ) as executor:
+        futures = [
+            executor.submit(_run_parameter_set, params, start_day, num_days, engine)
+            for params in parameter_sets
+        ]
+        results = []
+        for i, future in enumerate(futures):
+            results.append(future.result())
+            logger.info(f"Finished parameter set {i + 1}/{len(parameter_sets)}")
+
+    return pd.concat(results, ignore_index=True)
+
+
+def _init_worker(price_cube: PriceCube, log_level: int, cache_dir: Path | None = None) -> None:
+    _worker_data["price_cube"] = price_cube
+    _worker_data["solve_cache"] = SolveCache(cache_dir) if cache_dir is not None else None
+    logging.getLogger(BACKTEST_LOGGER).setLevel(log_level)
+
+
+def _run_parameter_set(
+    params: BatteryParameters,
+    start_day: pd.Timestamp,
+    num_days: int,
+    engine: str,
+) -> pd.DataFrame:
+    _, daily_summary = run_backtest(
+        _worker_data["price_cube"],
+        start_day=start_day,
+        num_days=num_days,
+        engine=engine,
+        battery_params=params,
+        solve_cache=_worker_data["solve_cache"],
+    )
+    summary = pd.concat(daily_summary, ignore_index=True)
+    parameter_columns = pd.DataFrame([asdict(params)] * len(summary))
+    return pd.concat([parameter_columns, summary], axis=1)
+
+
+def _parse_grid(grid: list[str]) -> dict[str, list]:
+    # ["C_max=50,100", "c_rate=25,50"] -> {"C_max": [50.0, 100.0], "c_rate": [25.0, 50.0]}
+    field_types = {field.name: field.type for field in fields(BatteryParameters)}
+    values = {}
+    for item in grid:
+        name, _, options = item.partition("=")
+        if name not in field_types:
+            raise ValueError(f"Unknown battery parameter {name}")
+        cast = int if field_types[name] in (int, "int") else float
+        values[name] = [cast(option) for option in options.split(",")]
+    return values
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run the backtest for many battery parameter sets")
+    parser.add_argument(
+        "--grid",
+        nargs="*",
+        default=[],
+        help="values to sweep over, e.g. --grid C_max=50,100 c_rate=25,50",
+    )
+    parser.add_argument(
+        "--parameter-file",
+        help="json list of parameter overrides, e.g. [{\"C_max\": 50}, {\"C_max\": 100}]",
+    )
+    parser.add_argument("--num-days", type=int, default=5)
+    parser.add_argument("--engine", choices=ENGINES, default="relaxed")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache", action="store_true", help="reuse day solutions from earlier runs")
+    args = parser.parse_args()
+
+    parameter_sets = []
+    if args.grid or not args.parameter_file:
+        parameter_sets += parameter_grid(**_parse_grid(args.grid))
+    if args.parameter_file:
+        with open(args.parameter_file) as file:
+            parameter_sets += [replace(DEFAULT_BATTERY_PARAMETERS, **overrides) for overrides in json.load(file)]
+
+    price_cube = load_price_cube()
+    start_day = price_cube.days[0]
+
+    # per-day progress from every worker would drown out the sweep progress
+    logging.getLogger(BACKTEST_LOGGER).setLevel(logging.WARNING)
+
+    sweep_df = run_sweep(
+        parameter_sets,
+        price_cube,
+        start_day=start_day,
+        num_days=args.num_days,
+        engine=args.engine,
+        max_workers=args.max_workers,
+        cache_dir=SOLVE_CACHE_DIR if args.cache else None,
+    )
+
+    sweep_path = DATA_DIR / "sweep_results.csv"
+    sweep_df.to_csv(sweep_path, index=False)
+    logger.info(f"Sweep results saved to {sweep_path}")
+
+    parameter_names = [field.name for field in fields(BatteryParameters)]
+    totals = sweep_df.groupby(parameter_names)["profit"].sum().reset_index()
+    logger.info(f"Total profit by parameter set:\n{totals.to_string(index=False)}")
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from battery_trading_model.price_data import PriceCube, build_price_cube
+
+
+# random but reproducible prices, for the tests and for benchmarks that should not
+# depend on downloaded data
+
+
+def random_day(seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        "apx_prices": rng.normal(80, 40, 48).round(2).tolist(),
+        "ssp_prices": rng.normal(80, 60, 48).round(2).tolist(),
+        "daily_price": float(rng.normal(80, 10)),
+        "final_soc_price": 75.0,
+        "initial_soc": 20.0,
+    }
+
+
+def random_price_data(
+    num_days: int, seed: int = 0, start: str = "2023-01-01", timezone: str = "UTC"
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # apx/ssp/ons frames shaped like the csvs written by fetch_data, for days
+    # midnight to midnight in timezone
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, periods=num_days, freq="D", tz=timezone)
+    half_hours = pd.date_range(days[0], days[-1] + pd.DateOffset(days=1), freq="30min", inclusive="left")
+    daily_shape = 30 * np.sin(np.linspace(0, 2 * np.pi, len(half_hours)) * num_days)
+    apx_data = pd.DataFrame(
+        {"datetime": half_hours, "price": (80 + daily_shape + rng.normal(0, 15, len(half_hours))).round(2)}
+    )
+    ssp_data = pd.DataFrame(
+        {"datetime": half_hours, "price": (80 + daily_shape + rng.normal(0, 40, len(half_hours))).round(2)}
+    )
+    ons_data = pd.DataFrame({"datetime": days, "price": rng.normal(80, 10, num_days).round(2)})
+    return apx_data, ssp_data, ons_data
+
+
+def random_price_cube(
+    num_days: int, seed: int = 0, start: str = "2023-01-01", timezone: str = "UTC"
+) -> PriceCube:
+    return build_price_cube(*random_price_data(num_days, seed=seed, start=start, timezone=timezone), timezone=timezone)
@@ -1,6 +1,9 @@
 import logging
+import os
 from pathlib import Path
+from typing import Callable
 
+import numpy as np
 import pandas as pd
 
 logger = logging.getLogger(__name__)
@@ -37,43 +40,55 @@ def build_model_results_dataframe(
 ) -> pd.DataFrame:
     logger.info("Converting model results to dataframe.")
 
-    y_res = y.varValue
-    w_res = w.varValue
-    SOC_res = []
-    X1_res = []
-    X2_res = []
-    X3_res = []
-    Z1_res = []
-    Z2_res = []
-    Z3_res = []
+    n_timepoints = len(timepoints)
 
-    for i, t in enumerate(timepoints):
-        SOC_res.append(SOC[i].varValue)
-        X1_res.append(X["APX"][i].varValue)
-        X2_res.append(X["SSP"][i].varValue)
-
-        Z1_res.append(Z["APX"][i].varValue)
-        Z2_res.append(Z["SSP"][i].varValue)
-
-        X3_res.append(y_res / len(timepoints))
-        Z3_res.append(w_res / len(timepoints))
+    def values(variables: dict) -> np.ndarray:
+        return np.fromiter((variables[i].varValue for i in range(n_timepoints)), dtype=float, count=n_timepoints)
 
     df = pd.DataFrame(
         data={
             "Datetime": timepoints,
-            "SOC": SOC_res,
-            "Purchase from APX": X1_res,
-            "Purchase from SSP": X2_res,
-            "Purchase from ONS": X3_res,
-            "Sale to APX": Z1_res,
-            "Sale to SSP": Z2_res,
-            "Sale to ONS": Z3_res,
+            "SOC": values(SOC),
+            "Purchase from APX": values(X["APX"]),
+            "Purchase from SSP": values(X["SSP"]),
+            "Purchase from ONS": np.full(n_timepoints, y.varValue / n_timepoints),
+            "Sale to APX": values(Z["APX"]),
+            "Sale to SSP": values(Z["SSP"]),
+            "Sale to ONS": np.full(n_timepoints, w.varValue / n_timepoints),
         }
     )
 
     return df
 
 
+def build_horizon_results(
+    solution: dict[str, np.ndarray],
+    apx_prices: np.ndarray,
+    ssp_prices: np.ndarray,
+    daily_prices: np.ndarray,
+    timepoints: pd.DatetimeIndex,
+) -> tuple[pd.DataFrame, np.ndarray]:
+    # results frame and per-day profits from horizon_model.split_horizon_solution arrays
+    X, Z, y, w = solution["X"], solution["Z"], solution["y"], solution["w"]
+    n_timepoints = X.shape[2]
+    prices = np.stack([apx_prices, ssp_prices])
+    daily_profits = (prices * (Z - X)).sum(axis=(0, 2)) + daily_prices * (w - y)
+
+    df = pd.DataFrame(
+        data={
+            "Datetime": timepoints,
+            "SOC": solution["SOC"].ravel(),
+            "Purchase from APX": X[0].ravel(),
+            "Purchase from SSP": X[1].ravel(),
+            "Purchase from ONS": np.repeat(y / n_timepoints, n_timepoints),
+            "Sale to APX": Z[0].ravel(),
+            "Sale to SSP": Z[1].ravel(),
+            "Sale to ONS": np.repeat(w / n_timepoints, n_timepoints),
+        }
+    )
+    return df, daily_profits
+
+
 def save_model_results(
     daily_results: list[pd.DataFrame],
     path: Path,
@@ -81,3 +96,11 @@ def save_model_results(
     df = pd.concat(daily_results, ignore_index=True)
     df.to_csv(path, index=False)
     logger.info(f"Model results saved to {path}")
+
+
+def atomic_write(path: Path, write: Callable[[Path], None]) -> None:
+    # write to a temporary file and rename it into place, so a crash never leaves
+    # a half-written file behind
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
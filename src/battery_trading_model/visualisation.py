@@ -1,21 +1,37 @@
 from __future__ import annotations
 
-from typing import Iterable
+import argparse
+from pathlib import Path
+from typing import Iterable, Iterator
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
 from battery_trading_model.constants import DATA_DIR
+from battery_trading_model.utils import atomic_write
 
 
 PURCHASE_COLUMNS = ["Purchase from APX", "Purchase from SSP", "Purchase from ONS"]
 SALE_COLUMNS = ["Sale to APX", "Sale to SSP", "Sale to ONS"]
+AGGREGATES = ["daily", "weekly", "time_of_day"]
+# about the width of a plot in pixels; more points than this cannot be told apart
+MAX_POINTS = 2000
+CHUNK_ROWS = 500_000
 
 
-def load_results(path=DATA_DIR / "result.csv") -> pd.DataFrame:
-    df = pd.read_csv(path)
-    df["Datetime"] = pd.to_datetime(df["Datetime"], utc=True)
-    return df
+def load_results(
+    path=DATA_DIR / "result.csv",
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    # the result rows from start up to (not including) end, from result.csv or the
+    # results directory of a streaming backtest; only the parts in range are read
+    chunks = list(_result_chunks(Path(path), start, end))
+    if not chunks:
+        raise ValueError(f"No results found in {path} between {start} and {end}")
+    return pd.concat(chunks, ignore_index=True)
 
 
 def load_daily_summary(path=DATA_DIR / "daily_summary.csv") -> pd.DataFrame:
@@ -24,6 +40,68 @@ def load_daily_summary(path=DATA_DIR / "daily_summary.csv") -> pd.DataFrame:
     return df
 
 
+def build_aggregates(chunks: Iterable[pd.DataFrame], daily_summary: pd.DataFrame | None = None) -> dict[str, pd.DataFrame]:
+    # daily and weekly energy totals and the mean net energy of each half-hour of
+    # each month, built a chunk of results at a time so the results never need to
+    # be in memory at once. Profit comes from the daily summary
+    daily_parts, time_of_day_parts = [], []
+    for df in chunks:
+        energy = _energy(df)
+        daily_parts.append(energy.groupby("date")[["purchased_mwh", "sold_mwh", "net_mwh"]].sum())
+        time_of_day_parts.append(energy.groupby(["month", "time"])["net_mwh"].agg(["sum", "count"]))
+
+    daily = pd.concat(daily_parts).groupby(level=0).sum().reset_index()
+    weekly = daily.groupby(pd.Grouper(key="date", freq="W-MON", label="left", closed="left")).sum()
+    if daily_summary is not None:
+        dates = pd.to_datetime(daily_summary["date"], utc=True).dt.floor("D")
+        profit = daily_summary.groupby(dates.rename("date"))["profit"].sum()
+        daily = daily.merge(profit, on="date", how="left")
+        weekly["profit"] = profit.resample("W-MON", label="left", closed="left").sum()
+    weekly = weekly.reset_index().rename(columns={"date": "week"})
+
+    time_of_day = pd.concat(time_of_day_parts).groupby(level=[0, 1]).sum()
+    time_of_day = (time_of_day["sum"] / time_of_day["count"]).rename("net_mwh").reset_index()
+    return {"daily": daily, "weekly": weekly, "time_of_day": time_of_day}
+
+
+def load_aggregates(
+    results_path=DATA_DIR / "result.csv",
+    summary_path=DATA_DIR / "daily_summary.csv",
+    cache_dir: Path | None = None,
+) -> dict[str, pd.DataFrame]:
+    # build_aggregates of the results, cached as parquet next to them and built
+    # again only when the results or summary are newer than the cache
+    results_path, summary_path = Path(results_path), Path(summary_path)
+    cache_dir = Path(cache_dir or results_path.parent / f"{results_path.stem}_aggregates")
+    paths = {name: cache_dir / f"{name}.parquet" for name in AGGREGATES}
+    sources = [results_path, *(results_path.glob("*.parquet") if results_path.is_dir() else [])]
+    if summary_path.exists():
+        sources.append(summary_path)
+    newest = max(source.stat().st_mtime for source in sources)
+    if all(path.exists() and path.stat().st_mtime >= newest for path in paths.values()):
+        return {name: pd.read_parquet(path) for name, path in paths.items()}
+
+    daily_summary = load_daily_summary(summary_path) if summary_path.exists() else None
+    aggregates = build_aggregates(_result_chunks(results_path), daily_summary)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for name, df in aggregates.items():
+        atomic_write(paths[name], lambda tmp: df.to_parquet(tmp, index=False))
+    return aggregates
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    # at most max_points rows, keeping the lowest and highest y of each of
+    # max_points / 2 equal runs of rows, so peaks and troughs still show
+    if len(df) <= max_points:
+        return df
+    df = df.sort_values(x, kind="stable")
+    n_buckets = max_points // 2
+    buckets = np.arange(len(df)) * n_buckets // len(df)
+    values = df[y].reset_index(drop=True)
+    keep = np.union1d(values.groupby(buckets).idxmin(), values.groupby(buckets).idxmax())
+    return df.iloc[keep]
+
+
 def _sum_columns(df: pd.DataFrame, columns: Iterable[str]) -> float:
     return float(df[list(columns)].sum().sum())
 
@@ -39,12 +117,10 @@ def plot_day_energy_stack(
     day: str | pd.Timestamp,
     profit: float | None = None,
 ):
-    df = results.copy()
-    df["Datetime"] = pd.to_datetime(df["Datetime"], utc=True)
-
-    day_ts = pd.to_datetime(day).normalize()
+    day_ts = _utc(pd.Timestamp(day)).normalize()
     day_end = day_ts + pd.Timedelta(days=1)
-    day_df = df[(df["Datetime"] >= day_ts) & (df["Datetime"] < day_end)].copy()
+    datetimes = _as_datetime(results["Datetime"])
+    day_df = results[(datetimes >= day_ts) & (datetimes < day_end)].assign(Datetime=datetimes)
 
     if day_df.empty:
         raise ValueError("No data found for the requested day")
@@ -91,31 +167,55 @@ def plot_day_energy_stack(
     return fig
 
 
-def plot_daily_profit(daily_summary: pd.DataFrame):
-    df = daily_summary.copy()
-    df["date"] = pd.to_datetime(df["date"])
+def plot_daily_profit(
+    daily_summary: pd.DataFrame,
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+    max_points: int = MAX_POINTS,
+):
+    # a WebGL line of the days from start to end, downsampled to max_points
+    dates = _as_datetime(daily_summary["date"])
+    df = daily_summary.assign(date=dates)[_in_range(dates, start, end)]
+    df = downsample(df, "date", "profit", max_points)
 
     fig = px.line(
         df,
         x="date",
         y="profit",
-        markers=True,
+        markers=len(df) <= 366,
+        render_mode="webgl",
         title="Daily profit",
         labels={"profit": "Profit (£)", "date": "Date"},
     )
     return fig
 
 
-def plot_net_power_heatmap(results: pd.DataFrame):
-    df = results.copy()
-    df["Datetime"] = pd.to_datetime(df["Datetime"], utc=True)
+def plot_weekly_energy(aggregates: dict[str, pd.DataFrame]):
+    weekly = aggregates["weekly"]
+    fig = go.Figure(
+        [
+            go.Bar(x=weekly["week"], y=weekly["purchased_mwh"], name="Purchased"),
+            go.Bar(x=weekly["week"], y=-weekly["sold_mwh"], name="Sold"),
+        ]
+    )
+    fig.update_layout(
+        barmode="relative",
+        title="Weekly energy traded",
+        xaxis_title="Week",
+        yaxis_title="Energy (MWh)",
+    )
+    return fig
 
-    df["date"] = df["Datetime"].dt.date
-    df["time"] = df["Datetime"].dt.strftime("%H:%M")
 
-    purchases = df[PURCHASE_COLUMNS].sum(axis=1)
-    sales = df[SALE_COLUMNS].sum(axis=1)
-    df["net_mwh"] = purchases - sales
+def plot_net_power_heatmap(results: pd.DataFrame):
+    datetimes = _as_datetime(results["Datetime"])
+    df = pd.DataFrame(
+        {
+            "date": datetimes.dt.date,
+            "time": _time_of_day(datetimes),
+            "net_mwh": results[PURCHASE_COLUMNS].sum(axis=1) - results[SALE_COLUMNS].sum(axis=1),
+        }
+    )
 
     heatmap_data = df.pivot(index="date", columns="time", values="net_mwh")
 
@@ -130,19 +230,134 @@ def plot_net_power_heatmap(results: pd.DataFrame):
     return fig
 
 
-if __name__ == "__main__":
-    results_df = load_results()
-    first_day = results_df["Datetime"].min().normalize()
-    daily_summary_df = load_daily_summary()
+def plot_time_of_day_heatmap(aggregates: dict[str, pd.DataFrame]):
+    # plot_net_power_heatmap with a row per month instead of per day, the same
+    # size however many years of results there are
+    heatmap_data = aggregates["time_of_day"].pivot(index="month", columns="time", values="net_mwh")
 
-    profit_row = daily_summary_df[
-        daily_summary_df["date"].dt.normalize() == first_day
-    ]
-    profit_value = float(profit_row["profit"].iloc[0])
+    fig = px.imshow(
+        heatmap_data,
+        aspect="auto",
+        color_continuous_scale="RdBu",
+        origin="lower",
+        labels={"color": "Mean net energy (MWh)", "x": "Time", "y": "Month"},
+        title="Mean net energy by month and time of day",
+    )
+    return fig
+
+
+def write_report(figures: list[go.Figure], path: Path) -> None:
+    # one html page of figures; plotly.js is loaded from its CDN rather than
+    # embedded, so the page holds only the (already aggregated) data
+    html = "\n".join(
+        fig.to_html(full_html=False, include_plotlyjs="cdn" if i == 0 else False) for i, fig in enumerate(figures)
+    )
+    atomic_write(Path(path), lambda tmp: tmp.write_text(f"<html><body>\n{html}\n</body></html>\n"))
+
+
+def _result_chunks(
+    path: Path,
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+) -> Iterator[pd.DataFrame]:
+    if path.is_dir():
+        # parts are named by day, so those outside the range are never opened
+        parts = sorted(path.glob("*.parquet"))
+        first = None if start is None else _utc(pd.Timestamp(start)).normalize() - pd.Timedelta(days=1)
+        last = None if end is None else _utc(pd.Timestamp(end))
+        chunks = (
+            pd.read_parquet(part)
+            for part in parts
+            if (first is None or pd.Timestamp(part.stem, tz="UTC") >= first)
+            and (last is None or pd.Timestamp(part.stem, tz="UTC") < last)
+        )
+    else:
+        chunks = pd.read_csv(path, chunksize=CHUNK_ROWS)
+    for df in chunks:
+        df["Datetime"] = _as_datetime(df["Datetime"])
+        df = df[_in_range(df["Datetime"], start, end)]
+        if not df.empty:
+            yield df.reset_index(drop=True)
+
+
+def _energy(df: pd.DataFrame) -> pd.DataFrame:
+    datetimes = _as_datetime(df["Datetime"])
+    purchased = df[PURCHASE_COLUMNS].sum(axis=1)
+    sold = df[SALE_COLUMNS].sum(axis=1)
+    return pd.DataFrame(
+        {
+            "date": datetimes.dt.floor("D"),
+            "month": _month(datetimes),
+            "time": _time_of_day(datetimes),
+            "purchased_mwh": purchased,
+            "sold_mwh": sold,
+            "net_mwh": purchased - sold,
+        }
+    )
+
+
+def _month(datetimes: pd.Series) -> pd.Series:
+    return datetimes.dt.year.astype(str) + "-" + datetimes.dt.month.astype(str).str.zfill(2)
 
-    plot_day_energy_stack(results_df, day=first_day, profit=profit_value).show()
 
-    plot_daily_profit(daily_summary_df).show()
+def _time_of_day(datetimes: pd.Series) -> pd.Series:
+    minutes = datetimes.dt.hour * 60 + datetimes.dt.minute
+    return pd.Series(
+        pd.Categorical.from_codes(minutes // 30, [f"{m // 60:02d}:{m % 60:02d}" for m in range(0, 24 * 60, 30)]),
+        index=datetimes.index,
+    ).astype(str)
 
-    plot_net_power_heatmap(results_df).show()
 
+def _as_datetime(series: pd.Series) -> pd.Series:
+    # parsed only if it is not already a datetime column
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series
+    return pd.to_datetime(series, utc=True)
+
+
+def _utc(timestamp: pd.Timestamp) -> pd.Timestamp:
+    return timestamp.tz_localize("UTC") if timestamp.tz is None else timestamp.tz_convert("UTC")
+
+
+def _in_range(
+    datetimes: pd.Series,
+    start: str | pd.Timestamp | None,
+    end: str | pd.Timestamp | None,
+) -> pd.Series:
+    mask = pd.Series(True, index=datetimes.index)
+    if start is not None:
+        mask &= datetimes >= _utc(pd.Timestamp(start)).tz_convert(datetimes.dt.tz)
+    if end is not None:
+        mask &= datetimes < _utc(pd.Timestamp(end)).tz_convert(datetimes.dt.tz)
+    return mask
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Plot backtest results")
+    parser.add_argument("--results", type=Path, default=DATA_DIR / "result.csv", help="result.csv or a results directory")
+    parser.add_argument("--summary", type=Path, default=DATA_DIR / "daily_summary.csv")
+    parser.add_argument("--day", help="day to plot the trades of, the first day by default")
+    parser.add_argument("--start", help="first day of the daily profit plot")
+    parser.add_argument("--end", help="day after the last of the daily profit plot")
+    parser.add_argument("--html", type=Path, help="write the plots to this html file instead of showing them")
+    args = parser.parse_args()
+
+    aggregates = load_aggregates(args.results, args.summary)
+    daily_summary_df = load_daily_summary(args.summary)
+    day = pd.Timestamp(args.day) if args.day else aggregates["daily"]["date"].min()
+    day_results = load_results(args.results, start=day, end=_utc(day) + pd.Timedelta(days=1))
+    profit_row = daily_summary_df[_as_datetime(daily_summary_df["date"]).dt.floor("D") == _utc(day).normalize()]
+    profit_value = float(profit_row["profit"].iloc[0]) if len(profit_row) else None
+
+    figures = [
+        plot_day_energy_stack(day_results, day=day, profit=profit_value),
+        plot_daily_profit(daily_summary_df, start=args.start, end=args.end),
+        plot_weekly_energy(aggregates),
+        plot_time_of_day_heatmap(aggregates),
+    ]
+    if args.html:
+        write_report(figures, args.html)
+    else:
+        for fig in figures:
+            fig.show()
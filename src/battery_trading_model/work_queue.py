@@ -0,0 +1,396 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import asdict, fields
+from pathlib import Path
+
+import pandas as pd
+
+from battery_trading_model.constants import DATA_DIR, DEFAULT_BATTERY_PARAMETERS, BatteryParameters
+from battery_trading_model.main import ENGINES, run_backtest
+from battery_trading_model.price_data import PriceCube, load_price_cube
+from battery_trading_model.scenarios import SCENARIO_METHODS, scenario_batches, scenario_price_cube
+from battery_trading_model.sweep import _parse_grid, parameter_grid
+
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+BACKTEST_LOGGER = "battery_trading_model.main"
+TASK_STATES = ["pending", "claimed", "done", "failed"]
+
+# price cubes loaded by this worker, by (data_dir, year, timezone)
+_price_cubes: dict[tuple, PriceCube] = {}
+
+
+class WorkQueue:
+    # A queue of backtest shards in a directory shared by every node:
+    #   tasks/pending/<task>.json   waiting to be claimed
+    #   tasks/claimed/<task>.json   being run; its mtime is the worker's heartbeat
+    #   tasks/done/<task>.json      finished
+    #   tasks/failed/<task>.json    given up on, with the error
+    #   results/<task>.results.parquet, results/<task>.summary.parquet
+    # A task is claimed by renaming it from pending to claimed, which only one
+    # worker can do. A claim whose heartbeat is older than lease_seconds belongs to
+    # a dead worker and is renamed back to pending. Results are renamed into place
+    # whole, so a task run twice after a requeue just writes the same files again.
+    # A task that raises fails straight away; one whose workers keep dying fails
+    # when claimed for the (max_attempts + 1)th time. Tasks chained after a failed
+    # task fail with it, so a bad shard never holds up or takes down the rest.
+
+    def __init__(self, root: Path, lease_seconds: float = 60.0, max_attempts: int = 3):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.task_dirs = {state: self.root / "tasks" / state for state in TASK_STATES}
+        self.results_dir = self.root / "results"
+        for directory in [*self.task_dirs.values(), self.results_dir]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def submit(self, task: dict) -> None:
+        _write_json(self.task_dirs["pending"] / f"{task['task_id']}.json", task)
+
+    def is_done(self, task_id: str) -> bool:
+        return (self.task_dirs["done"] / f"{task_id}.json").exists()
+
+    def is_failed(self, task_id: str) -> bool:
+        return (self.task_dirs["failed"] / f"{task_id}.json").exists()
+
+    def claim(self) -> dict | None:
+        # the first pending task whose predecessor is done, or None
+        for path in sorted(self.task_dirs["pending"].glob("*.json")):
+            try:
+                task = json.loads(path.read_text())
+            except FileNotFoundError:
+                continue
+            if self.is_done(task["task_id"]) or self.is_failed(task["task_id"]):
+                # requeued, but its first worker finished after all
+                path.unlink(missing_ok=True)
+                continue
+            if task["after"] is not None and self.is_failed(task["after"]):
+                self._move_to_failed(path, task, f"Task {task['after']}, which it starts from, failed")
+                continue
+            if task["after"] is not None and not self.is_done(task["after"]):
+                continue
+            claimed = self.task_dirs["claimed"] / path.name
+            try:
+                # rename keeps the mtime, which must not look like a stale heartbeat
+                os.utime(path)
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # claimed by another worker first
+                continue
+            task["attempts"] = task.get("attempts", 0) + 1
+            if task["attempts"] > self.max_attempts:
+                self._move_to_failed(claimed, task, f"Worker died on each of {self.max_attempts} attempts")
+                continue
+            # the attempts are kept in the claim, so they survive a requeue
+            _write_json(claimed, task)
+            return task
+        return None
+
+    def heartbeat(self, task_id: str) -> None:
+        try:
+            os.utime(self.task_dirs["claimed"] / f"{task_id}.json")
+        except FileNotFoundError:
+            # requeued while still running; the results are written all the same
+            pass
+
+    def complete(self, task: dict, results_df: pd.DataFrame, summary_df: pd.DataFrame, worker: str) -> None:
+        task_id = task["task_id"]
+        _write_parquet(self.results_dir / f"{task_id}.results.parquet", results_df, worker)
+        _write_parquet(self.results_dir / f"{task_id}.summary.parquet", summary_df, worker)
+        _write_json(self.task_dirs["done"] / f"{task_id}.json", {**task, "worker": worker}, worker)
+        for state in ["claimed", "pending"]:
+            (self.task_dirs[state] / f"{task_id}.json").unlink(missing_ok=True)
+
+    def fail(self, task: dict, error: str, worker: str) -> None:
+        self._move_to_failed(self.task_dirs["claimed"] / f"{task['task_id']}.json", {**task, "worker": worker}, error)
+
+    def failures(self) -> pd.DataFrame:
+        # the failed tasks and the last line of each one's error
+        failed = [json.loads(path.read_text()) for path in sorted(self.task_dirs["failed"].glob("*.json"))]
+        rows = [
+            {"task_id": task["task_id"], "worker": task.get("worker"), "error": task["error"].strip().splitlines()[-1]}
+            for task in failed
+        ]
+        return pd.DataFrame(rows, columns=["task_id", "worker", "error"])
+
+    def requeue_expired(self) -> list[str]:
+        # claims whose worker has stopped sending heartbeats
+        requeued = []
+        now = time.time()
+        for path in self.task_dirs["claimed"].glob("*.json"):
+            try:
+                if now - path.stat().st_mtime <= self.lease_seconds:
+                    continue
+                os.rename(path, self.task_dirs["pending"] / path.name)
+            except FileNotFoundError:
+                continue
+            requeued.append(path.stem)
+            logger.warning(f"Requeued {path.stem}, whose worker stopped sending heartbeats")
+        return requeued
+
+    def counts(self) -> dict[str, int]:
+        return {state: len(list(directory.glob("*.json"))) for state, directory in self.task_dirs.items()}
+
+    def read_summary(self, task_id: str) -> pd.DataFrame:
+        return pd.read_parquet(self.results_dir / f"{task_id}.summary.parquet")
+
+    def _move_to_failed(self, path: Path, task: dict, error: str) -> None:
+        _write_json(self.task_dirs["failed"] / path.name, {**task, "error": error})
+        path.unlink(missing_ok=True)
+        logger.error(f"Task {task['task_id']} failed: {error.strip().splitlines()[-1]}")
+
+
+def plan_tasks(
+    queue: WorkQueue,
+    start_day: pd.Timestamp,
+    num_days: int,
+    shard_days: int,
+    parameter_sets: list[BatteryParameters] = [DEFAULT_BATTERY_PARAMETERS],
+    scenarios: list[int | None] = [None],
+    engine: str = "relaxed",
+    start_of_day_soc: float = 0,
+    chain_soc: bool = True,
+    scenario_method: str = "bootstrap",
+    data_dir: Path = DATA_DIR,
+    year: int = 2023,
+    timezone: str = "UTC",
+) -> list[dict]:
+    # One task per date range of shard_days x parameter set x scenario. Scenario
+    # None is the recorded prices, and scenario k the generated price path of seed k
+    # (scenarios.scenario_batches), num_days long from start_day. With chain_soc,
+    # each date range starts from the end SOC of the one before, so the shards of
+    # one parameter set and scenario run in order, and different ones in parallel.
+    # Without, every shard starts at start_of_day_soc and all of them run at once.
+    tasks = []
+    for p, battery_params in enumerate(parameter_sets):
+        for scenario in scenarios:
+            previous = None
+            for offset in range(0, num_days, shard_days):
+                task_id = f"p{p:03d}-{'recorded' if scenario is None else f's{scenario:04d}'}-d{offset:05d}"
+                task = {
+                    "task_id": task_id,
+                    "after": previous if chain_soc else None,
+                    "parameter_set": p,
+                    "battery_params": asdict(battery_params),
+                    "scenario": scenario,
+                    "scenario_method": scenario_method,
+                    "start_day": pd.Timestamp(start_day).isoformat(),
+                    "num_days": num_days,
+                    "offset": offset,
+                    "shard_days": min(shard_days, num_days - offset),
+                    "start_of_day_soc": start_of_day_soc,
+                    "engine": engine,
+                    "data": {"data_dir": str(data_dir), "year": year, "timezone": timezone},
+                }
+                queue.submit(task)
+                tasks.append(task)
+                previous = task_id
+    logger.info(f"Planned {len(tasks)} tasks in {queue.root}")
+    return tasks
+
+
+def run_worker(
+    queue: WorkQueue,
+    worker: str | None = None,
+    poll_seconds: float = 1.0,
+    exit_when_empty: bool = True,
+) -> int:
+    # claims and runs tasks until none are pending or claimed (or forever if not
+    # exit_when_empty), sending heartbeats while each runs. Returns the tasks run
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    n_tasks = 0
+    while True:
+        task = queue.claim()
+        if task is None:
+            queue.requeue_expired()
+            counts = queue.counts()
+            if exit_when_empty and counts["pending"] == 0 and counts["claimed"] == 0:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        logger.info(f"Worker {worker} running {task['task_id']}")
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=_send_heartbeats, args=(queue, task["task_id"], stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            results_df, summary_df = run_task(queue, task)
+        except Exception:
+            # running it again would fail the same way, on this worker or the next
+            queue.fail(task, traceback.format_exc(), worker)
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+        queue.complete(task, results_df, summary_df, worker)
+        n_tasks += 1
+    logger.info(f"Worker {worker} ran {n_tasks} tasks")
+    return n_tasks
+
+
+def run_task(queue: WorkQueue, task: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # the task's date range of the daily backtest, with columns saying which
+    # parameter set and scenario the rows belong to
+    price_cube = _task_price_cube(task)
+    first_day = price_cube.day_index(pd.Timestamp(task["start_day"])) + task["offset"]
+    start_of_day_soc = task["start_of_day_soc"]
+    if task["after"] is not None:
+        start_of_day_soc = float(queue.read_summary(task["after"])["end_soc"].iloc[-1])
+
+    daily_results, daily_summary = run_backtest(
+        price_cube,
+        start_day=price_cube.days[first_day],
+        num_days=task["shard_days"],
+        start_of_day_soc=start_of_day_soc,
+        engine=task["engine"],
+        battery_params=BatteryParameters(**task["battery_params"]),
+    )
+    labels = {"parameter_set": task["parameter_set"], "scenario": task["scenario"]}
+    # nullable, so the recorded prices' missing scenario survives parquet and concat
+    dtypes = {"scenario": "Int64"}
+    results_df = pd.concat(daily_results, ignore_index=True).assign(**labels).astype(dtypes)
+    summary_df = pd.concat(daily_summary, ignore_index=True).assign(**labels).astype(dtypes)
+    return results_df, summary_df
+
+
+def merge_results(queue: WorkQueue, results_path: Path, summary_path: Path) -> pd.DataFrame:
+    # result.csv and daily_summary.csv of every task, with the battery parameters
+    # of each parameter set joined onto the summary as in sweep_results.csv
+    counts = queue.counts()
+    if counts["failed"]:
+        raise Exception(f"{counts['failed']} tasks in {queue.root} failed:\n{queue.failures().to_string(index=False)}")
+    if counts["pending"] or counts["claimed"]:
+        raise Exception(f"{counts['pending'] + counts['claimed']} tasks in {queue.root} are not done yet")
+    tasks = [json.loads(path.read_text()) for path in sorted(queue.task_dirs["done"].glob("*.json"))]
+
+    order = ["parameter_set", "scenario", "date"]
+    results_df = pd.concat(
+        [pd.read_parquet(queue.results_dir / f"{task['task_id']}.results.parquet") for task in tasks],
+        ignore_index=True,
+    ).sort_values(["parameter_set", "scenario", "Datetime"], kind="stable")
+    summary_df = pd.concat([queue.read_summary(task["task_id"]) for task in tasks], ignore_index=True)
+    parameters = pd.DataFrame(
+        [{"parameter_set": task["parameter_set"], **task["battery_params"]} for task in tasks]
+    ).drop_duplicates("parameter_set")
+    summary_df = summary_df.merge(parameters, on="parameter_set").sort_values(order, kind="stable")
+
+    results_df.to_csv(results_path, index=False)
+    logger.info(f"Model results saved to {results_path}")
+    summary_df.to_csv(summary_path, index=False)
+    logger.info(f"Daily summary saved to {summary_path}")
+    return summary_df
+
+
+def _task_price_cube(task: dict) -> PriceCube:
+    data = task["data"]
+    key = (data["data_dir"], data["year"], data["timezone"])
+    if key not in _price_cubes:
+        _price_cubes[key] = load_price_cube(Path(data["data_dir"]), data["year"], data["timezone"])
+    history = _price_cubes[key]
+    if task["scenario"] is None:
+        return history
+
+    start_day = pd.Timestamp(task["start_day"])
+    prices, daily_prices = next(
+        scenario_batches(history, 1, task["num_days"], task["scenario_method"], batch_size=1, seed=task["scenario"])
+    )
+    return scenario_price_cube(start_day, prices[0], daily_prices[0])
+
+
+def _send_heartbeats(queue: WorkQueue, task_id: str, stop: threading.Event) -> None:
+    while not stop.wait(queue.lease_seconds / 4):
+        queue.heartbeat(task_id)
+
+
+def _write_json(path: Path, payload: dict, worker: str = "") -> None:
+    tmp = path.with_name(f"{path.name}.{worker or uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(payload, indent=2))
+    os.replace(tmp, path)
+
+
+def _write_parquet(path: Path, df: pd.DataFrame, worker: str) -> None:
+    # renamed into place like utils.atomic_write, through a temporary file of this
+    # worker's own, as a requeued task's old worker may be writing the same file
+    tmp = path.with_name(f"{path.name}.{worker}.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Shard backtests across machines through a shared directory")
+    parser.add_argument("--queue-dir", type=Path, default=DATA_DIR / "queue")
+    parser.add_argument("--lease-seconds", type=float, default=60.0)
+    parser.add_argument("--max-attempts", type=int, default=3, help="claims of a task whose workers keep dying")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="write the task files of a study")
+    plan.add_argument("--num-days", type=int, default=365)
+    plan.add_argument("--shard-days", type=int, default=30)
+    plan.add_argument("--grid", nargs="*", default=[], help="battery parameters, e.g. --grid C_max=50,100")
+    plan.add_argument("--scenarios", type=int, default=0, help="generated price paths, as well as the recorded prices")
+    plan.add_argument("--scenario-method", choices=SCENARIO_METHODS, default="bootstrap")
+    plan.add_argument("--engine", choices=ENGINES, default="relaxed")
+    plan.add_argument(
+        "--independent-shards",
+        action="store_true",
+        help="start every date range empty instead of from the previous range's end SOC",
+    )
+    plan.add_argument("--year", type=int, default=2023)
+    plan.add_argument("--timezone", default="UTC")
+
+    worker = commands.add_parser("worker", help="claim and run tasks until there are none left")
+    worker.add_argument("--poll-seconds", type=float, default=1.0)
+    worker.add_argument("--forever", action="store_true", help="keep waiting for new tasks")
+
+    commands.add_parser("status", help="count the tasks in each state")
+
+    merge = commands.add_parser("merge", help="write result.csv and daily_summary.csv from every task")
+    merge.add_argument("--output-dir", type=Path, default=DATA_DIR)
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue_dir, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    if args.command == "plan":
+        price_cube = load_price_cube(year=args.year, timezone=args.timezone)
+        plan_tasks(
+            queue,
+            start_day=price_cube.days[0],
+            num_days=args.num_days,
+            shard_days=args.shard_days,
+            parameter_sets=parameter_grid(**_parse_grid(args.grid)),
+            scenarios=[None, *range(args.scenarios)],
+            engine=args.engine,
+            chain_soc=not args.independent_shards,
+            scenario_method=args.scenario_method,
+            year=args.year,
+            timezone=args.timezone,
+        )
+    elif args.command == "worker":
+        # per-day progress would drown out the task progress
+        logging.getLogger(BACKTEST_LOGGER).setLevel(logging.WARNING)
+        run_worker(queue, poll_seconds=args.poll_seconds, exit_when_empty=not args.forever)
+    elif args.command == "status":
+        logger.info(f"Tasks: {queue.counts()}")
+        failures = queue.failures()
+        if len(failures):
+            logger.error(f"Failed tasks:\n{failures.to_string(index=False)}")
+    else:
+        summary_df = merge_results(queue, args.output_dir / "result.csv", args.output_dir / "daily_summary.csv")
+        parameter_names = [field.name for field in fields(BatteryParameters)]
+        totals = summary_df.groupby([*parameter_names, "scenario"], dropna=False)["profit"].sum().reset_index()
+        logger.info(f"Total profit by parameter set and scenario:\n{totals.to_string(index=False)}")
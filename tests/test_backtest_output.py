@@ -0,0 +1,120 @@
+import pandas as pd
+import pytest
+
+from battery_trading_model.backtest_output import BacktestWriter
+from battery_trading_model.main import run_backtest, run_streaming_backtest
+from battery_trading_model.price_data import build_price_cube
+from battery_trading_model.synthetic import random_price_cube, random_price_data
+
+START_DAY = pd.Timestamp("2023-01-01", tz="UTC")
+
+
+def test_resumed_backtest_writes_identical_files(tmp_path, monkeypatch):
+    price_cube = random_price_cube(num_days=4)
+
+    run_streaming_backtest(price_cube, START_DAY, 4, tmp_path / "full", engine="relaxed").finalise(
+        tmp_path / "full_result.csv", tmp_path / "full_summary.csv"
+    )
+
+    # crash after writing the third day's results but before its checkpoint
+    append_day = BacktestWriter.append_day
+
+    def crashing_append_day(self, day, results_df, summary_df, day_inputs=None):
+        if self.completed_days == 2:
+            results_df.to_parquet(self.results_dir / f"{day.date().isoformat()}.parquet")
+            raise RuntimeError("crashed")
+        append_day(self, day, results_df, summary_df, day_inputs)
+
+    monkeypatch.setattr(BacktestWriter, "append_day", crashing_append_day)
+    with pytest.raises(RuntimeError):
+        run_streaming_backtest(price_cube, START_DAY, 4, tmp_path / "resumed", engine="relaxed")
+    monkeypatch.setattr(BacktestWriter, "append_day", append_day)
+
+    writer = run_streaming_backtest(price_cube, START_DAY, 4, tmp_path / "resumed", resume=True, engine="relaxed")
+    assert writer.completed_days == 4
+    writer.finalise(tmp_path / "resumed_result.csv", tmp_path / "resumed_summary.csv")
+
+    for name in ["result.csv", "summary.csv"]:
+        assert (tmp_path / f"resumed_{name}").read_bytes() == (tmp_path / f"full_{name}").read_bytes()
+
+    # and the same as the in-memory run
+    daily_results, _ = run_backtest(price_cube, START_DAY, 4, engine="relaxed")
+    pd.concat(daily_results, ignore_index=True).to_csv(tmp_path / "memory_result.csv", index=False)
+    assert (tmp_path / "memory_result.csv").read_bytes() == (tmp_path / "full_result.csv").read_bytes()
+
+
+def test_resume_rejects_a_different_run(tmp_path):
+    price_cube = random_price_cube(num_days=2)
+    run_streaming_backtest(price_cube, START_DAY, 1, tmp_path, engine="matrix")
+
+    with pytest.raises(ValueError, match="different run"):
+        run_streaming_backtest(price_cube, START_DAY, 2, tmp_path, resume=True, engine="dp")
+
+    # without --resume the old output is replaced
+    writer = run_streaming_backtest(price_cube, START_DAY, 2, tmp_path, engine="dp")
+    assert len(writer.read_summary()) == 2
+
+
+def test_incremental_run_only_resolves_revised_days(tmp_path):
+    price_cube = random_price_cube(num_days=5)
+    run_streaming_backtest(price_cube, START_DAY, 5, tmp_path / "run", engine="relaxed")
+
+    writer = run_streaming_backtest(price_cube, START_DAY, 5, tmp_path / "run", incremental=True, engine="relaxed")
+    assert writer.patched_days == []
+
+    # revise the third day's prices: the first two days are kept, and the result is
+    # the same as running the revised prices from scratch
+    price_cube.ssp_prices[2, :10] += 50.0
+    writer = run_streaming_backtest(price_cube, START_DAY, 5, tmp_path / "run", incremental=True, engine="relaxed")
+    assert writer.patched_days[0] == price_cube.days[2]
+    writer.finalise(tmp_path / "incremental_result.csv", tmp_path / "incremental_summary.csv")
+
+    run_streaming_backtest(price_cube, START_DAY, 5, tmp_path / "full", engine="relaxed").finalise(
+        tmp_path / "full_result.csv", tmp_path / "full_summary.csv"
+    )
+    for name in ["result.csv", "summary.csv"]:
+        assert (tmp_path / f"incremental_{name}").read_bytes() == (tmp_path / f"full_{name}").read_bytes()
+
+
+def test_incremental_run_removes_days_whose_revised_prices_are_skipped(tmp_path):
+    apx_data, ssp_data, ons_data = random_price_data(num_days=4)
+    price_cube = build_price_cube(apx_data, ssp_data, ons_data)
+    run_streaming_backtest(price_cube, START_DAY, 4, tmp_path / "run", engine="relaxed", data_policy="skip")
+
+    # the revision loses half an hour of the second day's APX prices
+    revised = build_price_cube(apx_data.drop(index=60), ssp_data, ons_data)
+    writer = run_streaming_backtest(
+        revised, START_DAY, 4, tmp_path / "run", incremental=True, engine="relaxed", data_policy="skip"
+    )
+    assert revised.days[1] in writer.patched_days
+    writer.finalise(tmp_path / "incremental_result.csv", tmp_path / "incremental_summary.csv")
+
+    run_streaming_backtest(revised, START_DAY, 4, tmp_path / "full", engine="relaxed", data_policy="skip").finalise(
+        tmp_path / "full_result.csv", tmp_path / "full_summary.csv"
+    )
+    for name in ["result.csv", "summary.csv"]:
+        assert (tmp_path / f"incremental_{name}").read_bytes() == (tmp_path / f"full_{name}").read_bytes()
+    assert len(pd.read_csv(tmp_path / "full_summary.csv")) == 3
+
+
+def test_incremental_run_solves_skipped_days_whose_revised_prices_are_complete(tmp_path):
+    apx_data, ssp_data, ons_data = random_price_data(num_days=4)
+    # the second day is skipped for half an hour of missing APX prices
+    price_cube = build_price_cube(apx_data.drop(index=60), ssp_data, ons_data)
+    run_streaming_backtest(price_cube, START_DAY, 4, tmp_path / "run", engine="relaxed", data_policy="skip")
+
+    # the revision fills the gap
+    revised = build_price_cube(apx_data, ssp_data, ons_data)
+    writer = run_streaming_backtest(
+        revised, START_DAY, 4, tmp_path / "run", incremental=True, engine="relaxed", data_policy="skip"
+    )
+    assert revised.days[1] in writer.patched_days
+    assert writer.completed_days == 4
+    writer.finalise(tmp_path / "incremental_result.csv", tmp_path / "incremental_summary.csv")
+
+    run_streaming_backtest(revised, START_DAY, 4, tmp_path / "full", engine="relaxed", data_policy="skip").finalise(
+        tmp_path / "full_result.csv", tmp_path / "full_summary.csv"
+    )
+    for name in ["result.csv", "summary.csv"]:
+        assert (tmp_path / f"incremental_{name}").read_bytes() == (tmp_path / f"full_{name}").read_bytes()
+    assert len(pd.read_csv(tmp_path / "full_summary.csv")) == 4
@@ -0,0 +1,34 @@
+import asyncio
+import json
+
+from battery_trading_model.synthetic import random_price_cube
+from benchmarks.intraday_load import run_local
+from benchmarks.suite import STAGES, benchmark_case, cases_table, compare_reports
+
+
+def test_benchmark_case_times_every_stage():
+    price_cube = random_price_cube(num_days=2)
+    case = benchmark_case(price_cube, num_days=2, mode="dp")
+
+    assert set(case["stages"]) == set(STAGES)
+    assert case["stages"]["solve"]["total_s"] > 0
+    assert case["wall_time_s"] > 0 and case["peak_rss_mb"] > 0
+    # the dp engine has no solver to report its own time
+    assert "solver_time_s" not in case
+
+    # the solver's own time, without PuLP writing and reading its files
+    pulp_case = benchmark_case(price_cube, num_days=2, mode="pulp", solver="highs")
+    assert pulp_case["solver"] == "highs"
+    assert 0 < pulp_case["solver_time_s"] < pulp_case["stages"]["solve"]["total_s"]
+
+    # reports round-trip through json and can be diffed
+    report = json.loads(json.dumps({"cases": [case, benchmark_case(price_cube, num_days=1, mode="horizon")]}))
+    assert len(cases_table(report)) == 2
+    comparison = compare_reports(report, report)
+    assert (comparison["wall_time_s_ratio"] == 1).all()
+
+
+def test_intraday_load_test_reports_latencies():
+    latency, server_metrics = asyncio.run(run_local(n_batteries=1, days=1, relaxed=False))
+    assert latency.n == server_metrics["request"]["count"] == 48
+    assert latency.percentile(99) > 0
@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+
+from battery_trading_model.data_store import DataStore
+from battery_trading_model.elexon_client import ElexonClient, FetchConfig
+from battery_trading_model.fetch_data import read_ons_sheet, store_fetchers
+from battery_trading_model.price_data import load_stored_price_cube
+
+from tests.fake_elexon import FakeElexonServer, fixture_prices
+
+
+def utc(day: str) -> pd.Timestamp:
+    return pd.Timestamp(day, tz="UTC")
+
+
+def half_hourly_price(timestamp: pd.Timestamp) -> float:
+    # deterministic price so fetched data can be checked without storing it
+    return round(timestamp.day + timestamp.hour / 100 + timestamp.minute / 10000, 4)
+
+
+def half_hourly_fetch(calls: list):
+    def fetch(start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        calls.append((start, end))
+        # include the next midnight, like the market index endpoint does
+        datetimes = pd.date_range(start, end, freq="30min")
+        return pd.DataFrame({"datetime": datetimes.astype(str), "price": [half_hourly_price(t) for t in datetimes]})
+
+    return fetch
+
+
+def test_missing_ranges_split_at_gaps_and_month_ends(tmp_path):
+    store = DataStore(tmp_path)
+    store._record_days("apx", pd.date_range("2023-01-10", "2023-01-12", tz="UTC"))
+
+    assert store.missing_ranges("apx", utc("2023-01-08"), utc("2023-02-03")) == [
+        (utc("2023-01-08"), utc("2023-01-10")),
+        (utc("2023-01-13"), utc("2023-02-01")),
+        (utc("2023-02-01"), utc("2023-02-03")),
+    ]
+    assert store.missing_ranges("apx", utc("2023-01-10"), utc("2023-01-13")) == []
+
+
+def test_update_only_fetches_missing_days_and_resumes(tmp_path):
+    calls = []
+    fetch = half_hourly_fetch(calls)
+
+    def failing_fetch(start, end):
+        if start.month == 2:
+            raise ConnectionError("interrupted")
+        return fetch(start, end)
+
+    with pytest.raises(ConnectionError):
+        DataStore(tmp_path).update("apx", utc("2023-01-20"), utc("2023-02-10"), failing_fetch)
+    assert (tmp_path / "apx" / "2023-01.parquet").exists()
+
+    # a new store picks the completed month up from the manifest
+    calls.clear()
+    store = DataStore(tmp_path)
+    assert store.update("apx", utc("2023-01-20"), utc("2023-02-10"), fetch) == 1
+    assert calls == [(utc("2023-02-01"), utc("2023-02-10"))]
+    assert store.update("apx", utc("2023-01-20"), utc("2023-02-10"), fetch) == 0
+
+    df = store.load("apx", utc("2023-01-20"), utc("2023-02-10"))
+    assert len(df) == 21 * 48
+    assert df["datetime"].is_monotonic_increasing
+    assert not df["datetime"].duplicated().any()
+    assert str(df["datetime"].dtype) == "datetime64[us, UTC]"
+    assert df["price"].dtype == "float64"
+
+
+def test_load_spans_years_and_projects_columns(tmp_path):
+    store = DataStore(tmp_path)
+    store.update("ssp", utc("2022-12-30"), utc("2023-01-03"), half_hourly_fetch([]))
+
+    df = store.load("ssp", utc("2022-12-31"), utc("2023-01-02"))
+    assert df["datetime"].iloc[0] == utc("2022-12-31")
+    assert df["datetime"].iloc[-1] == utc("2023-01-01 23:30")
+    assert list(store.load("ssp", utc("2022-12-31"), utc("2023-01-02"), columns=["datetime"]).columns) == ["datetime"]
+    assert store.load("ssp", utc("2024-01-01"), utc("2024-01-02")).empty
+
+
+def test_store_fetched_from_elexon_builds_price_cube(tmp_path):
+    store = DataStore(tmp_path)
+    config = FetchConfig(max_workers=4, requests_per_second=1000, burst=1000)
+    with FakeElexonServer() as server, ElexonClient(server.url, config) as client:
+        fetchers = store_fetchers(client)
+        for source in ["apx", "ssp"]:
+            store.update(source, utc("2023-01-01"), utc("2023-01-05"), fetchers[source])
+    store.update(
+        "ons",
+        utc("2023-01-01"),
+        utc("2023-01-05"),
+        lambda start, end: pd.DataFrame({"datetime": pd.date_range(start, end, freq="D"), "price": 80.0}),
+    )
+
+    price_cube = load_stored_price_cube(utc("2023-01-01"), utc("2023-01-05"), store)
+    price_cube.check_days(slice(0, 4))
+    assert price_cube.prices.shape == (4, 48, 2)
+    assert price_cube.apx_prices[2, 1] == fixture_prices("apx")[utc("2023-01-03 00:30")]
+    assert price_cube.ssp_prices[3, 47] == fixture_prices("ssp")[utc("2023-01-04 23:30")]
+
+
+def test_ons_sheet_is_parsed_once(tmp_path, monkeypatch):
+    excel_path = tmp_path / "ons.xlsx"
+    sheet = pd.DataFrame({"Date": pd.date_range("2023-01-01", periods=3), "Daily average": [70.0, 80.0, 90.0]})
+    with pd.ExcelWriter(excel_path) as writer:
+        sheet.to_excel(writer, sheet_name="1.Daily SP Electricity", startrow=4, index=False)
+
+    first = read_ons_sheet(excel_path)
+    assert excel_path.with_suffix(".parquet").exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("workbook parsed again")
+
+    monkeypatch.setattr(pd, "read_excel", fail)
+    pd.testing.assert_frame_equal(read_ons_sheet(excel_path), first)
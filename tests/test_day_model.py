@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from battery_trading_model.day_model import DayModel
+from battery_trading_model.main import run_backtest
+from battery_trading_model.model import build_problem
+from battery_trading_model.solver import solve_problem
+from battery_trading_model.synthetic import random_day, random_price_cube
+
+
+def test_day_model_matches_pulp_across_updates():
+    day_model = DayModel()
+    for seed in range(4):
+        day = random_day(seed)
+
+        problem, model = build_problem(**day)
+        _, objective = solve_problem(problem)
+
+        status, day_objective = day_model.update(
+            prices=[day["apx_prices"], day["ssp_prices"]],
+            q=day["daily_price"],
+            v=day["final_soc_price"],
+            initial_soc=day["initial_soc"],
+        )
+        assert status == "Optimal"
+        assert day_objective == pytest.approx(objective, rel=1e-6)
+        assert day_model.model["SOC"][0].varValue == pytest.approx(day["initial_soc"])
+
+
+def test_day_model_rejects_wrong_number_of_prices():
+    with pytest.raises(ValueError):
+        DayModel().update(prices=[[1.0] * 46, [1.0] * 46], q=1.0, v=1.0, initial_soc=0)
+
+
+def test_backtest_engines_agree():
+    price_cube = random_price_cube(num_days=3)
+    start_day = pd.Timestamp("2023-01-01", tz="UTC")
+
+    summaries = {}
+    for engine in ["pulp", "matrix", "day-model"]:
+        _, daily_summary = run_backtest(
+            price_cube, start_day=start_day, num_days=3, engine=engine
+        )
+        summaries[engine] = pd.concat(daily_summary, ignore_index=True)
+
+    for engine in ["matrix", "day-model"]:
+        pd.testing.assert_series_equal(
+            summaries[engine]["objective"], summaries["pulp"]["objective"], rtol=1e-6
+        )
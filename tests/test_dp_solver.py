@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.dp_solver import compare_dp_with_mip, solve_dp_problem
+from battery_trading_model.solver import evaluate_profit
+from battery_trading_model.synthetic import random_day
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_dp_is_close_to_mip(seed):
+    comparison = compare_dp_with_mip(**random_day(seed))
+    assert 0 <= comparison["gap"] < 0.005
+
+
+@pytest.mark.parametrize("daily_price", [5.0, 80.0, 300.0])
+def test_dp_solution_is_feasible(daily_price):
+    day = random_day(4)
+    day["daily_price"] = daily_price
+    day["initial_soc"] = 30.0
+    params = DEFAULT_BATTERY_PARAMETERS
+
+    status, objective, model = solve_dp_problem(**day)
+    assert status == "Optimal"
+
+    soc = np.array([model["SOC"][t].varValue for t in range(49)])
+    bought = np.array([sum(model["X"][m][t].varValue for m in model["markets"]) for t in range(48)])
+    sold = np.array([sum(model["Z"][m][t].varValue for m in model["markets"]) for t in range(48)])
+    charge = bought + model["y"].varValue / 48
+    discharge = sold + model["w"].varValue / 48
+
+    assert soc[0] == pytest.approx(30.0)
+    assert np.all(soc >= -1e-9) and np.all(soc <= params.C_max + 1e-9)
+    np.testing.assert_allclose(
+        np.diff(soc), params.frac_charged * charge - params.frac_discharged * discharge, atol=1e-9
+    )
+    assert np.all(charge <= params.X_max + 1e-9) and np.all(discharge <= params.Z_max + 1e-9)
+    assert np.all(np.minimum(charge, discharge) < 1e-9)
+
+    profit = evaluate_profit(**{k: model[k] for k in ["P", "q", "X", "Z", "y", "w"]})
+    assert objective == pytest.approx(profit + day["final_soc_price"] * soc[-1])
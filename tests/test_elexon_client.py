@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from battery_trading_model import fetch_data
+from battery_trading_model.elexon_client import ElexonClient, FetchConfig
+from battery_trading_model.fetch_data import (
+    DataProvider,
+    get_market_index_data,
+    get_settlement_system_data,
+)
+
+from tests.fake_elexon import FakeElexonServer, fixture_prices
+
+FAST = FetchConfig(max_workers=4, requests_per_second=1000, burst=1000, backoff=0.01)
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+END = datetime(2023, 1, 9, tzinfo=timezone.utc)
+# the fixtures hold system prices for the first four days only
+SETTLEMENT_END = datetime(2023, 1, 5, tzinfo=timezone.utc)
+
+
+def test_concurrent_fetch_matches_sequential_fetch():
+    with FakeElexonServer(delay=0.02) as server:
+        sequential = FetchConfig(max_workers=1, requests_per_second=1000, burst=1000)
+        with ElexonClient(server.url, sequential) as client:
+            expected = get_market_index_data(START, END, DataProvider.APX, client=client)
+        with ElexonClient(server.url, FAST) as client:
+            actual = get_market_index_data(START, END, DataProvider.APX, client=client)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    # the API returns the newest prices first
+    assert actual["datetime"].is_monotonic_increasing
+    assert actual["datetime"].iloc[0] == pd.Timestamp(START)
+    assert actual["datetime"].iloc[-1] == pd.Timestamp(END)
+    assert actual["price"].tolist() == fixture_prices("apx").tolist()
+
+
+def test_settlement_days_are_fetched_concurrently_and_ordered():
+    with FakeElexonServer(delay=0.05) as server:
+        with ElexonClient(server.url, FAST) as client:
+            df = get_settlement_system_data(START, SETTLEMENT_END, client=client)
+
+    assert server.max_in_flight > 1
+    assert len(df) == 4 * 48
+    assert df["datetime"].is_monotonic_increasing
+    assert df["price"].tolist() == fixture_prices("ssp").tolist()
+
+
+def test_default_client_is_closed(monkeypatch):
+    closed = []
+    close = ElexonClient.close
+    monkeypatch.setattr(ElexonClient, "close", lambda client: closed.append(client) or close(client))
+    with FakeElexonServer() as server:
+        monkeypatch.setattr(fetch_data, "ELEXON_API_URL", server.url)
+        df = get_settlement_system_data(START, START + timedelta(days=1))
+        fetch_data.fetch_market_index_data(START, START + timedelta(hours=1), DataProvider.APX)
+
+    assert len(df) == 48
+    assert len(closed) == 2
+
+
+def test_retries_on_rate_limit_and_server_errors():
+    failures = {"/balancing/settlement": [429, 503, 500]}
+    with FakeElexonServer(failures=failures) as server:
+        with ElexonClient(server.url, FAST) as client:
+            df = get_settlement_system_data(START, START + timedelta(days=1), client=client)
+
+    assert len(server.paths) == 4
+    assert len(df) == 48
+
+
+def test_gives_up_after_max_retries_and_on_client_errors():
+    config = FetchConfig(max_retries=2, backoff=0.01, requests_per_second=1000, burst=1000)
+    with (
+        FakeElexonServer(failures={"/balancing/settlement": [500] * 5}) as server,
+        ElexonClient(server.url, config) as client,
+    ):
+        with pytest.raises(Exception, match="500"):
+            client.get_json("/balancing/settlement/system-prices/2023-01-01")
+        assert len(server.paths) == 3
+
+        with pytest.raises(Exception, match="404"):
+            client.get_json("/unknown")
+        assert len(server.paths) == 4
+
+
+def test_requests_are_rate_limited():
+    config = FetchConfig(max_workers=8, requests_per_second=50, burst=1)
+    with FakeElexonServer() as server, ElexonClient(server.url, config) as client:
+        start = time.monotonic()
+        client.get_many([("/balancing/settlement/system-prices/2023-01-01", None)] * 11)
+        elapsed = time.monotonic() - start
+
+    # one token up front, then ten more at 50 per second
+    assert elapsed >= 0.18
+    gaps = pd.Series(sorted(server.request_times)).diff().dropna()
+    assert gaps.sum() >= 0.18
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.fleet_model import (
+    FleetLayout,
+    SharedConstraints,
+    build_fleet_problem,
+    solve_fleet,
+    split_fleet_solution,
+)
+from battery_trading_model.main import run_backtest, run_fleet_backtest
+from battery_trading_model.solver import solve_horizon_problem
+from battery_trading_model.synthetic import random_day, random_price_cube
+
+BATTERIES = [DEFAULT_BATTERY_PARAMETERS, replace(DEFAULT_BATTERY_PARAMETERS, C_max=20, c_rate=10, d_rate=15)]
+
+
+def fleet_inputs(seed: int = 0) -> dict:
+    day = random_day(seed)
+    del day["initial_soc"]
+    return day
+
+
+def test_column_map_covers_every_column_once():
+    layout = FleetLayout(n_assets=3)
+    columns = layout.column_map()
+    assert columns.shape == (3, layout.block.n_variables)
+    assert np.array_equal(np.sort(columns.ravel()), np.arange(layout.n_variables))
+    charge_mode = columns[:, layout.block.charge_mode].ravel()
+    assert np.array_equal(charge_mode, np.arange(layout.n_variables)[layout.charge_mode])
+
+
+def test_uncoupled_fleet_matches_separate_solves():
+    day = fleet_inputs()
+    problem = build_fleet_problem(BATTERIES, **day, initial_socs=[10.0, 5.0])
+    status, objective_value, x, _ = solve_horizon_problem(problem)
+    assert status == "Optimal"
+
+    # decomposed, in this process and across threads
+    serial = solve_fleet(BATTERIES, **day, initial_socs=[10.0, 5.0])
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        parallel = solve_fleet(BATTERIES, **day, initial_socs=[10.0, 5.0], executor=executor)
+    for result in [serial, parallel]:
+        assert result[0] == "Optimal"
+        assert result[1] == pytest.approx(objective_value)
+
+    solutions = split_fleet_solution(problem.layout, x)
+    assert [solution["SOC"][0, 0] for solution in solutions] == pytest.approx([10.0, 5.0])
+
+
+def test_shared_export_limit_binds():
+    day = fleet_inputs()
+    _, free_objective, _ = solve_fleet(BATTERIES, **day, initial_socs=[0.0, 0.0])
+    shared = SharedConstraints(export_limit=20.0, ons_volume=100.0)
+    status, objective_value, solutions = solve_fleet(BATTERIES, **day, initial_socs=[0.0, 0.0], shared=shared)
+    assert status == "Optimal"
+    assert objective_value < free_objective
+
+    exports = sum(solution["Z"].sum(axis=0) + solution["w"][:, None] / 48 for solution in solutions)
+    assert exports.max() <= 20.0 * 0.5 + 1e-6
+    ons_volume = sum(solution["y"][0] + solution["w"][0] for solution in solutions)
+    assert ons_volume <= 100.0 + 1e-6
+
+
+def test_fleet_backtest_results_match_single_battery_shape():
+    price_cube = random_price_cube(num_days=2)
+    start_day = price_cube.days[0]
+    daily_results, daily_summary = run_fleet_backtest(price_cube, start_day, 2, BATTERIES, max_workers=1)
+    single_results, single_summary = run_backtest(price_cube, start_day, 2, engine="relaxed")
+
+    assert len(daily_results) == len(BATTERIES)
+    for fleet_df, single_df in zip(daily_results[0], single_results):
+        assert list(fleet_df.columns) == list(single_df.columns)
+        pd.testing.assert_series_equal(fleet_df["Datetime"], single_df["Datetime"])
+
+    summary = pd.concat(daily_summary, ignore_index=True)
+    assert list(summary["asset"]) == [0, 1, 0, 1]
+    first_asset = summary[summary["asset"] == 0]["profit"].to_numpy()
+    assert first_asset == pytest.approx(pd.concat(single_summary)["profit"].to_numpy())
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.horizon_model import build_horizon_problem
+from battery_trading_model.main import run_backtest, run_horizon_backtest
+from battery_trading_model.matrix_model import build_matrix_problem
+from battery_trading_model.solver import solve_horizon_problem, solve_matrix_problem
+from battery_trading_model.synthetic import random_day, random_price_cube
+
+
+def test_one_day_horizon_matches_day_problem():
+    day = random_day(0)
+
+    problem, _ = build_matrix_problem(**day)
+    _, objective = solve_matrix_problem(problem)
+
+    horizon_problem = build_horizon_problem(
+        apx_prices=np.array([day["apx_prices"]]),
+        ssp_prices=np.array([day["ssp_prices"]]),
+        daily_prices=np.array([day["daily_price"]]),
+        final_soc_price=day["final_soc_price"],
+        initial_soc=day["initial_soc"],
+    )
+    status, horizon_objective, _, _ = solve_horizon_problem(horizon_problem, relaxed=False)
+
+    assert status == "Optimal"
+    assert horizon_objective == pytest.approx(objective, rel=1e-6)
+
+
+def test_horizon_backtest_splits_into_days():
+    price_cube = random_price_cube(num_days=3)
+    start_day = pd.Timestamp("2023-01-01", tz="UTC")
+
+    daily_results, daily_summary = run_horizon_backtest(
+        price_cube, start_day=start_day, num_days=3
+    )
+    _, loop_summary = run_backtest(
+        price_cube, start_day=start_day, num_days=3, engine="matrix"
+    )
+    summary = pd.concat(daily_summary, ignore_index=True)
+    loop_summary = pd.concat(loop_summary, ignore_index=True)
+
+    assert [len(df) for df in daily_results] == [48, 48, 48]
+    assert list(summary.columns) == list(loop_summary.columns)
+    # SOC is chained across midnight
+    assert daily_results[1]["SOC"].iloc[0] == pytest.approx(summary["end_soc"].iloc[0])
+    # looking across days can only do better than the myopic daily loop
+    assert summary["objective"].sum() >= loop_summary["profit"].sum() - 1e-6
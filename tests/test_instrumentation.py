@@ -0,0 +1,62 @@
+import pstats
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.instrumentation import DISABLED, LatencyHistogram, Metrics, profile
+from battery_trading_model.main import run_backtest
+from battery_trading_model.synthetic import random_price_cube
+
+START_DAY = pd.Timestamp("2023-01-01", tz="UTC")
+
+
+@pytest.mark.parametrize("engine", ["pulp", "matrix", "relaxed", "day-model", "dp"])
+def test_metrics_record_stages_and_solver_stats(engine):
+    metrics = Metrics()
+    run_backtest(random_price_cube(num_days=2), START_DAY, 2, engine=engine, metrics=metrics)
+
+    df = metrics.to_frame()
+    assert list(df["date"]) == list(pd.date_range(START_DAY, periods=2))
+    assert (df["status"] == "Optimal").all()
+    for stage in ["data", "build", "solve", "extract"]:
+        assert (df[f"{stage}_time"] >= 0).all()
+    assert metrics.run_times["check_time"] > 0
+    assert metrics.stage_totals()["solve_time"] == pytest.approx(df["solve_time"].sum())
+    # the solver's own time is a statistic within the solve stage, not another stage
+    assert "solver_time" not in metrics.stage_totals()
+    if "solver_time" in df:
+        assert (df["solver_time"] <= df["solve_time"] + 1e-3).all()
+    if engine in ["matrix", "relaxed", "day-model"]:
+        assert (df["solver_runs"] >= 1).all()
+        assert "nodes" in df
+    if engine == "day-model":
+        assert (df["iterations"] > 0).all()
+
+
+def test_disabled_metrics_record_nothing():
+    assert DISABLED.timer("solve") is DISABLED.timer("build")
+    assert DISABLED.solver_stats() is None
+    run_backtest(random_price_cube(num_days=1), START_DAY, 1, engine="dp")
+    assert DISABLED.rows == [] and DISABLED.run_times == {}
+
+
+def test_profile_dumps_stats(tmp_path):
+    with profile(tmp_path / "run.prof"):
+        run_backtest(random_price_cube(num_days=1), START_DAY, 1, engine="dp")
+    stats = pstats.Stats(str(tmp_path / "run.prof"))
+    assert any(name == "solve_dp_problem" for _, _, name in stats.stats)
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert np.isnan(histogram.percentile(50))
+    for seconds in [0.001] * 98 + [0.05, 2.0]:
+        histogram.record(seconds)
+
+    assert histogram.n == 100
+    # each percentile is the upper edge of its bucket, at most 10**0.1 above the latency
+    assert 0.001 <= histogram.percentile(50) < 0.001 * 10**0.1
+    assert 0.05 <= histogram.percentile(99) < 0.05 * 10**0.1
+    assert histogram.summary()["mean_ms"] == pytest.approx(1000 * (0.098 + 2.05) / 100)
+    assert histogram.to_frame()["count"].sum() == 100
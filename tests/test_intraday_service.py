@@ -0,0 +1,132 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.intraday_service import TIME_LIMIT, IntradayModel, IntradayService, send_request
+from battery_trading_model.matrix_model import MARKETS, build_matrix_problem
+from battery_trading_model.model import build_problem
+from battery_trading_model.solver import SolverConfig, solve_matrix_problem, solve_problem
+from battery_trading_model.synthetic import random_day
+
+
+def reoptimise(model: IntradayModel, day: dict, period: int, soc: float, **kwargs) -> tuple:
+    return model.reoptimise(
+        period,
+        day["apx_prices"][period:],
+        day["ssp_prices"][period:],
+        soc,
+        day["daily_price"],
+        day["final_soc_price"],
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("relaxed", [False, True])
+def test_start_of_day_matches_build_problem(relaxed):
+    model = IntradayModel()
+    for seed in range(3):
+        day = random_day(seed)
+        _, objective_value = solve_problem(build_problem(**day)[0])
+        status, intraday_objective, x = reoptimise(model, day, 0, day["initial_soc"], relaxed=relaxed)
+        assert status == "Optimal"
+        assert intraday_objective == pytest.approx(objective_value, rel=1e-6)
+        assert x[model.layout.SOC][0] == pytest.approx(day["initial_soc"])
+
+
+def test_elapsed_periods_are_fixed():
+    model = IntradayModel()
+    day = random_day(0)
+    layout = model.layout
+    period, soc = 20, 13.0
+
+    # the rest of the day solved from scratch: no trades before period, SOC held at soc until then
+    problem, _ = build_matrix_problem(
+        apx_prices=[0.0] * period + day["apx_prices"][period:],
+        ssp_prices=[0.0] * period + day["ssp_prices"][period:],
+        daily_price=day["daily_price"],
+        final_soc_price=day["final_soc_price"],
+        initial_soc=soc,
+    )
+    for market in MARKETS:
+        problem.upper_bounds[layout.X(market).start : layout.X(market).start + period] = 0
+        problem.upper_bounds[layout.Z(market).start : layout.Z(market).start + period] = 0
+    problem.lower_bounds[[layout.y, layout.w]] = problem.upper_bounds[[layout.y, layout.w]] = 0
+    _, expected = solve_matrix_problem(problem)
+
+    status, objective_value, x = reoptimise(model, day, period, soc, daily_volumes=(0.0, 0.0))
+    assert status == "Optimal"
+    assert objective_value == pytest.approx(expected, rel=1e-6)
+    for market in MARKETS:
+        assert not x[layout.X(market)][:period].any()
+        assert not x[layout.Z(market)][:period].any()
+    assert x[layout.SOC][period] == pytest.approx(soc)
+
+    # committed ONS volumes flow in every period, but the SOC is still pinned at period
+    status, _, x = reoptimise(model, day, period, soc, daily_volumes=(24.0, 0.0))
+    assert status == "Optimal"
+    assert x[layout.y] == pytest.approx(24.0)
+    assert x[layout.SOC][period] == pytest.approx(soc)
+
+    with pytest.raises(ValueError, match="Expected 28 prices"):
+        model.reoptimise(period, day["apx_prices"], day["ssp_prices"], soc, 0.0, 0.0)
+
+
+def test_solve_out_of_time_keeps_the_previous_charge_modes():
+    day = random_day(0)
+    warm = IntradayModel()
+    _, objective_value, expected = reoptimise(warm, day, 0, day["initial_soc"])
+
+    # no time to find any schedule, so only the trades are re-solved around the previous charge modes
+    model = IntradayModel(solver_config=SolverConfig(time_limit=1e-6))
+    assert reoptimise(model, day, 0, day["initial_soc"]) == ("Not Solved", None, None)
+    model.previous_charge_mode = warm.previous_charge_mode
+    status, limited_objective, x = reoptimise(model, day, 0, day["initial_soc"])
+    assert status == TIME_LIMIT
+    assert limited_objective == pytest.approx(objective_value, rel=1e-6)
+    assert x[model.layout.charge_mode] == pytest.approx(expected[model.layout.charge_mode])
+
+
+def test_service_round_trip():
+    day = random_day(1)
+
+    async def run() -> list[tuple[int, dict]]:
+        service = IntradayService({"a": DEFAULT_BATTERY_PARAMETERS, "b": DEFAULT_BATTERY_PARAMETERS})
+        server = await service.start(port=0)
+        host, port = server.sockets[0].getsockname()[:2]
+        async with server:
+            reader, writer = await asyncio.open_connection(host, port)
+            request = {
+                "period": 46,
+                "apx_prices": day["apx_prices"][46:],
+                "ssp_prices": day["ssp_prices"][46:],
+                "soc": 10.0,
+                "daily_price": day["daily_price"],
+                "final_soc_price": day["final_soc_price"],
+                "daily_volumes": [0.0, 0.0],
+            }
+            responses = [
+                await send_request(reader, writer, "GET", "/health"),
+                await send_request(reader, writer, "POST", "/batteries/a/reoptimise", request),
+                await send_request(reader, writer, "POST", "/batteries/b/reoptimise", {**request, "period": 45}),
+                await send_request(reader, writer, "POST", "/batteries/c/reoptimise", request),
+                await send_request(reader, writer, "GET", "/metrics"),
+            ]
+            writer.close()
+            await writer.wait_closed()
+        return responses
+
+    health, solved, bad_request, unknown, metrics = asyncio.run(run())
+    assert health == (200, {"batteries": ["a", "b"]})
+
+    status, response = solved
+    assert status == 200 and response["status"] == "Optimal"
+    assert len(response["X"]["APX"]) == 2
+    assert response["SOC"][0] == pytest.approx(10.0)
+    assert len(response["SOC"]) == 3
+    assert np.isfinite(response["objective"])
+
+    assert bad_request[0] == 400 and "Expected 3 prices" in bad_request[1]["error"]
+    assert unknown[0] == 404
+    assert metrics[1]["request"]["count"] == metrics[1]["solve"]["count"] == 1
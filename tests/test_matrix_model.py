@@ -0,0 +1,77 @@
+import pytest
+
+from battery_trading_model.matrix_model import build_matrix_problem
+from battery_trading_model.model import build_problem
+from battery_trading_model.solver import (
+    evaluate_profit,
+    get_final_soc,
+    solve_matrix_problem,
+    solve_matrix_problem_relaxed,
+    solve_problem,
+)
+from battery_trading_model.synthetic import random_day
+from battery_trading_model.utils import build_model_results_dataframe
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matrix_problem_matches_pulp(seed):
+    day = random_day(seed)
+
+    problem, model = build_problem(**day)
+    status, objective = solve_problem(problem)
+
+    matrix_problem, matrix_model = build_matrix_problem(**day)
+    matrix_status, matrix_objective = solve_matrix_problem(matrix_problem)
+
+    assert status == matrix_status == "Optimal"
+    assert matrix_objective == pytest.approx(objective, rel=1e-6)
+
+    profit_keys = ["P", "q", "X", "Z", "y", "w"]
+    assert evaluate_profit(**{k: matrix_model[k] for k in profit_keys}) == pytest.approx(
+        evaluate_profit(**{k: model[k] for k in profit_keys}), rel=1e-4, abs=1e-3
+    )
+    assert get_final_soc(matrix_model["SOC"]) == pytest.approx(get_final_soc(model["SOC"]), abs=1e-4)
+
+
+def test_matrix_model_builds_results_dataframe():
+    matrix_problem, model = build_matrix_problem(**random_day(3))
+    solve_matrix_problem(matrix_problem)
+
+    df = build_model_results_dataframe(
+        X=model["X"],
+        Z=model["Z"],
+        y=model["y"],
+        w=model["w"],
+        SOC=model["SOC"],
+        timepoints=list(range(48)),
+    )
+    assert len(df) == 48
+    assert df["SOC"].iloc[0] == pytest.approx(20.0)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_relaxed_solve_matches_mip(seed):
+    day = random_day(seed)
+
+    problem, _ = build_matrix_problem(**day)
+    _, objective = solve_matrix_problem(problem)
+
+    relaxed_problem, model = build_matrix_problem(**day)
+    status, relaxed_objective, path = solve_matrix_problem_relaxed(relaxed_problem)
+
+    assert status == "Optimal"
+    assert path in ["lp", "partial-mip", "mip"]
+    assert relaxed_objective == pytest.approx(objective, rel=1e-6)
+    for t in model["timepoints"]:
+        charging = sum(model["X"][m][t].varValue for m in model["markets"])
+        discharging = sum(model["Z"][m][t].varValue for m in model["markets"])
+        assert min(charging, discharging) < 1e-4
+
+
+def test_relaxed_solve_takes_lp_path_without_cross_market_spreads():
+    day = random_day(0)
+    day["ssp_prices"] = day["apx_prices"]
+
+    problem, _ = build_matrix_problem(**day)
+    _, _, path = solve_matrix_problem_relaxed(problem)
+    assert path == "lp"
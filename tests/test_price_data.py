@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.main import ENGINES, run_backtest
+from battery_trading_model.price_data import build_price_cube
+from battery_trading_model.synthetic import random_price_cube, random_price_data
+from battery_trading_model.utils import filter_data_by_day, get_avg_daily_price
+
+
+def test_price_cube_matches_per_day_filtering():
+    apx_data, ssp_data, ons_data = random_price_data(num_days=3)
+    price_cube = build_price_cube(apx_data, ssp_data, ons_data)
+
+    assert price_cube.prices.shape == (3, 48, 2)
+    for i, day in enumerate(price_cube.days):
+        apx_day = filter_data_by_day(apx_data, day)
+        ssp_day = filter_data_by_day(ssp_data, day)
+        ons_day = filter_data_by_day(ons_data, day)
+
+        np.testing.assert_array_equal(price_cube.apx_prices[i], apx_day["price"])
+        np.testing.assert_array_equal(price_cube.ssp_prices[i], ssp_day["price"])
+        assert price_cube.daily_prices[i] == ons_day["price"].item()
+        assert price_cube.avg_prices[i] == pytest.approx(get_avg_daily_price(apx_day, ssp_day, ons_day))
+        assert list(price_cube.timepoints(slice(i, i + 1))) == apx_day["datetime"].to_list()
+
+
+def test_day_index_accepts_naive_and_mid_day_timestamps():
+    price_cube = build_price_cube(*random_price_data(num_days=3))
+    assert price_cube.day_index(pd.Timestamp("2023-01-02")) == 1
+    assert price_cube.day_index(pd.Timestamp("2023-01-03 13:30", tz="UTC")) == 2
+
+
+def test_check_days_reports_gaps_and_duplicates():
+    apx_data, ssp_data, ons_data = random_price_data(num_days=3)
+
+    build_price_cube(apx_data, ssp_data, ons_data).check_days(slice(0, 3))
+
+    with pytest.raises(ValueError, match="2023-01-02, but got 47"):
+        build_price_cube(apx_data.drop(index=60), ssp_data, ons_data).check_days(slice(0, 3))
+
+    duplicated = pd.concat([ssp_data, ssp_data.iloc[[100]]], ignore_index=True)
+    with pytest.raises(ValueError, match="2023-01-03, but got 49"):
+        build_price_cube(apx_data, duplicated, ons_data).check_days(slice(0, 3))
+
+    with pytest.raises(ValueError, match="daily data point on 2023-01-01"):
+        build_price_cube(apx_data, ssp_data, ons_data.drop(index=0)).check_days(slice(0, 3))
+
+    # the bad day is outside the range being checked
+    build_price_cube(apx_data.drop(index=120), ssp_data, ons_data).check_days(slice(0, 2))
+
+
+@pytest.mark.parametrize("start, lengths", [("2023-03-25", [48, 46, 48]), ("2023-10-28", [48, 50, 48])])
+def test_clock_change_days_have_their_own_length(start, lengths):
+    price_cube = random_price_cube(num_days=3, start=start, timezone="Europe/London")
+    assert list(price_cube.day_lengths) == lengths
+    assert price_cube.prices.shape == (3, max(lengths), 2)
+    price_cube.check_days(slice(0, 3))
+
+    apx_prices, _ = price_cube.day_prices(1)
+    assert len(apx_prices) == lengths[1]
+    assert not np.isnan(apx_prices).any()
+    timepoints = price_cube.timepoints(slice(1, 2))
+    assert timepoints[0] == pd.Timestamp(start, tz="Europe/London") + pd.DateOffset(days=1)
+    assert len(timepoints) == lengths[1]
+
+    with pytest.raises(ValueError, match="multi-day models"):
+        price_cube.check_uniform(slice(0, 3))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("start, lengths", [("2023-03-25", [48, 46, 48]), ("2023-10-28", [48, 50, 48])])
+def test_clock_change_days_run_with_every_engine(start, lengths, engine):
+    # the previous day's solution must not carry into a day of a different length
+    price_cube = random_price_cube(num_days=3, start=start, timezone="Europe/London")
+    daily_results, daily_summary = run_backtest(price_cube, price_cube.days[0], 3, engine=engine)
+    assert [len(results_df) for results_df in daily_results] == lengths
+    assert np.isfinite(pd.concat(daily_summary)["profit"]).all()
+
+
+def test_validation_report_lists_every_problem():
+    apx_data, ssp_data, ons_data = random_price_data(num_days=3)
+    duplicated = pd.concat([ssp_data, ssp_data.iloc[[100]]], ignore_index=True)
+    price_cube = build_price_cube(apx_data.drop(index=[5, 6]), duplicated, ons_data.drop(index=0))
+
+    report = price_cube.validation_report()
+    problems = set(zip(report["date"].dt.strftime("%Y-%m-%d"), report["source"], report["issue"], report["count"]))
+    assert problems == {
+        ("2023-01-01", "APX", "missing", 2),
+        ("2023-01-01", "ONS", "missing", 1),
+        ("2023-01-03", "SSP", "duplicate", 1),
+    }
+    assert list(price_cube.bad_days(slice(0, 3))) == [True, False, True]
+
+    with pytest.raises(ValueError, match="3 problems") as error:
+        price_cube.check_days(slice(0, 3))
+    for day in ["2023-01-01", "2023-01-03"]:
+        assert day in str(error.value)
+
+
+def test_fill_and_skip_policies():
+    apx_data, ssp_data, ons_data = random_price_data(num_days=3)
+    price_cube = build_price_cube(apx_data.drop(index=[60, 61]), ssp_data, ons_data)
+    start_day = price_cube.days[0]
+
+    with pytest.raises(ValueError, match="2023-01-02"):
+        run_backtest(price_cube, start_day, 3, engine="relaxed")
+
+    filled = price_cube.filled()
+    assert filled.validation_report().empty
+    # interpolated between the neighbouring half-hours
+    expected = np.interp([60, 61], [59, 62], apx_data["price"].to_numpy()[[59, 62]])
+    np.testing.assert_allclose(filled.prices[1, 12:14, 0], expected)
+    _, filled_summary = run_backtest(price_cube, start_day, 3, engine="relaxed", data_policy="fill")
+    assert len(filled_summary) == 3
+
+    _, skipped_summary = run_backtest(price_cube, start_day, 3, engine="relaxed", data_policy="skip")
+    summary = pd.concat(skipped_summary, ignore_index=True)
+    assert list(summary["date"]) == [price_cube.days[0], price_cube.days[2]]
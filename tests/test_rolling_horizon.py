@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from battery_trading_model.main import run_horizon_backtest, run_rolling_backtest
+from battery_trading_model.synthetic import random_price_cube
+
+
+def test_rolling_backtest_commits_every_day_once():
+    price_cube = random_price_cube(num_days=4)
+    start_day = pd.Timestamp("2023-01-01", tz="UTC")
+
+    daily_results, daily_summary, step_metrics = run_rolling_backtest(
+        price_cube, start_day=start_day, num_days=4, window_days=3, commit_days=2
+    )
+    summary = pd.concat(daily_summary, ignore_index=True)
+
+    assert len(daily_results) == 4
+    assert list(summary["date"]) == list(pd.date_range(start_day, periods=4, freq="D"))
+    assert list(step_metrics["window_days"]) == [3, 2]
+    assert daily_results[2]["SOC"].iloc[0] == pytest.approx(summary["end_soc"].iloc[1])
+
+
+def test_rolling_window_over_whole_range_matches_horizon():
+    price_cube = random_price_cube(num_days=2)
+    start_day = pd.Timestamp("2023-01-01", tz="UTC")
+
+    _, rolling_summary, _ = run_rolling_backtest(
+        price_cube, start_day=start_day, num_days=2, window_days=2, commit_days=2
+    )
+    _, horizon_summary = run_horizon_backtest(
+        price_cube, start_day=start_day, num_days=2
+    )
+    assert pd.concat(rolling_summary)["objective"].sum() == pytest.approx(
+        pd.concat(horizon_summary)["objective"].sum(), rel=1e-6
+    )
+
+
+def test_rolling_backtest_rejects_commit_longer_than_window():
+    with pytest.raises(ValueError):
+        run_rolling_backtest(
+            random_price_cube(num_days=2),
+            start_day=pd.Timestamp("2023-01-01", tz="UTC"),
+            num_days=2,
+            window_days=1,
+            commit_days=2,
+        )
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.main import run_backtest
+from battery_trading_model.scenarios import (
+    bootstrap_days,
+    profit_percentiles,
+    run_stochastic_backtest,
+    scenario_batches,
+)
+from battery_trading_model.synthetic import random_price_cube
+
+
+def test_bootstrap_days_are_blocks_of_consecutive_history():
+    days = bootstrap_days(n_history=30, n_scenarios=50, num_days=10, block_days=4, rng=np.random.default_rng(0))
+    assert days.shape == (50, 10)
+    assert days.min() >= 0 and days.max() < 30
+    # consecutive within each block of 4, i.e. within columns 0-3, 4-7 and 8-9
+    steps = np.diff(days, axis=1)
+    assert (np.delete(steps, [3, 7], axis=1) == 1).all()
+
+
+def test_batches_cover_every_scenario():
+    history = random_price_cube(num_days=20)
+    batches = list(scenario_batches(history, n_scenarios=10, num_days=5, batch_size=4))
+    assert [len(prices) for prices, _ in batches] == [4, 4, 2]
+
+    prices, daily_prices = batches[0]
+    assert prices.shape == (4, 5, history.n_timepoints, 2)
+    assert daily_prices.shape == (4, 5)
+    # every bootstrapped day is a historical day
+    assert np.isin(daily_prices, history.daily_prices).all()
+
+
+def test_noise_scenarios_centre_on_history():
+    history = random_price_cube(num_days=5)
+    prices, daily_prices = next(scenario_batches(history, 2000, 5, method="noise", batch_size=2000))
+    assert prices.mean(axis=0) == pytest.approx(history.prices, abs=2.0)
+    assert daily_prices.mean(axis=0) == pytest.approx(history.daily_prices, abs=1.0)
+
+
+def test_noiseless_scenarios_reproduce_the_backtest():
+    history = random_price_cube(num_days=2)
+    daily_profits = run_stochastic_backtest(
+        history, n_scenarios=3, num_days=2, method="noise", noise_scale=0.0, batch_size=2, max_workers=2
+    )
+    _, daily_summary = run_backtest(history, history.days[0], 2, engine="relaxed")
+    expected = pd.concat(daily_summary)["profit"].to_numpy()
+    assert daily_profits == pytest.approx(np.tile(expected, (3, 1)))
+
+
+def test_profit_percentiles():
+    daily_profits = np.arange(20.0).reshape(10, 2)
+    days = pd.date_range("2023-01-01", periods=2, freq="D", tz="UTC")
+    daily, total = profit_percentiles(daily_profits, days, percentiles=[0, 50, 100])
+    assert list(daily.columns) == ["date", "p0", "p50", "p100", "mean"]
+    assert daily["p0"].tolist() == [0.0, 1.0]
+    assert daily["p100"].tolist() == [18.0, 19.0]
+    assert total.loc[0, "p50"] == pytest.approx(19.0)
+    assert total.loc[0, "mean"] == pytest.approx(19.0)
@@ -0,0 +1,60 @@
+from dataclasses import replace
+
+import pandas as pd
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.main import run_backtest
+from battery_trading_model.matrix_model import build_matrix_problem
+from battery_trading_model.sensitivity import (
+    PARAMETERS,
+    annual_marginal_values,
+    marginal_values,
+    solve_dual_lp,
+)
+from battery_trading_model.solver import solve_relaxed
+from battery_trading_model.synthetic import random_day, random_price_cube
+
+
+@pytest.mark.parametrize("mode", ["fixed", "relaxed"])
+def test_marginal_values_match_finite_differences(mode):
+    day = random_day(0)
+    problem, _ = build_matrix_problem(**day)
+    _, _, x, _ = solve_relaxed(problem)
+    duals = solve_dual_lp(problem, x, mode)
+    values = marginal_values(problem, duals)
+
+    # the LP objective with the same charge modes, one parameter nudged up and down
+    eps = 1e-3
+    for name in PARAMETERS:
+        objectives = []
+        for step in [-eps, eps]:
+            params = replace(DEFAULT_BATTERY_PARAMETERS, **{name: getattr(DEFAULT_BATTERY_PARAMETERS, name) + step})
+            nudged, _ = build_matrix_problem(**day, battery_params=params)
+            objectives.append(solve_dual_lp(nudged, x, mode)["objective"])
+        assert values[name] == pytest.approx((objectives[1] - objectives[0]) / (2 * eps), rel=1e-4)
+
+    nudged, _ = build_matrix_problem(**{**day, "initial_soc": day["initial_soc"] + eps})
+    difference = (solve_dual_lp(nudged, x, mode)["objective"] - duals["objective"]) / eps
+    assert values["initial_soc"] == pytest.approx(difference, rel=1e-4)
+
+
+def test_fixed_lp_keeps_the_mip_objective():
+    problem, _ = build_matrix_problem(**random_day(1))
+    _, objective_value, x, _ = solve_relaxed(problem)
+    assert solve_dual_lp(problem, x, "fixed")["objective"] == pytest.approx(objective_value)
+
+
+def test_backtest_collects_daily_and_annual_values():
+    price_cube = random_price_cube(num_days=3, start="2023-12-31")
+    sensitivity = []
+    run_backtest(price_cube, price_cube.days[0], 3, engine="pulp", sensitivity=sensitivity)
+
+    sensitivity_df = pd.DataFrame(sensitivity)
+    assert list(sensitivity_df.columns) == ["date", *PARAMETERS, "initial_soc"]
+    assert len(sensitivity_df) == 3
+    assert (sensitivity_df[PARAMETERS] >= 0).all().all()
+
+    annual = annual_marginal_values(sensitivity_df)
+    assert annual["year"].tolist() == [2023, 2024]
+    assert annual.loc[1, "C_max"] == pytest.approx(sensitivity_df["C_max"].iloc[1:].sum())
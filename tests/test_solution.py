@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.day_model import DayModel
+from battery_trading_model.matrix_model import build_matrix_problem
+from battery_trading_model.model import build_problem
+from battery_trading_model.solution import extract_day_solution, solution_vector
+from battery_trading_model.solver import evaluate_profit, get_final_soc, solve_matrix_problem, solve_problem
+from battery_trading_model.synthetic import random_day
+from battery_trading_model.utils import build_horizon_results, build_model_results_dataframe
+
+
+@pytest.mark.parametrize("engine", ["pulp", "matrix"])
+def test_extracted_solution_matches_variable_values(engine):
+    day = random_day(4)
+    if engine == "pulp":
+        problem, model = build_problem(**day)
+        solve_problem(problem)
+    else:
+        problem, model = build_matrix_problem(**day)
+        solve_matrix_problem(problem)
+
+    solution = extract_day_solution(model)
+    timepoints = pd.date_range("2023-01-01", periods=48, freq="30min", tz="UTC")
+    df, daily_profits = build_horizon_results(
+        solution,
+        apx_prices=np.array([day["apx_prices"]]),
+        ssp_prices=np.array([day["ssp_prices"]]),
+        daily_prices=np.array([day["daily_price"]]),
+        timepoints=timepoints,
+    )
+
+    expected_df = build_model_results_dataframe(
+        X=model["X"], Z=model["Z"], y=model["y"], w=model["w"], SOC=model["SOC"], timepoints=timepoints
+    )
+    pd.testing.assert_frame_equal(df, expected_df)
+
+    profit_keys = ["P", "q", "X", "Z", "y", "w"]
+    assert daily_profits[0] == pytest.approx(evaluate_profit(**{k: model[k] for k in profit_keys}))
+    assert solution["end_soc"][0] == get_final_soc(model["SOC"])
+    assert solution["X"].dtype == np.float64
+    assert solution["X"].shape == (2, 1, 48)
+
+
+def test_matrix_engines_hand_back_the_solver_vector():
+    day = random_day(5)
+    problem, model = build_matrix_problem(**day)
+    solve_matrix_problem(problem)
+    # the solver's own vector, charge modes included, rather than a copy read back
+    assert solution_vector(model) is problem.x
+    assert model["y"].varValue == problem.x[problem.layout.y]
+
+    day_model = DayModel()
+    day_model.update(
+        prices=[day["apx_prices"], day["ssp_prices"]],
+        q=day["daily_price"],
+        v=day["final_soc_price"],
+        initial_soc=day["initial_soc"],
+    )
+    assert solution_vector(day_model.model) is day_model.problem.x
+    assert solution_vector(day_model.model) == pytest.approx(problem.x, abs=1e-6)
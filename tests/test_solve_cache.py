@@ -0,0 +1,89 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.main import run_backtest
+from battery_trading_model.solve_cache import SolveCache
+from battery_trading_model.solver import DEFAULT_SOLVER_CONFIG
+from battery_trading_model.synthetic import random_price_cube
+
+START_DAY = pd.Timestamp("2023-01-01", tz="UTC")
+
+
+@pytest.mark.parametrize("engine", ["pulp", "relaxed", "dp"])
+def test_cached_rerun_matches_solved_run(tmp_path, engine):
+    price_cube = random_price_cube(num_days=3)
+    cache = SolveCache(tmp_path)
+    daily_results, daily_summary = run_backtest(price_cube, START_DAY, 3, engine=engine, solve_cache=cache)
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    cache = SolveCache(tmp_path)
+    cached_results, cached_summary = run_backtest(price_cube, START_DAY, 3, engine=engine, solve_cache=cache)
+    assert (cache.hits, cache.misses) == (3, 0)
+    pd.testing.assert_frame_equal(pd.concat(cached_results), pd.concat(daily_results))
+    pd.testing.assert_frame_equal(pd.concat(cached_summary), pd.concat(daily_summary))
+
+
+def test_changed_day_is_solved_again(tmp_path):
+    price_cube = random_price_cube(num_days=3)
+    run_backtest(price_cube, START_DAY, 3, engine="relaxed", solve_cache=SolveCache(tmp_path))
+
+    # only the last day's prices change, so the first two days come from the cache
+    price_cube.apx_prices[2] += 5.0
+    cache = SolveCache(tmp_path)
+    run_backtest(price_cube, START_DAY, 3, engine="relaxed", solve_cache=cache)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_key_depends_on_settings(tmp_path):
+    cache = SolveCache(tmp_path)
+    price_cube = random_price_cube(num_days=1)
+    day_inputs = dict(
+        apx_prices=price_cube.apx_prices[0],
+        ssp_prices=price_cube.ssp_prices[0],
+        daily_price=float(price_cube.daily_prices[0]),
+        final_soc_price=float(price_cube.avg_prices[0]),
+        initial_soc=0.0,
+    )
+    key = cache.key("pulp", day_inputs, DEFAULT_BATTERY_PARAMETERS, DEFAULT_SOLVER_CONFIG)
+
+    assert key == cache.key("pulp", dict(day_inputs), DEFAULT_BATTERY_PARAMETERS, DEFAULT_SOLVER_CONFIG)
+    other_keys = [
+        cache.key("dp", day_inputs, DEFAULT_BATTERY_PARAMETERS, DEFAULT_SOLVER_CONFIG),
+        cache.key("pulp", {**day_inputs, "initial_soc": 1.0}, DEFAULT_BATTERY_PARAMETERS, DEFAULT_SOLVER_CONFIG),
+        cache.key("pulp", day_inputs, replace(DEFAULT_BATTERY_PARAMETERS, C_max=2.0), DEFAULT_SOLVER_CONFIG),
+        cache.key(
+            "pulp", day_inputs, DEFAULT_BATTERY_PARAMETERS, replace(DEFAULT_SOLVER_CONFIG, mip_rel_gap=0.01)
+        ),
+    ]
+    assert key not in other_keys
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    rng = np.random.default_rng(0)
+    cache = SolveCache(tmp_path, max_bytes=10**9)
+    cache.put("00first", "Optimal", 1.0, rng.random(1000))
+    entry_size = cache.size
+
+    cache.max_bytes = int(2.5 * entry_size)
+    cache.put("01second", "Optimal", 2.0, rng.random(1000))
+    assert cache.get("00first") is not None
+    cache.put("02third", "Optimal", 3.0, rng.random(1000))
+
+    # the second entry was read least recently, so it is the one dropped
+    assert cache.size <= cache.max_bytes
+    assert cache.get("01second") is None
+    status, objective_value, _ = cache.get("00first")
+    assert (status, objective_value) == ("Optimal", 1.0)
+
+
+def test_overwritten_entries_are_counted_once(tmp_path):
+    rng = np.random.default_rng(0)
+    cache = SolveCache(tmp_path)
+    for _ in range(3):
+        cache.put("00first", "Optimal", 1.0, rng.random(1000))
+    cache.put("01second", "Optimal", 2.0, rng.random(1000))
+    assert cache.size == SolveCache(tmp_path).size
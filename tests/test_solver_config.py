@@ -0,0 +1,78 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from battery_trading_model.day_model import DayModel
+from battery_trading_model.main import run_backtest
+from battery_trading_model.matrix_model import build_matrix_problem
+from battery_trading_model.model import build_problem
+from battery_trading_model.solver import (
+    SolverConfig,
+    available_solver,
+    solve_matrix_problem,
+    solve_matrix_problem_relaxed,
+    solve_problem,
+)
+from battery_trading_model.synthetic import random_day, random_price_cube
+
+
+@pytest.mark.parametrize("solver", ["cbc", "highs", "glpk"])
+def test_pulp_backends_agree(solver):
+    day = random_day(5)
+    problem, _ = build_problem(**day)
+    _, expected = solve_problem(problem)
+
+    problem, _ = build_problem(**day)
+    stats = {}
+    status, objective = solve_problem(problem, stats=stats, solver_config=SolverConfig(solver=solver))
+
+    assert status == "Optimal"
+    assert objective == pytest.approx(expected, rel=1e-6)
+    assert stats["solver_time"] > 0
+    if available_solver(solver) == "highs":
+        assert stats["mip_gap"] == pytest.approx(0, abs=1e-4)
+
+
+def test_unavailable_solver_falls_back(caplog, monkeypatch):
+    from battery_trading_model import solver as solver_module
+
+    available_solver.cache_clear()
+    monkeypatch.setattr(solver_module.GLPK_CMD, "available", lambda self: False)
+    with caplog.at_level(logging.WARNING):
+        assert available_solver("glpk") == "cbc"
+    assert "falling back to cbc" in caplog.text
+    available_solver.cache_clear()
+
+    with pytest.raises(ValueError):
+        available_solver("gurobi")
+
+
+def test_gap_and_time_limit_are_passed_to_highs():
+    day = random_day(2)
+    problem, _ = build_matrix_problem(**day)
+    _, exact = solve_matrix_problem(problem)
+
+    config = SolverConfig(mip_rel_gap=0.01, time_limit=10.0)
+    for solve in [solve_matrix_problem, solve_matrix_problem_relaxed]:
+        problem, _ = build_matrix_problem(**day)
+        stats = {}
+        objective = solve(problem, stats=stats, solver_config=config)[1]
+        assert objective >= exact * (1 - 0.01) - 1e-6
+        assert stats["solver_time"] > 0
+
+    day_model = DayModel(solver_config=SolverConfig(mip_rel_gap=0.01, threads=1))
+    assert day_model.highs.getOptionValue("mip_rel_gap")[1] == 0.01
+    assert day_model.highs.getOptionValue("threads")[1] == 1
+
+
+def test_warm_started_pulp_backtest_matches_cold():
+    price_cube = random_price_cube(num_days=3)
+    start_day = pd.Timestamp("2023-01-01", tz="UTC")
+    summaries = {}
+    for warm_start in [True, False]:
+        _, daily_summary = run_backtest(
+            price_cube, start_day, 3, engine="pulp", solver_config=SolverConfig(warm_start=warm_start)
+        )
+        summaries[warm_start] = pd.concat(daily_summary, ignore_index=True)
+    assert summaries[True]["objective"].to_numpy() == pytest.approx(summaries[False]["objective"].to_numpy())
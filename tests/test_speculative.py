@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.main import run_backtest
+from battery_trading_model.speculative import _interpolate, run_speculative_backtest, soc_grid
+from battery_trading_model.synthetic import random_price_cube
+
+NUM_DAYS = 6
+
+
+@pytest.fixture(scope="module")
+def sequential():
+    price_cube = random_price_cube(num_days=NUM_DAYS)
+    daily_results, daily_summary = run_backtest(price_cube, price_cube.days[0], NUM_DAYS, engine="relaxed")
+    return price_cube, pd.concat(daily_results, ignore_index=True), pd.concat(daily_summary, ignore_index=True)
+
+
+def test_stitched_chain_matches_sequential_backtest(sequential):
+    price_cube, results, summary = sequential
+    daily_results, daily_summary, stitching = run_speculative_backtest(
+        price_cube, price_cube.days[0], NUM_DAYS, soc_points=3, max_workers=2
+    )
+
+    assert list(stitching["date"]) == list(price_cube.days[:NUM_DAYS])
+    # the end SOCs of each day's grid solutions cover every start SOC of this chain
+    assert (stitching["path"] == "grid").all()
+    stitched = pd.concat(daily_summary, ignore_index=True)
+    assert stitched["objective"].to_numpy() == pytest.approx(summary["objective"].to_numpy(), rel=1e-6)
+    assert stitched["end_soc"].to_numpy() == pytest.approx(summary["end_soc"].to_numpy(), abs=1e-6)
+    pd.testing.assert_series_equal(pd.concat(daily_results, ignore_index=True)["Datetime"], results["Datetime"])
+
+
+def test_interpolation_is_feasible_and_never_beats_the_optimum(sequential):
+    price_cube = sequential[0]
+    day = price_cube.days[5]
+    grid_results = [
+        tuple(frames[0] for frames in run_backtest(price_cube, day, 1, start_of_day_soc=soc, engine="relaxed"))
+        for soc in [20.0, 30.0]
+    ]
+    results_df, summary_df = _interpolate(np.array([20.0, 30.0]), grid_results, 25.0)
+    _, solved_summary = run_backtest(price_cube, day, 1, start_of_day_soc=25.0, engine="relaxed")
+
+    assert results_df["SOC"].iloc[0] == pytest.approx(25.0)
+    assert summary_df["objective"].iloc[0] <= solved_summary[0]["objective"].iloc[0] + 1e-6
+    assert 0 <= summary_df["end_soc"].iloc[0] <= DEFAULT_BATTERY_PARAMETERS.C_max
+
+    # solutions charging and discharging in the same period have no interpolation
+    day = price_cube.days[0]
+    grid_results = [
+        tuple(frames[0] for frames in run_backtest(price_cube, day, 1, start_of_day_soc=soc, engine="relaxed"))
+        for soc in [0.0, 50.0]
+    ]
+    assert _interpolate(np.array([0.0, 50.0]), grid_results, 25.0) is None
+
+
+def test_soc_grid_spans_the_battery():
+    grid = soc_grid(DEFAULT_BATTERY_PARAMETERS, 5)
+    assert list(grid) == [0, 12.5, 25, 37.5, 50]
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.main import run_backtest
+from battery_trading_model.sweep import _parse_grid, parameter_grid, run_sweep
+from battery_trading_model.synthetic import random_price_cube
+
+
+def test_parameter_grid_covers_every_combination():
+    grid = parameter_grid(C_max=[50, 100], c_rate=[25, 50, 75])
+    assert len(grid) == 6
+    assert {(p.C_max, p.c_rate) for p in grid} == {(c, r) for c in [50, 100] for r in [25, 50, 75]}
+    assert all(p.d_rate == DEFAULT_BATTERY_PARAMETERS.d_rate for p in grid)
+
+
+def test_parse_grid_casts_to_field_types():
+    assert _parse_grid(["C_max=50,100", "max_cycles=1000"]) == {"C_max": [50.0, 100.0], "max_cycles": [1000]}
+    with pytest.raises(ValueError):
+        _parse_grid(["capacity=50"])
+
+
+def test_sweep_matches_individual_backtests():
+    price_cube = random_price_cube(num_days=2)
+    start_day = pd.Timestamp("2023-01-01", tz="UTC")
+    parameter_sets = parameter_grid(C_max=[25, 50])
+
+    sweep_df = run_sweep(
+        parameter_sets, price_cube, start_day=start_day, num_days=2, engine="matrix", max_workers=2
+    )
+
+    assert len(sweep_df) == 4
+    for params in parameter_sets:
+        _, daily_summary = run_backtest(
+            price_cube, start_day=start_day, num_days=2, engine="matrix", battery_params=params
+        )
+        expected = pd.concat(daily_summary, ignore_index=True)["objective"].to_numpy()
+        actual = sweep_df.loc[sweep_df["C_max"] == params.C_max, "objective"].to_numpy()
+        assert actual == pytest.approx(expected, rel=1e-6)
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_trading_model.main import run_backtest, run_streaming_backtest
+from battery_trading_model.synthetic import random_price_cube
+from battery_trading_model.visualisation import (
+    PURCHASE_COLUMNS,
+    SALE_COLUMNS,
+    build_aggregates,
+    downsample,
+    load_aggregates,
+    load_results,
+    plot_daily_profit,
+    plot_day_energy_stack,
+    plot_net_power_heatmap,
+    plot_time_of_day_heatmap,
+    plot_weekly_energy,
+    write_report,
+)
+
+NUM_DAYS = 10
+
+
+@pytest.fixture(scope="module")
+def backtest(tmp_path_factory):
+    output_dir = tmp_path_factory.mktemp("backtest")
+    price_cube = random_price_cube(num_days=NUM_DAYS)
+    daily_results, daily_summary = run_backtest(price_cube, price_cube.days[0], NUM_DAYS, engine="relaxed")
+    results, summary = pd.concat(daily_results, ignore_index=True), pd.concat(daily_summary, ignore_index=True)
+    results.to_csv(output_dir / "result.csv", index=False)
+    summary.to_csv(output_dir / "daily_summary.csv", index=False)
+    return output_dir, price_cube, results, summary
+
+
+def test_aggregates_match_the_results(backtest):
+    output_dir, _, results, summary = backtest
+    # several chunks, split mid-day, add up to the same as one
+    chunks = [results.iloc[:100], results.iloc[100:250], results.iloc[250:]]
+    aggregates = build_aggregates(chunks, summary)
+
+    daily = aggregates["daily"]
+    assert len(daily) == NUM_DAYS
+    net = results[PURCHASE_COLUMNS].sum(axis=1) - results[SALE_COLUMNS].sum(axis=1)
+    assert daily["net_mwh"].to_numpy() == pytest.approx(net.to_numpy().reshape(NUM_DAYS, -1).sum(axis=1))
+    assert daily["profit"].to_numpy() == pytest.approx(summary["profit"].to_numpy())
+    assert aggregates["weekly"]["profit"].sum() == pytest.approx(summary["profit"].sum())
+    assert aggregates["weekly"]["week"].dt.dayofweek.eq(0).all()
+
+    time_of_day = aggregates["time_of_day"]
+    assert len(time_of_day) == 48
+    assert time_of_day["net_mwh"].to_numpy() == pytest.approx(net.to_numpy().reshape(NUM_DAYS, -1).mean(axis=0))
+
+
+def test_aggregates_are_cached_until_the_results_change(backtest, tmp_path):
+    output_dir = backtest[0]
+    cache_dir = tmp_path / "aggregates"
+    aggregates = load_aggregates(output_dir / "result.csv", output_dir / "daily_summary.csv", cache_dir)
+    cached_at = (cache_dir / "daily.parquet").stat().st_mtime
+
+    cached = load_aggregates(output_dir / "result.csv", output_dir / "daily_summary.csv", cache_dir)
+    assert (cache_dir / "daily.parquet").stat().st_mtime == cached_at
+    pd.testing.assert_frame_equal(cached["daily"], aggregates["daily"])
+
+    os.utime(output_dir / "daily_summary.csv", (cached_at + 10, cached_at + 10))
+    load_aggregates(output_dir / "result.csv", output_dir / "daily_summary.csv", cache_dir)
+    assert (cache_dir / "daily.parquet").stat().st_mtime > cached_at
+
+
+def test_load_results_reads_only_the_date_range(backtest, tmp_path):
+    output_dir, price_cube, results, _ = backtest
+    start, end = price_cube.days[3], price_cube.days[5]
+    expected = results[(results["Datetime"] >= start) & (results["Datetime"] < end)].reset_index(drop=True)
+
+    from_csv = load_results(output_dir / "result.csv", start=start, end=end)
+    pd.testing.assert_series_equal(from_csv["Datetime"], expected["Datetime"], check_dtype=False)
+
+    writer = run_streaming_backtest(price_cube, price_cube.days[0], NUM_DAYS, tmp_path / "run", engine="relaxed")
+    from_parts = load_results(writer.results_dir, start=start, end=end)
+    assert from_parts["Purchase from APX"].to_numpy() == pytest.approx(expected["Purchase from APX"].to_numpy())
+    with pytest.raises(ValueError):
+        load_results(writer.results_dir, start="2030-01-01")
+
+
+def test_downsample_keeps_extremes():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"date": pd.date_range("2000-01-01", periods=10_000, freq="D"), "profit": rng.normal(size=10_000)})
+    sampled = downsample(df, "date", "profit", max_points=200)
+    assert len(sampled) <= 200
+    assert sampled["date"].is_monotonic_increasing
+    assert sampled["profit"].max() == df["profit"].max()
+    assert sampled["profit"].min() == df["profit"].min()
+
+
+def test_plots_and_report_size_do_not_grow_with_history(backtest, tmp_path):
+    output_dir, price_cube, results, summary = backtest
+    plot_day_energy_stack(results, price_cube.days[1], profit=1.0)
+    plot_net_power_heatmap(results)
+
+    aggregates = load_aggregates(output_dir / "result.csv", output_dir / "daily_summary.csv", tmp_path / "cache")
+    sizes = []
+    for years in [1, 10]:
+        days = pd.date_range("2000-01-01", periods=365 * years, freq="D", tz="UTC")
+        long_summary = pd.DataFrame({"date": days, "profit": np.sin(np.arange(len(days)))})
+        profit = plot_daily_profit(long_summary, max_points=500)
+        assert profit.data[0].type == "scattergl"
+        path = tmp_path / f"report_{years}.html"
+        write_report([profit, plot_weekly_energy(aggregates), plot_time_of_day_heatmap(aggregates)], path)
+        sizes.append(path.stat().st_size)
+    assert sizes[1] < 1.5 * sizes[0]
@@ -0,0 +1,135 @@
+import json
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from battery_trading_model.constants import DEFAULT_BATTERY_PARAMETERS
+from battery_trading_model.main import run_backtest
+from battery_trading_model.price_data import load_price_cube
+from battery_trading_model.sweep import parameter_grid
+from battery_trading_model.synthetic import random_price_data
+from battery_trading_model.work_queue import WorkQueue, merge_results, plan_tasks, run_worker
+
+NUM_DAYS = 6
+YEAR = 2023
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    for name, df in zip(["apx", "ssp", "ons"], random_price_data(NUM_DAYS)):
+        df.to_csv(data_dir / f"{name}_data_{YEAR}.csv", index=False)
+    return data_dir
+
+
+def _plan(queue, data_dir, **kwargs):
+    price_cube = load_price_cube(data_dir, YEAR)
+    return plan_tasks(
+        queue, price_cube.days[0], NUM_DAYS, shard_days=2, data_dir=data_dir, year=YEAR, **kwargs
+    )
+
+
+def _worker(root):
+    run_worker(WorkQueue(root), poll_seconds=0.05)
+
+
+def test_local_workers_match_sequential_backtest(tmp_path, data_dir):
+    queue = WorkQueue(tmp_path / "queue")
+    parameter_sets = parameter_grid(C_max=[50, 100])
+    tasks = _plan(queue, data_dir, parameter_sets=parameter_sets, scenarios=[None, 0])
+    assert len(tasks) == 2 * 2 * 3
+
+    workers = [multiprocessing.Process(target=_worker, args=(queue.root,)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=300)
+        assert worker.exitcode == 0
+    assert queue.counts() == {"pending": 0, "claimed": 0, "done": len(tasks), "failed": 0}
+
+    summary = merge_results(queue, tmp_path / "result.csv", tmp_path / "daily_summary.csv")
+    results = pd.read_csv(tmp_path / "result.csv")
+    assert len(summary) == 2 * 2 * NUM_DAYS
+    assert len(results) == 2 * 2 * NUM_DAYS * 48
+
+    price_cube = load_price_cube(data_dir, YEAR)
+    for p, battery_params in enumerate(parameter_sets):
+        _, daily_summary = run_backtest(
+            price_cube, price_cube.days[0], NUM_DAYS, engine="relaxed", battery_params=battery_params
+        )
+        expected = pd.concat(daily_summary, ignore_index=True)
+        merged = summary[(summary["parameter_set"] == p) & summary["scenario"].isna()]
+        assert (merged["C_max"] == battery_params.C_max).all()
+        # the shards chain their SOC, so they add up to the unsharded backtest
+        assert merged["objective"].to_numpy() == pytest.approx(expected["objective"].to_numpy(), rel=1e-6)
+        assert merged["end_soc"].to_numpy() == pytest.approx(expected["end_soc"].to_numpy(), abs=1e-6)
+
+
+def test_claims_of_dead_workers_are_requeued(tmp_path, data_dir):
+    queue = WorkQueue(tmp_path / "queue", lease_seconds=5)
+    tasks = _plan(queue, data_dir, chain_soc=False)
+
+    # a worker that claimed a task and died before finishing it
+    task = queue.claim()
+    assert task["task_id"] == tasks[0]["task_id"]
+    claimed = queue.task_dirs["claimed"] / f"{task['task_id']}.json"
+    stale = time.time() - 60
+    os.utime(claimed, (stale, stale))
+
+    assert run_worker(queue, worker="survivor", poll_seconds=0.05) == len(tasks)
+    done = json.loads((queue.task_dirs["done"] / claimed.name).read_text())
+    assert done["worker"] == "survivor"
+
+    summary = merge_results(queue, tmp_path / "result.csv", tmp_path / "daily_summary.csv")
+    assert len(summary) == NUM_DAYS
+    assert (summary["C_max"] == DEFAULT_BATTERY_PARAMETERS.C_max).all()
+    # independent shards each start empty
+    price_cube = load_price_cube(data_dir, YEAR)
+    _, daily_summary = run_backtest(price_cube, price_cube.days[2], 2, engine="relaxed")
+    expected = pd.concat(daily_summary, ignore_index=True)
+    assert summary["objective"].iloc[2:4].to_numpy() == pytest.approx(expected["objective"].to_numpy(), rel=1e-6)
+
+
+def test_merge_refuses_unfinished_queue(tmp_path, data_dir):
+    queue = WorkQueue(tmp_path / "queue")
+    _plan(queue, data_dir)
+    # the second shard waits for the first
+    assert queue.claim()["offset"] == 0
+    assert queue.claim() is None
+    with pytest.raises(Exception, match="not done"):
+        merge_results(queue, tmp_path / "result.csv", tmp_path / "daily_summary.csv")
+
+
+def test_failing_task_and_the_shards_after_it_are_set_aside(tmp_path, data_dir):
+    queue = WorkQueue(tmp_path / "queue")
+    tasks = _plan(queue, data_dir, parameter_sets=parameter_grid(C_max=[50, 100]))
+    # the second date range of the first parameter set cannot be run
+    bad = queue.task_dirs["pending"] / f"{tasks[1]['task_id']}.json"
+    bad.write_text(json.dumps({**json.loads(bad.read_text()), "engine": "nonexistent"}))
+
+    # the worker carries on with everything else rather than dying
+    assert run_worker(queue, worker="worker", poll_seconds=0.05) == 4
+    assert queue.counts() == {"pending": 0, "claimed": 0, "done": 4, "failed": 2}
+    failures = queue.failures().set_index("task_id")["error"]
+    assert "Unknown engine nonexistent" in failures[tasks[1]["task_id"]]
+    assert tasks[1]["task_id"] in failures[tasks[2]["task_id"]]
+    with pytest.raises(Exception, match="2 tasks .* failed"):
+        merge_results(queue, tmp_path / "result.csv", tmp_path / "daily_summary.csv")
+
+
+def test_task_whose_workers_keep_dying_fails(tmp_path, data_dir):
+    queue = WorkQueue(tmp_path / "queue", lease_seconds=5, max_attempts=2)
+    tasks = _plan(queue, data_dir, chain_soc=False)
+    stale = time.time() - 60
+    for _ in range(2):
+        task = queue.claim()
+        assert task["task_id"] == tasks[0]["task_id"]
+        os.utime(queue.task_dirs["claimed"] / f"{task['task_id']}.json", (stale, stale))
+        queue.requeue_expired()
+
+    assert queue.claim()["task_id"] == tasks[1]["task_id"]
+    assert queue.is_failed(tasks[0]["task_id"])
+    assert "2 attempts" in queue.failures()["error"].iloc[0]